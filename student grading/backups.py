@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# --- Backup Settings ---
+BACKUP_DIR = 'backups'
+KEEP_SNAPSHOTS = 10
+BACKUP_INTERVAL = 30 * 60
+PAGES_PER_STEP = 16
+STEP_SLEEP = 0.01
+
+
+def snapshot_name(db_path, when=None):
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    stamp = (when or datetime.now()).strftime("%Y%m%d-%H%M%S")
+    return f"{base}-{stamp}.db"
+
+
+def verify_snapshot(path):
+    check = sqlite3.connect(path)
+    try:
+        result = check.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        check.close()
+    return result == [('ok',)]
+
+
+def has_shards(conn):
+    # A snapshot is a copy of one file. Classes moved into shard files (see
+    # shards.py) would be missing from it, and a restore would unmap them.
+    try:
+        return conn.execute("SELECT 1 FROM shard_map LIMIT 1").fetchone() is not None
+    except sqlite3.OperationalError:
+        # A file from before sharding existed
+        return False
+
+
+def list_snapshots(db_path, backup_dir=BACKUP_DIR):
+    if not os.path.isdir(backup_dir):
+        return []
+    prefix = os.path.splitext(os.path.basename(db_path))[0] + '-'
+    names = [n for n in os.listdir(backup_dir) if n.startswith(prefix) and n.endswith('.db')]
+    # Timestamps sort lexically, so newest first is a reverse name sort
+    return [os.path.join(backup_dir, n) for n in sorted(names, reverse=True)]
+
+
+def prune_snapshots(db_path, backup_dir=BACKUP_DIR, keep=KEEP_SNAPSHOTS):
+    removed = []
+    for path in list_snapshots(db_path, backup_dir)[keep:]:
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+
+def take_snapshot(db_path, backup_dir=BACKUP_DIR, keep=KEEP_SNAPSHOTS,
+                  pages=PAGES_PER_STEP, step_sleep=STEP_SLEEP):
+    os.makedirs(backup_dir, exist_ok=True)
+    final_path = os.path.join(backup_dir, snapshot_name(db_path))
+    part_path = final_path + '.part'
+
+    # Copy a few pages at a time and sleep in between so the app's own
+    # connection can keep taking write locks while the snapshot runs.
+    def pause(status, remaining, total):
+        time.sleep(step_sleep)
+
+    src = sqlite3.connect(db_path)
+    if has_shards(src):
+        src.close()
+        raise ValueError("This database has sharded classes; snapshots can't include them")
+    dst = sqlite3.connect(part_path)
+    try:
+        src.backup(dst, pages=pages, progress=pause)
+    finally:
+        dst.close()
+        src.close()
+
+    if not verify_snapshot(part_path):
+        os.remove(part_path)
+        raise sqlite3.DatabaseError(f"Snapshot failed integrity check: {final_path}")
+    os.replace(part_path, final_path)
+    prune_snapshots(db_path, backup_dir, keep)
+    return final_path
+
+
+def restore_snapshot(snapshot_path, conn):
+    if not verify_snapshot(snapshot_path):
+        raise sqlite3.DatabaseError(f"Snapshot failed integrity check: {snapshot_path}")
+    conn.commit()
+    src = sqlite3.connect(snapshot_path)
+    try:
+        if has_shards(conn) or has_shards(src):
+            raise ValueError("This database has sharded classes; snapshots can't be restored over them")
+        # Copy into the live connection so open screens keep working after restore
+        src.backup(conn)
+    finally:
+        src.close()
+
+
+class BackupScheduler:
+    def __init__(self, db_path, backup_dir=BACKUP_DIR, interval=BACKUP_INTERVAL, keep=KEEP_SNAPSHOTS):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self.last_snapshot = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="backup-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.backup_now()
+
+    def backup_now(self):
+        # Skip rather than queue if a snapshot is already being written
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            self.last_snapshot = take_snapshot(self.db_path, self.backup_dir, self.keep)
+            self.last_error = None
+            return self.last_snapshot
+        except (sqlite3.Error, OSError, ValueError) as e:
+            self.last_error = e
+            return None
+        finally:
+            self._lock.release()
+
+    def snapshots(self):
+        return list_snapshots(self.db_path, self.backup_dir)
@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import datagen
+import exports
+import gradedb
+import reports
+
+SCALES = [1000, 10000, 100000, 1000000]
+SAMPLES = 20
+STARTUP_TARGET_MS = 1500
+STARTUP_GRADES = 10000
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def current_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=APP_DIR)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def time_runs(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+# === Hot Paths ===
+def hot_paths(conn, seed):
+    # Each entry runs one operation the way the app does, minus the widgets.
+    # Targets are sampled up front with the run's seed so every version
+    # benchmarks the same students, classes and grades.
+    cur = conn.cursor()
+    rng = random.Random(seed)
+    students = [r[0] for r in cur.execute("SELECT rocket_id FROM students")]
+    classes = [r[0] for r in cur.execute("SELECT class_id FROM classes")]
+    pairs = cur.execute("SELECT rocket_id, assignment_id, class_id FROM grades").fetchall()
+    report_ids = rng.sample(students, min(SAMPLES, len(students)))
+    export_class = rng.choice(classes)
+    upserts = rng.sample(pairs, min(SAMPLES, len(pairs)))
+
+    def report():
+        for rid in report_ids:
+            reports.student_report(cur, rid)
+
+    cache = reports.ReportCache()
+
+    def cached_report():
+        # Reopening unchanged reports; the first run fills the cache
+        for rid in report_ids:
+            cache.get(cur, rid)
+
+    def report_summary():
+        # What the report screen runs when it opens; sections load on demand
+        for rid in report_ids:
+            reports.class_summary(cur, rid)
+
+    def class_export():
+        with open(os.devnull, 'w', newline='') as f:
+            exports.write_class_csv(cur, export_class, f)
+
+    def full_export():
+        with open(os.devnull, 'w', newline='') as f:
+            exports.write_all_csv(cur, f)
+
+    def grade_upsert():
+        for rid, aid, class_id in upserts:
+            gradedb.save_grade(cur, rid, aid, rng.randint(0, 10), class_id)
+            conn.commit()
+
+    def listing():
+        gradedb.list_students(cur, sort_by='name')
+
+    def class_average():
+        gradedb.class_average(cur, export_class)
+
+    def roster():
+        gradedb.roster(cur, export_class)
+
+    return {
+        'report': (report, len(report_ids)),
+        'cached_report': (cached_report, len(report_ids)),
+        'report_summary': (report_summary, len(report_ids)),
+        'class_export': (class_export, 1),
+        'full_export': (full_export, 1),
+        'grade_upsert': (grade_upsert, len(upserts)),
+        'listing': (listing, 1),
+        'class_average': (class_average, 1),
+        'roster': (roster, 1),
+    }
+
+
+def run_scale(grades, seed, repeat, workdir):
+    path = os.path.join(workdir, f"bench-{grades}-{seed}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    conn = gradedb.connect(path)
+    start = time.perf_counter()
+    shape = datagen.generate(conn, grades, seed)
+    build_time = time.perf_counter() - start
+
+    results = []
+    for name, (func, ops) in hot_paths(conn, seed).items():
+        times = [t / ops for t in time_runs(func, repeat)]
+        results.append({
+            'scale': grades,
+            'path': name,
+            'ops_per_run': ops,
+            'runs': repeat,
+            **summarize(times),
+        })
+    conn.close()
+    os.remove(path)
+    return shape, build_time, results
+
+
+def summarize(times):
+    return {
+        'min_ms': round(min(times) * 1000, 4),
+        'median_ms': round(statistics.median(times) * 1000, 4),
+        'mean_ms': round(statistics.mean(times) * 1000, 4),
+    }
+
+# === Startup ===
+def has_display():
+    probe = subprocess.run([sys.executable, '-c', 'import tkinter; tkinter.Tk().destroy()'], capture_output=True)
+    return probe.returncode == 0
+
+
+def run_startup(repeat, workdir, seed):
+    # Cold start is a fresh interpreter until the window is up and the database
+    # is open. Without a display only the import cost can be measured.
+    conn = gradedb.connect(os.path.join(workdir, 'student_grading.db'))
+    datagen.generate(conn, STARTUP_GRADES, seed)
+    conn.close()
+
+    if has_display():
+        mode = 'window'
+        command = [sys.executable, os.path.join(APP_DIR, 'studentgradingfinal.py'), '--exit-after-start']
+    else:
+        mode = 'import'
+        command = [sys.executable, '-c', 'import studentgradingfinal']
+    env = {**os.environ, 'PYTHONPATH': APP_DIR}
+
+    def launch():
+        subprocess.run(command, cwd=workdir, env=env, check=True)
+
+    launch()  # warm the OS file cache so every timed run sees the same state
+    times = time_runs(launch, repeat)
+    return {'scale': STARTUP_GRADES, 'path': 'startup', 'mode': mode, 'runs': repeat,
+            'target_ms': STARTUP_TARGET_MS, **summarize(times)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the gradebook hot paths on synthetic data")
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES, help="grade counts to generate")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--label', help="free-form tag stored with the results, e.g. a branch name")
+    parser.add_argument('--out', default='benchmark_results.jsonl', help="JSON lines file to append results to")
+    parser.add_argument('--workdir', help="where to build the databases (default: a temp directory)")
+    parser.add_argument('--startup', action='store_true',
+                        help=f"measure cold-start time instead and fail above {STARTUP_TARGET_MS} ms")
+    args = parser.parse_args()
+
+    run_info = {
+        'run_at': datetime.now().isoformat(timespec='seconds'),
+        'revision': current_revision(),
+        'label': args.label,
+        'seed': args.seed,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        with open(args.out, 'a') as out:
+            if args.startup:
+                result = run_startup(args.repeat, workdir, args.seed)
+                out.write(json.dumps({**run_info, **result}) + '\n')
+                print(f"startup ({result['mode']}) median {result['median_ms']:.1f} ms, target {STARTUP_TARGET_MS} ms")
+                if result['median_ms'] > STARTUP_TARGET_MS:
+                    sys.exit(1)
+                sys.exit(0)
+            for grades in args.scales:
+                shape, build_time, results = run_scale(grades, args.seed, args.repeat, workdir)
+                print(f"== {grades} grades: {shape} (built in {build_time:.2f}s)")
+                for result in results:
+                    print(f"  {result['path']:<14} median {result['median_ms']:>10.3f} ms")
+                    out.write(json.dumps({**run_info, **result, 'dataset': shape}) + '\n')
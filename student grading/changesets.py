@@ -0,0 +1,234 @@
+import argparse
+import gzip
+import json
+import sqlite3
+
+import gradedb
+
+# Changesets are JSON lines (gzipped when the file name ends in .gz): a header
+# line, then one [clock, origin, table, op, key, row] list per change.
+#
+# Conflict rule: for each row the change with the highest (clock, origin)
+# wins, on every copy, whatever order changesets arrive in.
+
+
+def sync_value(cursor, key):
+    cursor.execute("SELECT value FROM sync_state WHERE key = ?", (key,))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+
+def set_tracking(cursor, enabled):
+    cursor.execute("UPDATE sync_state SET value = ? WHERE key = 'tracking'", (1 if enabled else 0,))
+
+
+def new_origin(conn):
+    # Run on a freshly copied database file so the copy gets its own identity
+    conn.execute("UPDATE sync_state SET value = lower(hex(randomblob(8))) WHERE key = 'origin'")
+    conn.commit()
+    return sync_value(conn.cursor(), 'origin')
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+# === Export ===
+def export_changes(conn, path, since=0):
+    cur = conn.cursor()
+    header = {'origin': sync_value(cur, 'origin'), 'since': since, 'clock': sync_value(cur, 'clock')}
+    cur.execute("SELECT clock, origin, tbl, op, pk, row FROM changes WHERE clock > ? ORDER BY clock, origin",
+                (since,))
+    count = 0
+    last_clock = since
+    with _open(path, 'w') as f:
+        f.write(json.dumps(header) + '\n')
+        for clock, change_origin, tbl, op, pk, row in cur:
+            f.write(json.dumps([clock, change_origin, tbl, op, json.loads(pk), json.loads(row) if row else None]) + '\n')
+            count += 1
+            last_clock = clock
+    return count, last_clock
+
+
+def read_changes(path):
+    with _open(path, 'r') as f:
+        header = json.loads(f.readline())
+        changes = [json.loads(line) for line in f if line.strip()]
+    return header, changes
+
+# === Replay ===
+# Each apply function returns False when it skips a change. A row whose parent
+# this copy has deleted is skipped instead of failing the whole changeset: the
+# parent's delete reaches the other copy too and removes the row there, so
+# both copies end up without it.
+def _exists(cur, table, column, value):
+    cur.execute(f"SELECT 1 FROM {table} WHERE {column} = ?", (value,))
+    return cur.fetchone() is not None
+
+
+def _assignment_id(cur, class_id, title):
+    cur.execute("SELECT id FROM assignments WHERE class_id = ? AND title = ?", (class_id, title))
+    result = cur.fetchone()
+    return result[0] if result else None
+
+
+def _apply_students(cur, op, key, row):
+    if op == 'delete':
+        cur.execute("DELETE FROM students WHERE rocket_id = ?", (key['rocket_id'],))
+        return True
+    cur.execute("UPDATE students SET rocket_id = ?, name = ? WHERE rocket_id = ?",
+                (row['rocket_id'], row['name'], key['rocket_id']))
+    if cur.rowcount == 0:
+        cur.execute("INSERT INTO students (rocket_id, name) VALUES (?, ?) "
+                    "ON CONFLICT (rocket_id) DO UPDATE SET name = excluded.name",
+                    (row['rocket_id'], row['name']))
+    return True
+
+
+def _apply_classes(cur, op, key, row):
+    if op == 'delete':
+        cur.execute("DELETE FROM classes WHERE class_id = ?", (key['class_id'],))
+        return True
+    cur.execute("UPDATE classes SET class_id = ?, class_name = ? WHERE class_id = ?",
+                (row['class_id'], row['class_name'], key['class_id']))
+    if cur.rowcount == 0:
+        cur.execute("INSERT INTO classes (class_id, class_name) VALUES (?, ?) "
+                    "ON CONFLICT (class_id) DO UPDATE SET class_name = excluded.class_name",
+                    (row['class_id'], row['class_name']))
+    return True
+
+
+def _apply_assignments(cur, op, key, row):
+    assignment_id = _assignment_id(cur, key['class_id'], key['title'])
+    if op == 'delete':
+        if assignment_id is not None:
+            cur.execute("DELETE FROM assignments WHERE id = ?", (assignment_id,))
+        return True
+    if row['class_id'] is not None and not _exists(cur, 'classes', 'class_id', row['class_id']):
+        return False
+    if assignment_id is None:
+        assignment_id = _assignment_id(cur, row['class_id'], row['title'])
+    values = (row['title'], row['due_date'], row['max_score'], row['type'], row['class_id'])
+    if assignment_id is None:
+        cur.execute("INSERT INTO assignments (title, due_date, max_score, type, class_id) VALUES (?, ?, ?, ?, ?)",
+                    values)
+    else:
+        cur.execute('''
+            UPDATE assignments SET title = ?, due_date = ?, max_score = ?, type = ?, class_id = ?,
+                                   version = version + 1
+            WHERE id = ?
+        ''', values + (assignment_id,))
+    return True
+
+
+def _apply_grades(cur, op, key, row):
+    assignment_id = _assignment_id(cur, key['class_id'], key['title'])
+    if op == 'delete':
+        if assignment_id is not None:
+            cur.execute("DELETE FROM grades WHERE rocket_id = ? AND assignment_id = ?",
+                        (key['rocket_id'], assignment_id))
+        return True
+    new_assignment_id = _assignment_id(cur, row['class_id'], row['title'])
+    if new_assignment_id is None or not _exists(cur, 'students', 'rocket_id', row['rocket_id']):
+        return False
+    if assignment_id is not None and (key['rocket_id'], assignment_id) != (row['rocket_id'], new_assignment_id):
+        cur.execute("DELETE FROM grades WHERE rocket_id = ? AND assignment_id = ?", (key['rocket_id'], assignment_id))
+    gradedb.save_grade(cur, row['rocket_id'], new_assignment_id, row['score'], row['grade_class_id'])
+    return True
+
+
+def _apply_enrollments(cur, op, key, row):
+    if op == 'delete':
+        cur.execute("DELETE FROM enrollments WHERE class_id = ? AND rocket_id = ?", (key['class_id'], key['rocket_id']))
+        return True
+    if not (_exists(cur, 'classes', 'class_id', row['class_id'])
+            and _exists(cur, 'students', 'rocket_id', row['rocket_id'])):
+        return False
+    cur.execute("INSERT OR IGNORE INTO enrollments (class_id, rocket_id) VALUES (?, ?)",
+                (row['class_id'], row['rocket_id']))
+    return True
+
+
+APPLY = {
+    'students': _apply_students,
+    'classes': _apply_classes,
+    'assignments': _apply_assignments,
+    'grades': _apply_grades,
+    'enrollments': _apply_enrollments,
+}
+
+
+def replay_changes(conn, changes):
+    # Changes are logged with their original clock and origin, so this copy can
+    # pass them on to others. Tracking is paused so applying them doesn't log
+    # them a second time.
+    cur = conn.cursor()
+    local_origin = sync_value(cur, 'origin')
+    applied = skipped = 0
+    max_clock = 0
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        set_tracking(cur, False)
+        for clock, origin, tbl, op, key, row in sorted(changes, key=lambda c: (c[0], c[1])):
+            max_clock = max(max_clock, clock)
+            if origin == local_origin:
+                skipped += 1
+                continue
+            cur.execute("SELECT 1 FROM changes WHERE origin = ? AND clock = ?", (origin, clock))
+            if cur.fetchone():
+                skipped += 1
+                continue
+            # Keys are compared as the text json_object() wrote in the triggers
+            pk = json.dumps(key, separators=(',', ':'), ensure_ascii=False)
+            cur.execute('''
+                SELECT clock, origin FROM changes WHERE tbl = ? AND pk = ?
+                ORDER BY clock DESC, origin DESC LIMIT 1
+            ''', (tbl, pk))
+            latest = cur.fetchone()
+            if (latest is None or tuple(latest) < (clock, origin)) and APPLY[tbl](cur, op, key, row):
+                applied += 1
+            else:
+                skipped += 1
+            row_json = json.dumps(row, separators=(',', ':'), ensure_ascii=False) if row else None
+            cur.execute("INSERT INTO changes (clock, origin, tbl, op, pk, row) VALUES (?, ?, ?, ?, ?, ?)",
+                        (clock, origin, tbl, op, pk, row_json))
+        # Lamport rule: the local clock moves past everything it has seen
+        cur.execute("UPDATE sync_state SET value = MAX(value, ?) WHERE key = 'clock'", (max_clock,))
+        set_tracking(cur, True)
+        conn.commit()
+    except (sqlite3.Error, KeyError):
+        conn.rollback()
+        raise
+    return applied, skipped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and replay gradebook changesets")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('export', help="write changes newer than --since to a file")
+    p.add_argument('db')
+    p.add_argument('out')
+    p.add_argument('--since', type=int, default=0)
+    p = sub.add_parser('replay', help="apply a changeset file")
+    p.add_argument('db')
+    p.add_argument('changeset')
+    p = sub.add_parser('init-copy', help="give a copied database file its own origin")
+    p.add_argument('db')
+    p = sub.add_parser('status', help="show origin and clock")
+    p.add_argument('db')
+    args = parser.parse_args()
+
+    conn = gradedb.connect(args.db)
+    cur = conn.cursor()
+    if args.command == 'export':
+        count, last_clock = export_changes(conn, args.out, args.since)
+        print(f"Exported {count} changes up to clock {last_clock}")
+    elif args.command == 'replay':
+        header, changes = read_changes(args.changeset)
+        applied, skipped = replay_changes(conn, changes)
+        print(f"Applied {applied}, skipped {skipped} changes from {header['origin']} (up to clock {header['clock']})")
+    elif args.command == 'init-copy':
+        print(f"New origin {new_origin(conn)}")
+    else:
+        print(f"origin {sync_value(cur, 'origin')}, clock {sync_value(cur, 'clock')}")
@@ -0,0 +1,139 @@
+import argparse
+import ast
+import os
+import random
+import re
+import sys
+import tempfile
+
+import curves
+import datagen
+import duedates
+import exports
+import gradebook
+import gradedb
+import reports
+import transcripts
+import whatif
+
+# Fails if any statement the app issues reads grades or assignments with a full
+# SCAN instead of an index SEARCH. Statements come from two places:
+#   - string literals passed to execute() in the app module (parsed, not run)
+#   - everything the shared query modules send while exercising the hot paths,
+#     captured with set_trace_callback
+CHECKED_TABLES = ('grades', 'assignments')
+APP_MODULE = 'studentgradingfinal.py'
+DEFAULT_GRADES = 100000
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+QUERY_KINDS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def app_statements(path=os.path.join(APP_DIR, APP_MODULE)):
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    statements = []
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == 'execute'
+                and node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+            statements.append((f"{APP_MODULE}:{node.lineno}", node.args[0].value))
+    return statements
+
+
+def traced_statements(conn, seed):
+    # Runs each hot path once; the trace callback sees the SQL with values bound
+    seen = []
+    conn.set_trace_callback(seen.append)
+    cur = conn.cursor()
+    rng = random.Random(seed)
+    rocket_id = rng.choice([r[0] for r in conn.execute("SELECT rocket_id FROM students")])
+    class_id, title, assignment_id = conn.execute(
+        "SELECT class_id, title, id FROM assignments ORDER BY id LIMIT 1").fetchone()
+    seen.clear()
+
+    reports.student_report(cur, rocket_id)
+    reports.class_summary(cur, rocket_id)
+    reports.class_section(cur, rocket_id, class_id)
+    with open(os.devnull, 'w', newline='') as f:
+        exports.write_class_csv(cur, class_id, f)
+        exports.write_all_csv(cur, f)
+    gradedb.list_students(cur, sort_by='name')
+    gradedb.find_assignment_id(cur, title, class_id)
+    current = gradedb.get_grade(cur, rocket_id, assignment_id)
+    gradedb.save_grade(cur, rocket_id, assignment_id, 50, class_id, current[1] if current else 0)
+    gradedb.save_grade(cur, rocket_id, assignment_id, 60, class_id)
+    gradedb.class_average(cur, class_id)
+    gradedb.roster(cur, class_id)
+    gradedb.get_assignment(cur, assignment_id)
+    duedates.upcoming(cur)
+    duedates.upcoming(cur, class_id=class_id)
+    duedates.overdue(cur)
+    duedates.overdue(cur, class_id=class_id)
+    duedates.missing_work(cur)
+    duedates.missing_work(cur, class_id=class_id)
+    whatif.required_scores(cur, rocket_id, class_id, 'B')
+    whatif.required_for_class(cur, class_id, 'B')
+    whatif.project(cur, rocket_id, class_id, {assignment_id: 90})
+    gradebook.Gradebook.load(cur, class_id)
+    for _ in transcripts.transcripts(cur):
+        pass
+    curves.preview(cur, assignment_id, 'flat', points=5)
+    curves.list_curves(cur, assignment_id)
+    conn.rollback()
+    # Applying and reverting a curve commit on their own
+    curve_id, _ = curves.apply_curve(conn, assignment_id, 'flat', points=5)
+    curves.revert_curve(conn, curve_id)
+    conn.set_trace_callback(None)
+    return [('traced', sql) for sql in seen]
+
+
+def table_aliases(sql):
+    # Query plans name tables by alias, so collect every name grades/assignments go by
+    names = set()
+    for table in CHECKED_TABLES:
+        names.add(table)
+        for match in re.finditer(rf"\b(?:\w+\.)?{table}\s+(?:AS\s+)?(\w+)", sql, re.IGNORECASE):
+            alias = match.group(1)
+            if alias.upper() not in ('ON', 'WHERE', 'SET', 'JOIN', 'LEFT', 'INNER', 'VALUES', 'ORDER', 'GROUP'):
+                names.add(alias)
+    return names
+
+
+def check(conn, statements):
+    failures = []
+    checked = set()
+    for source, sql in statements:
+        text = ' '.join(sql.split())
+        if not text.upper().startswith(QUERY_KINDS) or text in checked:
+            continue
+        checked.add(text)
+        params = [None] * text.count('?')
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        names = table_aliases(sql)
+        scans = [detail for detail in plan
+                 if re.match(r"SCAN (\w+)", detail) and re.match(r"SCAN (\w+)", detail).group(1) in names]
+        print(f"{'FAIL' if scans else 'ok  '} {source}: {text[:100]}")
+        for detail in plan:
+            print(f"       {detail}")
+        if scans:
+            failures.append((source, text, scans))
+    return len(checked), failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a hot query scans grades or assignments")
+    parser.add_argument('--grades', type=int, default=DEFAULT_GRADES, help="size of the synthetic database")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--analyze', action='store_true', help="run ANALYZE first, as idle maintenance would")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = gradedb.connect(os.path.join(tmp, 'plans.db'))
+        datagen.generate(conn, args.grades, args.seed)
+        if args.analyze:
+            conn.execute("ANALYZE")
+        statements = app_statements() + traced_statements(conn, args.seed)
+        count, failures = check(conn, statements)
+        conn.close()
+
+    print(f"\n{count} statements checked, {len(failures)} scanning {' or '.join(CHECKED_TABLES)}")
+    sys.exit(1 if failures else 0)
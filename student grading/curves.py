@@ -0,0 +1,238 @@
+import argparse
+import json
+import math
+import sqlite3
+import statistics
+from array import array
+from collections import Counter
+from datetime import datetime
+
+import gradedb
+
+# Curves for one assignment. A preview computes every new score in a single
+# pass over the assignment's score column; applying stages the (old, new)
+# pairs in curve_scores and rewrites grades with one UPDATE ... FROM, so the
+# curve can later be reverted the same way. New scores are rounded to whole
+# points and kept between 0 and the assignment's max score.
+#
+#   flat   points=N           add N points to everyone
+#   mean   target=P           scale so the class mean becomes P percent
+#   sqrt                      sqrt(score / max) * max
+#   range  low=P high=Q       map the lowest..highest score onto P..Q percent
+METHODS = ('flat', 'mean', 'sqrt', 'range')
+
+
+def load_scores(cursor, assignment_id):
+    cursor.execute("SELECT max_score FROM assignments WHERE id = ?", (assignment_id,))
+    result = cursor.fetchone()
+    if not result:
+        raise ValueError(f"No assignment with ID {assignment_id}")
+    cursor.execute("SELECT rocket_id, score FROM grades WHERE assignment_id = ? AND score IS NOT NULL "
+                   "ORDER BY rocket_id", (assignment_id,))
+    rows = cursor.fetchall()
+    return result[0], [r[0] for r in rows], array('d', [r[1] for r in rows])
+
+
+def _param(params, name):
+    if name not in params:
+        raise ValueError(f"Missing curve parameter {name!r}")
+    return float(params[name])
+
+
+def resolve(method, scores, max_score, **params):
+    # Turns the request into the exact per-score transform, fixing anything
+    # that depends on the current scores (mean, min, max) so apply and a later
+    # look at the log see the same numbers as the preview
+    if method not in METHODS:
+        raise ValueError(f"Unknown curve method {method!r}")
+    if not max_score or max_score <= 0:
+        raise ValueError("Assignment has no max score to curve against")
+    if method == 'flat':
+        return _finite({'offset': _param(params, 'points'), 'scale': 1.0})
+    if method == 'mean':
+        mean = statistics.fmean(scores) if scores else 0
+        if mean <= 0:
+            raise ValueError("Cannot scale a mean of zero")
+        return _finite({'offset': 0.0, 'scale': _param(params, 'target') / 100 * max_score / mean})
+    if method == 'sqrt':
+        return {'root': True}
+    low = _param(params, 'low') / 100 * max_score
+    high = _param(params, 'high') / 100 * max_score
+    lo, hi = (min(scores), max(scores)) if scores else (0, 0)
+    if hi == lo:
+        return _finite({'offset': high - lo, 'scale': 1.0})
+    scale = (high - low) / (hi - lo)
+    return _finite({'offset': low - lo * scale, 'scale': scale})
+
+
+def _finite(resolved):
+    # Finite parameters can still overflow once multiplied out
+    if not all(math.isfinite(v) for v in resolved.values()):
+        raise ValueError("Curve parameters are too large")
+    return resolved
+
+
+def transform(scores, max_score, resolved):
+    # Whole column at once; returns whole-point scores clamped to 0..max_score
+    if resolved.get('root'):
+        raw = [math.sqrt(max(s, 0) / max_score) * max_score for s in scores]
+    else:
+        scale, offset = resolved['scale'], resolved['offset']
+        raw = [s * scale + offset for s in scores]
+    # Clamped before rounding, so a score that overflowed to infinity still lands in range
+    return array('d', [min(max_score, math.floor(min(max(r, 0), max_score) + 0.5)) for r in raw])
+
+
+def distribution(scores, max_score):
+    if not scores:
+        return {'count': 0}
+    percents = [s / max_score * 100 for s in scores]
+    return {
+        'count': len(scores),
+        'mean': round(statistics.fmean(scores), 2),
+        'median': statistics.median(scores),
+        'stdev': round(statistics.pstdev(scores), 2),
+        'min': min(scores),
+        'max': max(scores),
+        'letters': dict(Counter(gradedb.calculate_letter_grade(p)[0] for p in percents)),
+    }
+
+
+def preview(cursor, assignment_id, method, **params):
+    max_score, rocket_ids, before = load_scores(cursor, assignment_id)
+    resolved = resolve(method, before, max_score, **params)
+    after = transform(before, max_score, resolved)
+    letters = lambda s: gradedb.calculate_letter_grade(s / max_score * 100)[0]
+    shifts = Counter((letters(old), letters(new)) for old, new in zip(before, after) if letters(old) != letters(new))
+    return {
+        'assignment_id': assignment_id,
+        'method': method,
+        'params': params,
+        'resolved': resolved,
+        'before': distribution(before, max_score),
+        'after': distribution(after, max_score),
+        'letter_shifts': {f"{old} -> {new}": n for (old, new), n in sorted(shifts.items())},
+        'changes': [(rid, int(old), int(new)) for rid, old, new in zip(rocket_ids, before, after) if old != new],
+    }
+
+# === Apply / Revert ===
+def apply_curve(conn, assignment_id, method, **params):
+    # Recomputed under the write lock so nothing edited since the preview is lost
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        result = preview(cur, assignment_id, method, **params)
+        cur.execute("INSERT INTO curves (assignment_id, method, params, applied_at) VALUES (?, ?, ?, ?)",
+                    (assignment_id, method, json.dumps({'params': params, 'resolved': result['resolved']}),
+                     datetime.now().isoformat(timespec='seconds')))
+        curve_id = cur.lastrowid
+        cur.executemany("INSERT INTO curve_scores (curve_id, rocket_id, old_score, new_score) VALUES (?, ?, ?, ?)",
+                        [(curve_id,) + change for change in result['changes']])
+        cur.execute('''
+            UPDATE grades SET score = cs.new_score, version = grades.version + 1
+            FROM curve_scores cs
+            WHERE cs.curve_id = ? AND grades.assignment_id = ? AND grades.rocket_id = cs.rocket_id
+        ''', (curve_id, assignment_id))
+        updated = cur.rowcount
+        conn.commit()
+    except (sqlite3.Error, ValueError):
+        conn.rollback()
+        raise
+    return curve_id, updated
+
+
+def revert_curve(conn, curve_id):
+    # Only the latest curve on an assignment can be undone. Scores edited by
+    # hand since the curve are left alone and counted as skipped.
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.execute("SELECT assignment_id, reverted_at FROM curves WHERE id = ?", (curve_id,))
+        result = cur.fetchone()
+        if not result:
+            raise ValueError(f"No curve with ID {curve_id}")
+        assignment_id, reverted_at = result
+        if reverted_at:
+            raise ValueError(f"Curve {curve_id} was already reverted")
+        cur.execute("SELECT 1 FROM curves WHERE assignment_id = ? AND id > ? AND reverted_at IS NULL",
+                    (assignment_id, curve_id))
+        if cur.fetchone():
+            raise ValueError("Revert the later curves on this assignment first")
+        cur.execute('''
+            UPDATE grades SET score = cs.old_score, version = grades.version + 1
+            FROM curve_scores cs
+            WHERE cs.curve_id = ? AND grades.assignment_id = ? AND grades.rocket_id = cs.rocket_id
+              AND grades.score = cs.new_score
+        ''', (curve_id, assignment_id))
+        restored = cur.rowcount
+        cur.execute("SELECT COUNT(*) FROM curve_scores WHERE curve_id = ?", (curve_id,))
+        skipped = cur.fetchone()[0] - restored
+        cur.execute("UPDATE curves SET reverted_at = ? WHERE id = ?",
+                    (datetime.now().isoformat(timespec='seconds'), curve_id))
+        conn.commit()
+    except (sqlite3.Error, ValueError):
+        conn.rollback()
+        raise
+    return restored, skipped
+
+
+def list_curves(cursor, assignment_id):
+    cursor.execute('''
+        SELECT c.id, c.method, c.params, c.applied_at, c.reverted_at, COUNT(cs.rocket_id)
+        FROM curves c LEFT JOIN curve_scores cs ON cs.curve_id = c.id
+        WHERE c.assignment_id = ?
+        GROUP BY c.id ORDER BY c.id DESC
+    ''', (assignment_id,))
+    return cursor.fetchall()
+
+
+def parse_params(pairs):
+    # "points=5" style arguments from the command line or the app
+    params = {}
+    for pair in pairs:
+        key, _, value = pair.partition('=')
+        if not value:
+            raise ValueError(f"Expected name=value, got {pair!r}")
+        key, value = key.strip(), float(value)
+        if not math.isfinite(value):
+            raise ValueError(f"Curve parameter {key!r} must be a finite number")
+        params[key] = value
+    return params
+
+
+def run(conn, args):
+    if args.command == 'preview':
+        result = preview(conn.cursor(), args.assignment_id, args.method, **parse_params(args.params))
+        result['changes'] = len(result['changes'])
+        print(json.dumps(result, indent=2))
+    elif args.command == 'apply':
+        curve_id, updated = apply_curve(conn, args.assignment_id, args.method, **parse_params(args.params))
+        print(f"Curve {curve_id} applied to {updated} grades")
+    elif args.command == 'revert':
+        restored, skipped = revert_curve(conn, args.curve_id)
+        print(f"Restored {restored} grades, {skipped} edited since the curve were left as they are")
+    else:
+        for row in list_curves(conn.cursor(), args.assignment_id):
+            print(row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preview, apply or revert a curve on an assignment")
+    parser.add_argument('--db', default='student_grading.db')
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('preview', 'apply'):
+        p = sub.add_parser(name)
+        p.add_argument('assignment_id', type=int)
+        p.add_argument('method', choices=METHODS)
+        p.add_argument('params', nargs='*', help="e.g. points=5, target=78, low=55 high=98")
+    p = sub.add_parser('revert')
+    p.add_argument('curve_id', type=int)
+    p = sub.add_parser('list')
+    p.add_argument('assignment_id', type=int)
+    args = parser.parse_args()
+
+    conn = gradedb.connect(args.db)
+    try:
+        run(conn, args)
+    except ValueError as e:
+        raise SystemExit(str(e))
@@ -0,0 +1,84 @@
+import argparse
+import math
+import random
+
+import gradedb
+
+# --- Dataset Shape ---
+CLASS_SIZE = 30
+ASSIGNMENTS_PER_CLASS = 10
+CLASSES_PER_STUDENT = 5
+FIRST_NAMES = ["Ava", "Ben", "Chloe", "Diego", "Emma", "Farah", "Gus", "Hana", "Ivan", "Jada",
+               "Kofi", "Lena", "Mateo", "Nia", "Omar", "Priya", "Quinn", "Rosa", "Sam", "Tara"]
+LAST_NAMES = ["Adams", "Brown", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Hughes", "Ito", "Jones",
+              "Khan", "Lopez", "Miller", "Nguyen", "Okafor", "Patel", "Reyes", "Smith", "Tanaka", "Wong"]
+SUBJECTS = ["Algebra", "Biology", "Chemistry", "English", "French", "Geometry", "History", "Physics"]
+
+
+def shape_for(grades):
+    # Every student in a class gets a score on every assignment, so the grade
+    # count fixes the number of classes and the number of students follows.
+    per_class = CLASS_SIZE * ASSIGNMENTS_PER_CLASS
+    classes = max(1, math.ceil(grades / per_class))
+    students = max(CLASS_SIZE, classes * CLASS_SIZE // CLASSES_PER_STUDENT)
+    return students, classes
+
+
+def rocket_id(n):
+    return f"R{n:08d}"
+
+
+def generate(conn, grades=1000, seed=42):
+    rng = random.Random(seed)
+    n_students, n_classes = shape_for(grades)
+    cur = conn.cursor()
+    # Synthetic rows are not edits anyone needs to sync
+    cur.execute("UPDATE sync_state SET value = 0 WHERE key = 'tracking'")
+
+    students = [(rocket_id(i + 1), f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}")
+                for i in range(n_students)]
+    cur.executemany("INSERT INTO students (rocket_id, name) VALUES (?, ?)", students)
+
+    classes = [(f"C{i + 1:05d}", f"{SUBJECTS[i % len(SUBJECTS)]} {i // len(SUBJECTS) + 1}")
+               for i in range(n_classes)]
+    cur.executemany("INSERT INTO classes (class_id, class_name) VALUES (?, ?)", classes)
+
+    ids = [s[0] for s in students]
+    assignment_id = 0
+    written = 0
+    for class_id, class_name in classes:
+        roster = rng.sample(ids, CLASS_SIZE)
+        assignments = []
+        for n in range(ASSIGNMENTS_PER_CLASS):
+            assignment_id += 1
+            type_ = "Test" if n % 4 == 3 else "Homework"
+            max_score = 100 if type_ == "Test" else rng.choice([10, 20, 50])
+            due = f"2024-{(n % 9) + 1:02d}-{rng.randint(1, 28):02d}"
+            assignments.append((assignment_id, f"{class_name} {type_} {n + 1}", due, max_score, type_, class_id))
+        cur.executemany("INSERT INTO assignments (id, title, due_date, max_score, type, class_id) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", assignments)
+
+        rows = []
+        for aid, _, _, max_score, _, _ in assignments:
+            for rid in roster:
+                if written + len(rows) >= grades:
+                    break
+                score = max(0, min(max_score, round(rng.gauss(0.8, 0.12) * max_score)))
+                rows.append((rid, aid, score, class_id))
+        cur.executemany("INSERT INTO grades (rocket_id, assignment_id, score, class_id) VALUES (?, ?, ?, ?)", rows)
+        written += len(rows)
+
+    cur.execute("UPDATE sync_state SET value = 1 WHERE key = 'tracking'")
+    conn.commit()
+    return {'students': n_students, 'classes': n_classes, 'assignments': assignment_id, 'grades': written}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill a gradebook database with seeded synthetic data")
+    parser.add_argument('path')
+    parser.add_argument('--grades', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    conn = gradedb.connect(args.path)
+    print(generate(conn, args.grades, args.seed))
@@ -0,0 +1,105 @@
+import argparse
+from datetime import date, timedelta
+
+import gradedb
+
+# Date-based views over ISO due dates. Every query compares due_date as text,
+# which orders correctly for YYYY-MM-DD, so the (class_id, due_date) and
+# (due_date) indexes serve the ranges. today defaults to the local date.
+UPCOMING_DAYS = 7
+
+ROSTER = "SELECT rocket_id, class_id FROM enrollments"
+
+
+def _today(today):
+    return today or date.today().isoformat()
+
+
+def _class_filter(class_id, column='a.class_id'):
+    return (f" AND {column} = ?", (class_id,)) if class_id else ("", ())
+
+
+def _roster(class_id):
+    return (ROSTER + " WHERE class_id = ?", (class_id,)) if class_id else (ROSTER, ())
+
+
+def upcoming(cursor, days=UPCOMING_DAYS, class_id=None, today=None):
+    # Assignments due from today up to (not including) today + days
+    start = _today(today)
+    end = (date.fromisoformat(start) + timedelta(days=days)).isoformat()
+    where, params = _class_filter(class_id)
+    cursor.execute(f'''
+        SELECT a.id, a.class_id, c.class_name, a.title, a.type, a.due_date
+        FROM assignments a JOIN classes c ON c.class_id = a.class_id
+        WHERE a.due_date >= ? AND a.due_date < ?{where}
+        ORDER BY a.due_date, a.class_id, a.title
+    ''', (start, end) + params)
+    return cursor.fetchall()
+
+
+def overdue(cursor, class_id=None, today=None):
+    # Past-due assignments with how many roster students have no score yet
+    roster, roster_params = _roster(class_id)
+    where, params = _class_filter(class_id)
+    cursor.execute(f'''
+        WITH roster AS ({roster})
+        SELECT a.id, a.class_id, c.class_name, a.title, a.type, a.due_date,
+               (SELECT COUNT(*) FROM roster r
+                WHERE r.class_id = a.class_id
+                  AND NOT EXISTS (SELECT 1 FROM grades g WHERE g.rocket_id = r.rocket_id
+                                  AND g.assignment_id = a.id AND g.score IS NOT NULL)) AS missing
+        FROM assignments a JOIN classes c ON c.class_id = a.class_id
+        WHERE a.due_date < ?{where}
+        ORDER BY a.due_date DESC, a.class_id, a.title
+    ''', roster_params + (_today(today),) + params)
+    return cursor.fetchall()
+
+
+def missing_work(cursor, class_id=None, today=None):
+    # Roster x past-due assignments anti-joined against grades, as one query:
+    # (rocket_id, name, class_id, assignment_id, title, due_date)
+    roster, roster_params = _roster(class_id)
+    where, params = _class_filter(class_id, 'class_id')
+    cursor.execute(f'''
+        WITH roster AS ({roster}),
+             past_due AS (SELECT id, class_id, title, due_date FROM assignments
+                          WHERE due_date < ?{where})
+        SELECT r.rocket_id, s.name, p.class_id, p.id, p.title, p.due_date
+        FROM roster r
+        JOIN past_due p ON p.class_id = r.class_id
+        JOIN students s ON s.rocket_id = r.rocket_id
+        WHERE NOT EXISTS (SELECT 1 FROM grades g WHERE g.rocket_id = r.rocket_id
+                          AND g.assignment_id = p.id AND g.score IS NOT NULL)
+        ORDER BY p.class_id, r.rocket_id, p.due_date
+    ''', roster_params + (_today(today),) + params)
+    return cursor.fetchall()
+
+
+def invalid_due_dates(cursor):
+    # Due dates the migration couldn't read, for a teacher to correct
+    cursor.execute("SELECT id, class_id, title, due_date FROM assignments "
+                   "WHERE due_date IS NOT NULL AND due_date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'")
+    return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upcoming, overdue and missing coursework")
+    parser.add_argument('view', choices=['upcoming', 'overdue', 'missing', 'invalid'])
+    parser.add_argument('--db', default='student_grading.db')
+    parser.add_argument('--class', dest='class_id')
+    parser.add_argument('--days', type=int, default=UPCOMING_DAYS)
+    parser.add_argument('--today', type=gradedb.parse_due_date, help="pretend today is this date")
+    args = parser.parse_args()
+
+    cur = gradedb.connect(args.db).cursor()
+    if args.view == 'upcoming':
+        rows = upcoming(cur, args.days, args.class_id, args.today)
+    elif args.view == 'overdue':
+        rows = overdue(cur, args.class_id, args.today)
+    elif args.view == 'missing':
+        rows = missing_work(cur, args.class_id, args.today)
+    else:
+        rows = invalid_due_dates(cur)
+    for row in rows:
+        print(' | '.join('' if v is None else str(v) for v in row))
+    print(f"{len(rows)} rows")
@@ -0,0 +1,81 @@
+import json
+from collections import namedtuple
+
+# Change notifications for open screens. Every write to a tracked table is
+# already logged in the changes table by the sync triggers, so the bus reads
+# the log past the last entry it has seen and publishes one Change per entry.
+# That covers every writer (app screens, curves, registrar syncs, imported
+# changesets, other processes on the same file) without any of them having to
+# announce their writes. Writes made with tracking off (migrations, term
+# archiving, restores) are not published; screens are rebuilt after those.
+#
+#   kind  'student', 'class', 'assignment', 'grade' or 'enrollment'
+#   op    'insert', 'update' or 'delete'
+#   key   the row's key as logged, before the change (gradedb.TRACKED_TABLES)
+#   row   the row's new values, None for a delete
+KINDS = {
+    'students': 'student',
+    'classes': 'class',
+    'assignments': 'assignment',
+    'grades': 'grade',
+    'enrollments': 'enrollment',
+}
+# Past this many pending changes, patching row by row costs more than
+# rebuilding the screen, so poll() reports an overflow instead
+MAX_PATCHES = 500
+
+Change = namedtuple('Change', ['kind', 'op', 'key', 'row'])
+
+
+class ChangeBus:
+    def __init__(self, conn):
+        self.conn = conn
+        self.subscribers = []
+        self.last_seq = self._latest()
+
+    def _latest(self):
+        return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def subscribe(self, kinds, callback):
+        # callback(change) for every change of the given kinds; returns a token for unsubscribe
+        token = (frozenset(kinds), callback)
+        self.subscribers.append(token)
+        return token
+
+    def unsubscribe(self, token):
+        if token in self.subscribers:
+            self.subscribers.remove(token)
+
+    def clear(self):
+        self.subscribers = []
+
+    def publish(self, change):
+        # A callback may rebuild its screen, which drops the other subscriptions
+        for token in list(self.subscribers):
+            if change.kind in token[0] and token in self.subscribers:
+                token[1](change)
+
+    def skip(self):
+        # Forget pending changes, e.g. after the data was replaced wholesale
+        self.last_seq = self._latest()
+
+    def poll(self):
+        # Publishes the changes committed since the last poll and returns how
+        # many there were, or None if there were more than MAX_PATCHES (they
+        # are skipped and the caller should rebuild instead). Reading inside an
+        # open transaction could see log entries that are later rolled back.
+        if self.conn.in_transaction:
+            return 0
+        cur = self.conn.execute("SELECT seq, tbl, op, pk, row FROM changes WHERE seq > ? ORDER BY seq LIMIT ?",
+                                (self.last_seq, MAX_PATCHES + 1))
+        pending = cur.fetchall()
+        if not pending:
+            return 0
+        self.last_seq = pending[-1][0]
+        if len(pending) > MAX_PATCHES:
+            self.skip()
+            return None
+        for _, tbl, op, pk, row in pending:
+            if tbl in KINDS and self.subscribers:
+                self.publish(Change(KINDS[tbl], op, json.loads(pk), json.loads(row) if row else None))
+        return len(pending)
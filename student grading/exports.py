@@ -0,0 +1,42 @@
+import csv
+
+CLASS_HEADER = ["Rocket ID", "Name", "Assignment", "Score"]
+ALL_DATA_HEADER = ["Rocket ID", "Student Name", "Class ID", "Class Name", "Assignment ID",
+                   "Assignment Title", "Type", "Due Date", "Max Score", "Score"]
+
+
+def write_rows(f, header, cursor, batch_size=1000):
+    # Stream the cursor in batches instead of materializing every row
+    writer = csv.writer(f)
+    writer.writerow(header)
+    count = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return count
+        writer.writerows(rows)
+        count += len(rows)
+
+
+def write_class_csv(cursor, class_id, f):
+    cursor.execute('''
+        SELECT s.rocket_id, s.name, a.title, g.score
+        FROM enrollments e
+        JOIN students s ON s.rocket_id = e.rocket_id
+        JOIN grades g ON g.rocket_id = e.rocket_id AND g.class_id = e.class_id
+        JOIN assignments a ON a.id = g.assignment_id
+        WHERE e.class_id = ?
+    ''', (class_id,))
+    return write_rows(f, CLASS_HEADER, cursor)
+
+
+def write_all_csv(cursor, f, schema='main'):
+    cursor.execute(f'''
+        SELECT s.rocket_id, s.name, c.class_id, c.class_name,
+               a.id, a.title, a.type, a.due_date, a.max_score, g.score
+        FROM {schema}.students s
+        LEFT JOIN {schema}.grades g ON s.rocket_id = g.rocket_id
+        LEFT JOIN {schema}.assignments a ON g.assignment_id = a.id
+        LEFT JOIN {schema}.classes c ON g.class_id = c.class_id
+    ''')
+    return write_rows(f, ALL_DATA_HEADER, cursor)
@@ -0,0 +1,198 @@
+import argparse
+import math
+import sys
+from array import array
+
+import curves
+import gradedb
+
+# Compact in-memory gradebook for one class: students (the roster) by
+# assignments, with every score in one flat array('f') (4 bytes a cell, row
+# per student) and a bitmap marking which cells hold a grade. Students and
+# assignments are interned to row and column numbers once, so nothing else is
+# stored per cell. Loading streams the grade rows straight into the arrays.
+FETCH_BATCH = 1000
+
+
+class StudentRow:
+    # A view of one student's row; holds no scores of its own
+    __slots__ = ('book', 'index')
+
+    def __init__(self, book, index):
+        self.book = book
+        self.index = index
+
+    @property
+    def rocket_id(self):
+        return self.book.students[self.index]
+
+    @property
+    def name(self):
+        return self.book.names[self.index]
+
+    @property
+    def scores(self):
+        return [self.book.score(self.index, j) for j in range(len(self.book.assignments))]
+
+    def totals(self):
+        earned = possible = 0.0
+        for j in range(len(self.book.assignments)):
+            if self.book.has_grade(self.index, j):
+                earned += self.book.scores[self.index * len(self.book.assignments) + j]
+                possible += self.book.max_scores[j]
+        return earned, possible
+
+    @property
+    def percentage(self):
+        earned, possible = self.totals()
+        return earned / possible * 100 if possible else None
+
+    @property
+    def letter(self):
+        percentage = self.percentage
+        return gradedb.calculate_letter_grade(percentage)[0] if percentage is not None else None
+
+
+class Gradebook:
+    __slots__ = ('class_id', 'students', 'names', 'student_index', 'assignments', 'titles', 'max_scores',
+                 'assignment_index', 'scores', 'present')
+
+    def __init__(self, class_id, students, assignments):
+        # students: [(rocket_id, name)], assignments: [(id, title, max_score)]
+        self.class_id = class_id
+        self.students = [sys.intern(rid) for rid, _ in students]
+        self.names = [name for _, name in students]
+        self.student_index = {rid: i for i, rid in enumerate(self.students)}
+        self.assignments = array('l', [aid for aid, _, _ in assignments])
+        self.titles = [title for _, title, _ in assignments]
+        self.max_scores = array('f', [max_score or 0 for _, _, max_score in assignments])
+        self.assignment_index = {aid: j for j, aid in enumerate(self.assignments)}
+        cells = len(self.students) * len(self.assignments)
+        self.scores = array('f', bytes(4 * cells))
+        self.present = bytearray((cells + 7) // 8)
+
+    @classmethod
+    def load(cls, cursor, class_id):
+        cursor.execute("SELECT id, title, max_score FROM assignments WHERE class_id = ? ORDER BY due_date, id",
+                       (class_id,))
+        assignments = cursor.fetchall()
+        book = cls(class_id, gradedb.roster(cursor, class_id), assignments)
+        cursor.execute('''
+            SELECT g.rocket_id, g.assignment_id, g.score
+            FROM enrollments e
+            JOIN grades g ON g.rocket_id = e.rocket_id AND g.class_id = e.class_id
+            WHERE e.class_id = ? AND g.score IS NOT NULL
+        ''', (class_id,))
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH)
+            if not rows:
+                break
+            for rocket_id, assignment_id, score in rows:
+                i = book.student_index.get(rocket_id)
+                j = book.assignment_index.get(assignment_id)
+                if i is not None and j is not None:
+                    book.set_score(i, j, score)
+        return book
+
+    # --- Cells ---
+    def _cell(self, i, j):
+        return i * len(self.assignments) + j
+
+    def has_grade(self, i, j):
+        cell = self._cell(i, j)
+        return bool(self.present[cell >> 3] & (1 << (cell & 7)))
+
+    def score(self, i, j):
+        return self.scores[self._cell(i, j)] if self.has_grade(i, j) else None
+
+    def set_score(self, i, j, score):
+        cell = self._cell(i, j)
+        if score is None:
+            self.present[cell >> 3] &= ~(1 << (cell & 7)) & 0xFF
+            self.scores[cell] = 0.0
+        else:
+            self.present[cell >> 3] |= 1 << (cell & 7)
+            self.scores[cell] = score
+
+    def row(self, i):
+        return StudentRow(self, i)
+
+    def rows(self):
+        return [StudentRow(self, i) for i in range(len(self.students))]
+
+    def column(self, j):
+        # The graded scores of one assignment, in roster order
+        return array('d', [self.scores[self._cell(i, j)] for i in range(len(self.students)) if self.has_grade(i, j)])
+
+    def missing(self):
+        # (rocket_id, title) for every empty cell
+        return [(self.students[i], self.titles[j])
+                for i in range(len(self.students)) for j in range(len(self.assignments)) if not self.has_grade(i, j)]
+
+    def nbytes(self):
+        # Bytes held by the score grid and bitmap
+        return self.scores.itemsize * len(self.scores) + len(self.present)
+
+    # --- Analytics ---
+    def assignment_stats(self, j):
+        scores = self.column(j)
+        if not scores:
+            return {'title': self.titles[j], 'count': 0}
+        mean = sum(scores) / len(scores)
+        return {
+            'title': self.titles[j],
+            'count': len(scores),
+            'mean': round(mean, 2),
+            'min': min(scores),
+            'max': max(scores),
+            'stdev': round(math.sqrt(sum((s - mean) ** 2 for s in scores) / len(scores)), 2),
+            'max_score': self.max_scores[j],
+        }
+
+    def percentages(self):
+        # Per-student percentage over graded work, NaN where nothing is graded
+        return array('f', [p if p is not None else math.nan for p in (row.percentage for row in self.rows())])
+
+    def rankings(self):
+        # [(rank, rocket_id, percentage)], best first; ties share a rank
+        ranked = sorted(((p, i) for i, p in enumerate(self.percentages()) if not math.isnan(p)),
+                        key=lambda item: -item[0])
+        result = []
+        for position, (percentage, i) in enumerate(ranked):
+            rank = result[-1][0] if result and math.isclose(result[-1][2], percentage) else position + 1
+            result.append((rank, self.students[i], percentage))
+        return result
+
+    def curve_preview(self, j, method, **params):
+        # What a curve would do to one column, without touching the database
+        before = self.column(j)
+        max_score = self.max_scores[j]
+        resolved = curves.resolve(method, before, max_score, **params)
+        after = curves.transform(before, max_score, resolved)
+        return curves.distribution(before, max_score), curves.distribution(after, max_score)
+
+    def grid_row(self, i):
+        # One table row: rocket_id, name, each score ('' if missing), percentage, letter
+        row = StudentRow(self, i)
+        scores = ['' if s is None else f"{s:g}" for s in row.scores]
+        percentage = row.percentage
+        return [row.rocket_id, row.name] + scores + [f"{percentage:.1f}" if percentage is not None else '',
+                                                     row.letter or '']
+
+    def grid(self):
+        return [self.grid_row(i) for i in range(len(self.students))]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a class into the compact gradebook and summarise it")
+    parser.add_argument('class_id')
+    parser.add_argument('--db', default='student_grading.db')
+    args = parser.parse_args()
+
+    cur = gradedb.connect(args.db).cursor()
+    book = Gradebook.load(cur, args.class_id)
+    print(f"{args.class_id}: {len(book.students)} students x {len(book.assignments)} assignments, "
+          f"{book.nbytes()} bytes of scores")
+    for j in range(len(book.assignments)):
+        print(book.assignment_stats(j))
+    for rank, rocket_id, percentage in book.rankings()[:10]:
+        print(f"{rank:>3}. {rocket_id} {percentage:.1f}%")
@@ -0,0 +1,385 @@
+import argparse
+import os
+import re
+import shlex
+import sqlite3
+import sys
+
+import gradedb
+
+# Command-line front end for scripts and cron jobs: the app's operations as
+# subcommands, without tkinter. Lists print tab-separated rows. Everything
+# else is imported when a command needs it, so startup stays cheap.
+#
+#   gradectl.py students add R00000001 "Ada Lovelace"
+#   gradectl.py grades set CS101 "Homework 1" R00000001 9
+#   gradectl.py export all -o nightly.csv
+#   gradectl.py batch term-setup.txt        (or read the script from stdin)
+#
+# A batch script holds one command per line in the same syntax, without the
+# program name; blank lines and lines starting with # are skipped. The whole
+# script runs in one transaction: if any line fails, nothing is written.
+# Imports commit on their own, so they can't be part of a batch.
+ASSIGNMENT_TYPES = ('Homework', 'Test')
+NOT_IN_BATCH = ('batch', 'import')
+# Commands that only read; a batch of nothing else doesn't take the write lock
+READ_ONLY = {'students list', 'classes list', 'classes roster', 'assignments list', 'grades list', 'report',
+             'export class', 'export all', 'export transcripts', 'export changes'}
+
+
+class CommandError(Exception):
+    pass
+
+
+def integer(text):
+    # argparse type: an int that fits SQLite's 64-bit integers
+    value = int(text)
+    if not -2 ** 63 <= value < 2 ** 63:
+        raise argparse.ArgumentTypeError(f"{text} is out of range")
+    return value
+
+
+class BatchParser(argparse.ArgumentParser):
+    # Inside a batch a bad line is reported with its line number instead of exiting
+    def error(self, message):
+        raise CommandError(message)
+
+
+def emit(out, rows):
+    for row in rows:
+        out.write('\t'.join('' if v is None else str(v) for v in row) + '\n')
+
+
+def _assignment(cur, class_id, title):
+    assignment_id = gradedb.find_assignment_id(cur, title, class_id)
+    if assignment_id is None:
+        raise CommandError(f"No assignment {title!r} in {class_id}")
+    return gradedb.get_assignment(cur, assignment_id)
+
+
+def _require(cur, query, key, what):
+    if not cur.execute(query, (key,)).fetchone():
+        raise CommandError(f"No {what} {key}")
+
+
+def _changed(cur, what):
+    if cur.rowcount == 0:
+        raise CommandError(f"No {what}")
+
+# === Students ===
+def students_list(cur, args, out):
+    emit(out, gradedb.list_students(cur, args.sort))
+
+
+def students_add(cur, args, out):
+    if not re.match(r'^R\d{8}$', args.rocket_id):
+        raise CommandError("Rocket ID must start with 'R' and 8 digits.")
+    cur.execute("INSERT INTO students (rocket_id, name) VALUES (?, ?)", (args.rocket_id, args.name))
+
+
+def students_rename(cur, args, out):
+    cur.execute("UPDATE students SET name = ? WHERE rocket_id = ?", (args.name, args.rocket_id))
+    _changed(cur, f"student {args.rocket_id}")
+
+
+def students_delete(cur, args, out):
+    cur.execute("DELETE FROM students WHERE rocket_id = ?", (args.rocket_id,))
+    _changed(cur, f"student {args.rocket_id}")
+
+# === Classes ===
+def classes_list(cur, args, out):
+    emit(out, cur.execute("SELECT class_id, class_name FROM classes ORDER BY class_id"))
+
+
+def classes_add(cur, args, out):
+    cur.execute("INSERT INTO classes (class_id, class_name) VALUES (?, ?)", (args.class_id, args.class_name))
+
+
+def classes_rename(cur, args, out):
+    cur.execute("UPDATE classes SET class_name = ? WHERE class_id = ?", (args.class_name, args.class_id))
+    _changed(cur, f"class {args.class_id}")
+
+
+def classes_delete(cur, args, out):
+    cur.execute("DELETE FROM classes WHERE class_id = ?", (args.class_id,))
+    _changed(cur, f"class {args.class_id}")
+
+
+def classes_roster(cur, args, out):
+    emit(out, gradedb.roster(cur, args.class_id))
+
+
+def classes_enroll(cur, args, out):
+    _require(cur, "SELECT 1 FROM classes WHERE class_id = ?", args.class_id, "class")
+    added = gradedb.enroll(cur, args.class_id, args.rocket_ids)
+    if added < len(set(args.rocket_ids)):
+        cur.execute(f"SELECT rocket_id FROM students WHERE rocket_id IN ({','.join('?' * len(args.rocket_ids))})",
+                    args.rocket_ids)
+        unknown = sorted(set(args.rocket_ids) - {r[0] for r in cur.fetchall()})
+        if unknown:
+            raise CommandError(f"No student {', '.join(unknown)}")
+
+
+def classes_drop(cur, args, out):
+    gradedb.drop(cur, args.class_id, args.rocket_ids)
+
+# === Assignments ===
+def assignments_list(cur, args, out):
+    emit(out, cur.execute("SELECT id, title, due_date, max_score, type FROM assignments "
+                          "WHERE class_id = ? ORDER BY due_date, id", (args.class_id,)))
+
+
+def assignments_add(cur, args, out):
+    _require(cur, "SELECT 1 FROM classes WHERE class_id = ?", args.class_id, "class")
+    cur.execute("INSERT INTO assignments (title, due_date, max_score, type, class_id) VALUES (?, ?, ?, ?, ?)",
+                (args.title, gradedb.parse_due_date(args.due_date), args.max_score, args.type, args.class_id))
+
+
+def assignments_edit(cur, args, out):
+    assignment_id, title, due_date, max_score, type_, _, version = _assignment(cur, args.class_id, args.title)
+    gradedb.update_assignment(cur, assignment_id, args.new_title or title,
+                              gradedb.parse_due_date(args.due_date) if args.due_date else due_date,
+                              max_score if args.max_score is None else args.max_score,
+                              args.type or type_, version)
+
+
+def assignments_delete(cur, args, out):
+    cur.execute("DELETE FROM assignments WHERE id = ?", (_assignment(cur, args.class_id, args.title)[0],))
+
+# === Grades ===
+def grades_list(cur, args, out):
+    emit(out, cur.execute('''
+        SELECT g.rocket_id, a.title, g.score
+        FROM grades g JOIN assignments a ON a.id = g.assignment_id
+        WHERE a.class_id = ?
+        ORDER BY g.rocket_id, a.due_date, a.id
+    ''', (args.class_id,)))
+
+
+def grades_set(cur, args, out):
+    assignment = _assignment(cur, args.class_id, args.title)
+    _require(cur, "SELECT 1 FROM students WHERE rocket_id = ?", args.rocket_id, "student")
+    gradedb.save_grade(cur, args.rocket_id, assignment[0], args.score, args.class_id)
+
+
+def grades_clear(cur, args, out):
+    cur.execute("DELETE FROM grades WHERE rocket_id = ? AND assignment_id = ?",
+                (args.rocket_id, _assignment(cur, args.class_id, args.title)[0]))
+    _changed(cur, f"grade for {args.rocket_id} on {args.title!r}")
+
+# === Reports and Exports ===
+def _fraction(score, max_score):
+    return f"{'-' if score is None else f'{score:g}'}/{max_score:g}"
+
+
+def report(cur, args, out):
+    import reports
+    _require(cur, "SELECT 1 FROM students WHERE rocket_id = ?", args.rocket_id, "student")
+    for class_id, class_name, graded, earned, possible, percentage, letter in reports.class_summary(cur, args.rocket_id):
+        emit(out, [(class_id, class_name, _fraction(earned, possible),
+                    '' if percentage is None else f"{percentage:.1f}%", letter)])
+        if args.detail:
+            for title, score, max_score, percentage, letter in reports.class_section(cur, args.rocket_id, class_id):
+                emit(out, [('', title, _fraction(score, max_score), f"{percentage:.1f}%", letter)])
+
+
+def _output(args):
+    # The file named with -o, or None for the command's output stream
+    return open(args.output, 'w', newline='', encoding='utf-8') if args.output else None
+
+
+def export_class(cur, args, out):
+    import exports
+    f = _output(args)
+    try:
+        exports.write_class_csv(cur, args.class_id, f or out)
+    finally:
+        if f:
+            f.close()
+
+
+def export_all(cur, args, out):
+    import exports
+    f = _output(args)
+    try:
+        exports.write_all_csv(cur, f or out)
+    finally:
+        if f:
+            f.close()
+
+
+def export_transcripts(cur, args, out):
+    import transcripts
+    transcripts.write_transcripts(cur, args.output)
+
+
+def export_changes(cur, args, out):
+    import changesets
+    count, last_clock = changesets.export_changes(cur.connection, args.output, args.since)
+    emit(out, [(count, last_clock)])
+
+# === Imports ===
+# These manage their own transaction
+def import_changes(conn, args, out):
+    import changesets
+    header, changes = changesets.read_changes(args.path)
+    applied, skipped = changesets.replay_changes(conn, changes)
+    emit(out, [('applied', applied), ('skipped', skipped)])
+
+
+def import_roster(conn, args, out):
+    import registrar
+    result = registrar.sync_registrar(conn, args.path, not args.keep_missing, args.dry_run)
+    emit(out, [(key, ', '.join(value) if isinstance(value, list) else value) for key, value in result.items()])
+
+
+def build_parser(parser_class=argparse.ArgumentParser):
+    parser = parser_class(prog='gradectl', description="Scriptable student grading operations")
+    parser.add_argument('--db', default='student_grading.db')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def group(name, help):
+        return commands.add_parser(name, help=help).add_subparsers(dest='action', required=True)
+
+    def command(actions, name, func, *arguments, **kwargs):
+        sub = actions.add_parser(name, **kwargs)
+        for argument in arguments:
+            flags, options = (argument, {}) if isinstance(argument, str) else argument
+            sub.add_argument(*(flags if isinstance(flags, tuple) else (flags,)), **options)
+        sub.set_defaults(func=func)
+        return sub
+
+    score = ('score', {'type': integer})
+    output = (('-o', '--output'), {'help': "file to write (default: standard output)"})
+
+    students = group('students', "list, add, rename or delete students")
+    command(students, 'list', students_list, ('--sort', {'choices': ['name', 'rocket_id']}))
+    command(students, 'add', students_add, 'rocket_id', 'name')
+    command(students, 'rename', students_rename, 'rocket_id', 'name')
+    command(students, 'delete', students_delete, 'rocket_id', help="also deletes their grades")
+
+    classes = group('classes', "manage classes and rosters")
+    command(classes, 'list', classes_list)
+    command(classes, 'add', classes_add, 'class_id', 'class_name')
+    command(classes, 'rename', classes_rename, 'class_id', 'class_name')
+    command(classes, 'delete', classes_delete, 'class_id')
+    command(classes, 'roster', classes_roster, 'class_id')
+    command(classes, 'enroll', classes_enroll, 'class_id', ('rocket_ids', {'nargs': '+'}))
+    command(classes, 'drop', classes_drop, 'class_id', ('rocket_ids', {'nargs': '+'}), help="grades are kept")
+
+    assignments = group('assignments', "manage a class's assignments")
+    command(assignments, 'list', assignments_list, 'class_id')
+    command(assignments, 'add', assignments_add, 'class_id', 'title', 'due_date', ('max_score', {'type': integer}),
+            ('type', {'choices': ASSIGNMENT_TYPES}))
+    command(assignments, 'edit', assignments_edit, 'class_id', 'title', ('--new-title', {}), ('--due-date', {}),
+            ('--max-score', {'type': integer}), ('--type', {'choices': ASSIGNMENT_TYPES}))
+    command(assignments, 'delete', assignments_delete, 'class_id', 'title')
+
+    grades = group('grades', "list, set or clear grades")
+    command(grades, 'list', grades_list, 'class_id')
+    command(grades, 'set', grades_set, 'class_id', 'title', 'rocket_id', score)
+    command(grades, 'clear', grades_clear, 'class_id', 'title', 'rocket_id')
+
+    sub = commands.add_parser('report', help="a student's grades by class")
+    sub.add_argument('rocket_id')
+    sub.add_argument('--detail', action='store_true', help="list every assignment")
+    sub.set_defaults(func=report)
+
+    exports = group('export', "write CSV, transcripts or changesets")
+    command(exports, 'class', export_class, 'class_id', output)
+    command(exports, 'all', export_all, output)
+    command(exports, 'transcripts', export_transcripts, (('-o', '--output'), {'required': True}),
+            help="format from the extension: .txt, .csv or .jsonl")
+    command(exports, 'changes', export_changes, (('-o', '--output'), {'required': True}),
+            ('--since', {'type': integer, 'default': 0}))
+
+    imports = group('import', "apply changesets or a registrar roster (not in batches)")
+    command(imports, 'changes', import_changes, 'path')
+    command(imports, 'roster', import_roster, 'path', ('--dry-run', {'action': 'store_true'}),
+            ('--keep-missing', {'action': 'store_true'}))
+
+    sub = commands.add_parser('batch', help="run a script of commands in one transaction")
+    sub.add_argument('script', nargs='?', default='-', help="script file (default: standard input)")
+    return parser
+
+
+def read_script(path):
+    # [(line number, argv)]
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        lines = [(n, line.strip()) for n, line in enumerate(f, 1)]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    parser = build_parser(BatchParser)
+    commands = []
+    for n, line in lines:
+        if not line or line.startswith('#'):
+            continue
+        try:
+            args = parser.parse_args(shlex.split(line))
+        except (CommandError, ValueError) as e:
+            raise CommandError(f"line {n}: {e}")
+        if args.command in NOT_IN_BATCH:
+            raise CommandError(f"line {n}: {args.command} can't run inside a batch")
+        commands.append((n, args))
+    return commands
+
+
+class Collector:
+    # File-like sink for command output, written out once the batch commits
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def write(self, text):
+        self.buffer.append(text)
+
+
+def is_read_only(args):
+    return ' '.join(filter(None, (args.command, getattr(args, 'action', None)))) in READ_ONLY
+
+
+def run_batch(conn, commands, out):
+    # Every command in one transaction; any error undoes them all. Output is
+    # held until the commit, so a batch retried on a busy database prints once.
+    writes = not all(is_read_only(args) for _, args in commands)
+
+    def run():
+        buffer = []
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE" if writes else "BEGIN")
+        # Checked again in the transaction, in case a class was moved into a
+        # shard since startup: its grades would be out of this connection's reach
+        if cur.execute("SELECT 1 FROM shard_map LIMIT 1").fetchone():
+            raise CommandError("This database has sharded classes")
+        for n, args in commands:
+            try:
+                args.func(cur, args, Collector(buffer))
+            except (CommandError, ValueError, gradedb.ConflictError, sqlite3.IntegrityError, OSError) as e:
+                raise CommandError(f"line {n}: {e}" if n else str(e))
+        return buffer
+    out.write(''.join(gradedb.write_with_retry(conn, run)))
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.exists(args.db):
+        raise SystemExit(f"No database at {args.db}")
+    conn = gradedb.connect(args.db)
+    try:
+        if conn.execute("SELECT 1 FROM shard_map LIMIT 1").fetchone():
+            raise SystemExit("gradectl works on the directory file only; this database has sharded classes")
+        if args.command == 'import':
+            args.func(conn, args, sys.stdout)
+        elif args.command == 'batch':
+            run_batch(conn, read_script(args.script), sys.stdout)
+        else:
+            run_batch(conn, [(None, args)], sys.stdout)
+    except (CommandError, ValueError, OverflowError, KeyError, OSError, gradedb.ConflictError, sqlite3.Error) as e:
+        raise SystemExit(f"gradectl: {e}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
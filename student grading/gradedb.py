@@ -0,0 +1,577 @@
+import random
+import sqlite3
+import time
+from datetime import datetime
+
+# --- Schema ---
+# Each entry migrates the database one version forward. The position in the list
+# is the version it produces, recorded in PRAGMA user_version, so opening an
+# up-to-date database costs a single pragma read. Steps are SQL statements or,
+# where SQL can't express them, functions taking the connection.
+MIGRATIONS = [
+    # 1: original tables
+    [
+        '''CREATE TABLE IF NOT EXISTS students (
+    rocket_id TEXT PRIMARY KEY,
+    name TEXT
+)''',
+        '''CREATE TABLE IF NOT EXISTS classes (
+    class_id TEXT PRIMARY KEY,
+    class_name TEXT
+)''',
+        '''CREATE TABLE IF NOT EXISTS assignments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT,
+    due_date TEXT,
+    max_score INTEGER,
+    type TEXT,
+    class_id TEXT
+)''',
+        '''CREATE TABLE IF NOT EXISTS grades (
+    rocket_id TEXT,
+    assignment_id INTEGER,
+    score INTEGER,
+    class_id TEXT
+)''',
+    ],
+    # 2: closed terms archived to their own files (see terms.py)
+    [
+        '''CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    path TEXT,
+    closed_at TEXT
+)''',
+    ],
+    # 3: row versions for optimistic concurrency, one grade per student and assignment
+    [
+        "ALTER TABLE grades ADD COLUMN version INTEGER NOT NULL DEFAULT 1",
+        "ALTER TABLE assignments ADD COLUMN version INTEGER NOT NULL DEFAULT 1",
+        '''DELETE FROM grades WHERE rowid NOT IN (
+    SELECT MAX(rowid) FROM grades GROUP BY rocket_id, assignment_id
+)''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_grades_student_assignment ON grades (rocket_id, assignment_id)",
+    ],
+    # 4: assignments looked up by class and title (grading screen, section merges)
+    [
+        "CREATE INDEX IF NOT EXISTS idx_assignments_class_title ON assignments (class_id, title)",
+    ],
+]
+
+# --- Change Tracking ---
+# Triggers log every row change with a Lamport clock so offline copies can swap
+# changesets instead of whole files (see changesets.py). Assignments are keyed by
+# (class_id, title) rather than id, because ids are local to each copy.
+TRACKED_TABLES = {
+    'students': ("json_object('rocket_id', {r}.rocket_id)",
+                 "json_object('rocket_id', {r}.rocket_id, 'name', {r}.name)"),
+    'classes': ("json_object('class_id', {r}.class_id)",
+                "json_object('class_id', {r}.class_id, 'class_name', {r}.class_name)"),
+    'assignments': ("json_object('class_id', {r}.class_id, 'title', {r}.title)",
+                    "json_object('class_id', {r}.class_id, 'title', {r}.title, 'due_date', {r}.due_date, "
+                    "'max_score', {r}.max_score, 'type', {r}.type)"),
+    # Grades name their assignment's class, which may differ from grades.class_id
+    'grades': ("json_object('rocket_id', {r}.rocket_id, "
+               "'class_id', (SELECT class_id FROM assignments WHERE id = {r}.assignment_id), "
+               "'title', (SELECT title FROM assignments WHERE id = {r}.assignment_id))",
+               "json_object('rocket_id', {r}.rocket_id, "
+               "'class_id', (SELECT class_id FROM assignments WHERE id = {r}.assignment_id), "
+               "'title', (SELECT title FROM assignments WHERE id = {r}.assignment_id), "
+               "'score', {r}.score, 'grade_class_id', {r}.class_id)"),
+    'enrollments': ("json_object('class_id', {r}.class_id, 'rocket_id', {r}.rocket_id)",
+                    "json_object('class_id', {r}.class_id, 'rocket_id', {r}.rocket_id)"),
+}
+
+
+def change_triggers(tables=TRACKED_TABLES):
+    statements = []
+    for table in tables:
+        key, row = TRACKED_TABLES[table]
+        for op, key_ref, row_sql in (('insert', 'NEW', row.format(r='NEW')),
+                                     ('update', 'OLD', row.format(r='NEW')),
+                                     ('delete', 'OLD', 'NULL')):
+            statements.append(f'''CREATE TRIGGER IF NOT EXISTS track_{table}_{op} AFTER {op.upper()} ON {table}
+WHEN (SELECT value FROM sync_state WHERE key = 'tracking') = 1
+BEGIN
+    UPDATE sync_state SET value = value + 1 WHERE key = 'clock';
+    INSERT INTO changes (clock, origin, tbl, op, pk, row) VALUES (
+        (SELECT value FROM sync_state WHERE key = 'clock'),
+        (SELECT value FROM sync_state WHERE key = 'origin'),
+        '{table}', '{op}', {key.format(r=key_ref)}, {row_sql});
+END''')
+    return statements
+
+
+MIGRATIONS.append(
+    # 5: row-level change log for offline sync
+    [
+        "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value)",
+        '''INSERT OR IGNORE INTO sync_state (key, value) VALUES
+    ('clock', 0), ('tracking', 1), ('origin', lower(hex(randomblob(8))))''',
+        '''CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    clock INTEGER NOT NULL,
+    origin TEXT NOT NULL,
+    tbl TEXT NOT NULL,
+    op TEXT NOT NULL,
+    pk TEXT NOT NULL,
+    row TEXT
+)''',
+        "CREATE INDEX IF NOT EXISTS idx_changes_clock ON changes (clock)",
+        "CREATE INDEX IF NOT EXISTS idx_changes_row ON changes (tbl, pk, clock)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_changes_origin_clock ON changes (origin, clock)",
+    ] + change_triggers(['students', 'classes', 'assignments', 'grades'])
+)
+
+MIGRATIONS.append(
+    # 6: foreign keys with ON DELETE CASCADE. SQLite can't add constraints to an
+    # existing table, so assignments and grades are rebuilt after dropping the
+    # orphans that would violate them. Assignments go first so that dropping the
+    # old table cannot cascade into grades. The change triggers mention both
+    # tables, so they are dropped first and recreated at the end.
+    [f"DROP TRIGGER IF EXISTS track_{table}_{op}"
+     for table in ('assignments', 'grades') for op in ('insert', 'update', 'delete')] + [
+        "UPDATE sync_state SET value = 0 WHERE key = 'tracking'",
+        '''DELETE FROM assignments WHERE class_id IS NOT NULL
+    AND class_id NOT IN (SELECT class_id FROM classes)''',
+        '''DELETE FROM grades WHERE rocket_id NOT IN (SELECT rocket_id FROM students)
+    OR assignment_id NOT IN (SELECT id FROM assignments)''',
+        '''CREATE TABLE assignments_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT,
+    due_date TEXT,
+    max_score INTEGER,
+    type TEXT,
+    class_id TEXT REFERENCES classes (class_id) ON DELETE CASCADE,
+    version INTEGER NOT NULL DEFAULT 1
+)''',
+        "INSERT INTO assignments_new SELECT id, title, due_date, max_score, type, class_id, version FROM assignments",
+        # Keep the old AUTOINCREMENT high-water mark so deleted ids are never reused
+        """UPDATE sqlite_sequence SET seq = MAX(seq, (SELECT seq FROM sqlite_sequence WHERE name = 'assignments'))
+    WHERE name = 'assignments_new'""",
+        "DROP TABLE assignments",
+        "ALTER TABLE assignments_new RENAME TO assignments",
+        "CREATE INDEX IF NOT EXISTS idx_assignments_class_title ON assignments (class_id, title)",
+        '''CREATE TABLE grades_new (
+    rocket_id TEXT REFERENCES students (rocket_id) ON DELETE CASCADE,
+    assignment_id INTEGER REFERENCES assignments (id) ON DELETE CASCADE,
+    score INTEGER,
+    class_id TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+)''',
+        "INSERT INTO grades_new SELECT rocket_id, assignment_id, score, class_id, version FROM grades",
+        "DROP TABLE grades",
+        "ALTER TABLE grades_new RENAME TO grades",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_grades_student_assignment ON grades (rocket_id, assignment_id)",
+        "CREATE INDEX IF NOT EXISTS idx_grades_assignment ON grades (assignment_id)",
+        "UPDATE sync_state SET value = 1 WHERE key = 'tracking'",
+    ] + change_triggers(['assignments', 'grades'])
+)
+
+MIGRATIONS.append(
+    # 7: class-scoped grade queries (class export, class average) without a table scan
+    [
+        "CREATE INDEX IF NOT EXISTS idx_grades_class ON grades (class_id)",
+    ]
+)
+
+# --- Per-Student Data Versions ---
+# Any write that can change what a student's report shows bumps that student's
+# version, so cached reports (reports.ReportCache) know when they are stale.
+# Kept in the database so writes from other instances and sync replays count too.
+BUMP_STUDENT = '''INSERT INTO student_versions (rocket_id, version) VALUES ({rocket_id}, 1)
+        ON CONFLICT (rocket_id) DO UPDATE SET version = version + 1;'''
+BUMP_STUDENTS = '''INSERT INTO student_versions (rocket_id, version)
+        SELECT DISTINCT rocket_id, 1 FROM grades WHERE {condition}
+        ON CONFLICT (rocket_id) DO UPDATE SET version = version + 1;'''
+VERSION_BUMPS = [
+    ('grades', 'insert', BUMP_STUDENT.format(rocket_id='NEW.rocket_id')),
+    ('grades', 'update', BUMP_STUDENT.format(rocket_id='NEW.rocket_id') + '\n    ' +
+     BUMP_STUDENT.format(rocket_id='OLD.rocket_id')),
+    ('grades', 'delete', BUMP_STUDENT.format(rocket_id='OLD.rocket_id')),
+    ('assignments', 'update', BUMP_STUDENTS.format(condition='assignment_id = OLD.id')),
+    ('classes', 'update', BUMP_STUDENTS.format(condition='class_id = OLD.class_id')),
+    ('students', 'update', BUMP_STUDENT.format(rocket_id='NEW.rocket_id') + '\n    ' +
+     BUMP_STUDENT.format(rocket_id='OLD.rocket_id')),
+]
+
+MIGRATIONS.append(
+    # 8: per-student data versions for the report cache. Deletes of assignments
+    # and classes need no trigger of their own: they cascade to grades.
+    [
+        "CREATE TABLE IF NOT EXISTS student_versions (rocket_id TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+    ] + [f'''CREATE TRIGGER IF NOT EXISTS bump_{table}_{op} AFTER {op.upper()} ON {table}
+BEGIN
+    {body}
+END''' for table, op, body in VERSION_BUMPS]
+)
+
+MIGRATIONS.append(
+    # 9: curves applied to an assignment, with every score they replaced so
+    # a curve can be undone (see curves.py)
+    [
+        '''CREATE TABLE IF NOT EXISTS curves (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    assignment_id INTEGER REFERENCES assignments (id) ON DELETE CASCADE,
+    method TEXT,
+    params TEXT,
+    applied_at TEXT,
+    reverted_at TEXT
+)''',
+        '''CREATE TABLE IF NOT EXISTS curve_scores (
+    curve_id INTEGER REFERENCES curves (id) ON DELETE CASCADE,
+    rocket_id TEXT,
+    old_score INTEGER,
+    new_score INTEGER,
+    PRIMARY KEY (curve_id, rocket_id)
+)''',
+        "CREATE INDEX IF NOT EXISTS idx_curves_assignment ON curves (assignment_id)",
+    ]
+)
+
+# --- Per-Student Class Totals ---
+# Points earned and possible per student and class, kept current by triggers so
+# the what-if calculator (whatif.py) never has to sum grade rows. Totals follow
+# grades.class_id, like the reports and class averages. A cascade removes the
+# assignment before its grades, so assignment deletes take back the possible
+# points themselves (BEFORE DELETE) and the grade triggers find no max score.
+ADD_TOTAL = '''INSERT INTO class_totals (rocket_id, class_id, earned, possible, graded)
+        SELECT NEW.rocket_id, NEW.class_id, NEW.score,
+               COALESCE((SELECT max_score FROM assignments WHERE id = NEW.assignment_id), 0), 1
+        WHERE NEW.score IS NOT NULL AND NEW.class_id IS NOT NULL
+        ON CONFLICT (rocket_id, class_id) DO UPDATE SET earned = earned + excluded.earned,
+            possible = possible + excluded.possible, graded = graded + 1;'''
+REMOVE_TOTAL = '''UPDATE class_totals SET earned = earned - OLD.score,
+            possible = possible - COALESCE((SELECT max_score FROM assignments WHERE id = OLD.assignment_id), 0),
+            graded = graded - 1
+        WHERE rocket_id = OLD.rocket_id AND class_id = OLD.class_id AND OLD.score IS NOT NULL;
+    DELETE FROM class_totals WHERE rocket_id = OLD.rocket_id AND class_id = OLD.class_id AND graded <= 0;'''
+GRADED_FOR = "(rocket_id, class_id) IN (SELECT rocket_id, class_id FROM grades WHERE assignment_id = {id} AND score IS NOT NULL)"
+# Also created in shard files (shards.py), which keep their own totals
+TOTAL_TRIGGERS = [
+    f'''CREATE TRIGGER IF NOT EXISTS total_grades_insert AFTER INSERT ON grades
+BEGIN
+    {ADD_TOTAL}
+END''',
+    f'''CREATE TRIGGER IF NOT EXISTS total_grades_update AFTER UPDATE ON grades
+BEGIN
+    {REMOVE_TOTAL}
+    {ADD_TOTAL}
+END''',
+    f'''CREATE TRIGGER IF NOT EXISTS total_grades_delete AFTER DELETE ON grades
+BEGIN
+    {REMOVE_TOTAL}
+END''',
+    f'''CREATE TRIGGER IF NOT EXISTS total_assignments_max_score AFTER UPDATE OF max_score ON assignments
+WHEN NEW.max_score IS NOT OLD.max_score
+BEGIN
+    UPDATE class_totals SET possible = possible + COALESCE(NEW.max_score, 0) - COALESCE(OLD.max_score, 0)
+    WHERE {GRADED_FOR.format(id='NEW.id')};
+END''',
+    f'''CREATE TRIGGER IF NOT EXISTS total_assignments_delete BEFORE DELETE ON assignments
+BEGIN
+    UPDATE class_totals SET possible = possible - COALESCE(OLD.max_score, 0)
+    WHERE {GRADED_FOR.format(id='OLD.id')};
+END''',
+]
+
+MIGRATIONS.append(
+    # 10: per-student class totals
+    [
+        '''CREATE TABLE IF NOT EXISTS class_totals (
+    rocket_id TEXT,
+    class_id TEXT,
+    earned REAL NOT NULL,
+    possible REAL NOT NULL,
+    graded INTEGER NOT NULL,
+    PRIMARY KEY (rocket_id, class_id)
+)''',
+        "CREATE INDEX IF NOT EXISTS idx_class_totals_class ON class_totals (class_id)",
+        '''INSERT INTO class_totals (rocket_id, class_id, earned, possible, graded)
+SELECT g.rocket_id, g.class_id, SUM(g.score), SUM(COALESCE(a.max_score, 0)), COUNT(*)
+FROM grades g LEFT JOIN assignments a ON a.id = g.assignment_id
+WHERE g.score IS NOT NULL AND g.class_id IS NOT NULL
+GROUP BY g.rocket_id, g.class_id''',
+    ] + TOTAL_TRIGGERS
+)
+
+# --- Due Dates ---
+# Stored as ISO text (YYYY-MM-DD) so they sort and compare as dates. Input is
+# accepted in the formats below; month/day order is the US one.
+DUE_DATE_FORMATS = ['%Y-%m-%d', '%Y/%m/%d', '%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y', '%Y%m%d',
+                    '%b %d %Y', '%B %d %Y', '%d %b %Y', '%d %B %Y']
+
+
+def parse_due_date(text):
+    cleaned = ' '.join((text or '').replace(',', ' ').split())
+    for fmt in DUE_DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Due date {text!r} is not a date (use YYYY-MM-DD)")
+
+
+def normalize_due_dates(conn):
+    # Rewrites every recognisable due date as ISO; anything else is left as it
+    # was for a teacher to fix. Not logged for sync: each copy migrates itself.
+    fixes = []
+    for assignment_id, due_date in conn.execute("SELECT id, due_date FROM assignments WHERE due_date IS NOT NULL"):
+        try:
+            iso = parse_due_date(due_date)
+        except ValueError:
+            continue
+        if iso != due_date:
+            fixes.append((iso, assignment_id))
+    conn.execute("UPDATE sync_state SET value = 0 WHERE key = 'tracking'")
+    conn.executemany("UPDATE assignments SET due_date = ? WHERE id = ?", fixes)
+    conn.execute("UPDATE sync_state SET value = 1 WHERE key = 'tracking'")
+
+
+MIGRATIONS.append(
+    # 11: ISO due dates, indexed for per-class and school-wide date ranges
+    [
+        normalize_due_dates,
+        "CREATE INDEX IF NOT EXISTS idx_assignments_class_due ON assignments (class_id, due_date)",
+        "CREATE INDEX IF NOT EXISTS idx_assignments_due ON assignments (due_date)",
+    ]
+)
+
+MIGRATIONS.append(
+    # 12: class rosters. Anyone with a grade in a class is on its roster, and a
+    # grade added later (by hand, sync or a merge) enrolls the student too.
+    [
+        '''CREATE TABLE IF NOT EXISTS enrollments (
+    class_id TEXT REFERENCES classes (class_id) ON DELETE CASCADE,
+    rocket_id TEXT REFERENCES students (rocket_id) ON DELETE CASCADE,
+    PRIMARY KEY (class_id, rocket_id)
+) WITHOUT ROWID''',
+        "CREATE INDEX IF NOT EXISTS idx_enrollments_student ON enrollments (rocket_id)",
+        "UPDATE sync_state SET value = 0 WHERE key = 'tracking'",
+        '''INSERT OR IGNORE INTO enrollments (class_id, rocket_id)
+SELECT DISTINCT g.class_id, g.rocket_id FROM grades g
+WHERE g.class_id IN (SELECT class_id FROM classes) AND g.rocket_id IN (SELECT rocket_id FROM students)''',
+        "UPDATE sync_state SET value = 1 WHERE key = 'tracking'",
+        '''CREATE TRIGGER IF NOT EXISTS enroll_grades_insert AFTER INSERT ON grades
+WHEN NEW.class_id IN (SELECT class_id FROM classes)
+BEGIN
+    INSERT OR IGNORE INTO enrollments (class_id, rocket_id) VALUES (NEW.class_id, NEW.rocket_id);
+END''',
+    ] + change_triggers(['enrollments'])
+)
+
+MIGRATIONS.append(
+    # 13: content hashes of the registrar rows students and enrollments came
+    # from (see registrar.py). NULL means the row was entered by hand.
+    [
+        "ALTER TABLE students ADD COLUMN row_hash TEXT",
+        "ALTER TABLE enrollments ADD COLUMN row_hash TEXT",
+    ]
+)
+
+MIGRATIONS.append(
+    # 14: optional sharding (see shards.py). Each shard file gets its own range
+    # of assignment and curve ids so ids stay unique across files.
+    [
+        '''CREATE TABLE IF NOT EXISTS shards (
+    shard TEXT PRIMARY KEY,
+    id_base INTEGER NOT NULL
+)''',
+        '''CREATE TABLE IF NOT EXISTS shard_map (
+    class_id TEXT PRIMARY KEY,
+    shard TEXT NOT NULL REFERENCES shards (shard)
+)''',
+    ]
+)
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# --- Concurrency Settings ---
+# Several instances may share one database file. SQLite waits up to
+# BUSY_TIMEOUT seconds for a lock; if that still fails, writes are retried
+# with jittered exponential backoff so competing instances do not retry in lockstep.
+BUSY_TIMEOUT = 5.0
+BUSY_RETRIES = 5
+BUSY_RETRY_DELAY = 0.05
+
+
+class ConflictError(Exception):
+    # Raised when a row changed since it was read; current holds the row as it is now
+    def __init__(self, message, current=None):
+        super().__init__(message)
+        self.current = current
+
+GRADE_SCALE = [
+    (93, 'A', 4.0), (90, 'A-', 3.7), (87, 'B+', 3.3), (83, 'B', 3.0), (80, 'B-', 2.7),
+    (77, 'C+', 2.3), (73, 'C', 2.0), (70, 'C-', 1.7), (67, 'D+', 1.3), (63, 'D', 1.0),
+    (60, 'D-', 0.7), (0, 'F', 0.0)
+]
+
+def calculate_letter_grade(score):
+    for min_score, letter, gpa in GRADE_SCALE:
+        if score >= min_score:
+            return letter, gpa
+    return 'F', 0.0
+
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return version
+    # Take the write lock before re-reading, in case another instance migrated first
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for statements in MIGRATIONS[version:]:
+            for statement in statements:
+                # A few steps need Python (e.g. parsing dates) and are functions of the connection
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return SCHEMA_VERSION
+
+
+def connect(path):
+    # uri=True so term archives can be attached with file: URIs
+    conn = sqlite3.connect(path, uri=True, timeout=BUSY_TIMEOUT)
+    # Takes effect immediately on a new file; existing files switch over on
+    # their next VACUUM (see maintenance.enable_incremental_vacuum)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    migrate(conn)
+    return conn
+
+
+def is_busy(error):
+    message = str(error)
+    return 'locked' in message or 'busy' in message
+
+
+def write_with_retry(conn, func, *args, attempts=BUSY_RETRIES):
+    # Runs func(*args) and commits, retrying the whole write if the database stays locked
+    for attempt in range(attempts):
+        try:
+            result = func(*args)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            if not is_busy(e) or attempt == attempts - 1:
+                raise
+            time.sleep(random.uniform(0, BUSY_RETRY_DELAY * 2 ** attempt))
+        except Exception:
+            conn.rollback()
+            raise
+
+# === Students ===
+def list_students(cursor, sort_by=None):
+    query = "SELECT rocket_id, name FROM students"
+    if sort_by == 'name':
+        query += " ORDER BY name ASC"
+    elif sort_by == 'rocket_id':
+        query += " ORDER BY rocket_id ASC"
+    cursor.execute(query)
+    return cursor.fetchall()
+
+# === Grades ===
+def find_assignment_id(cursor, title, class_id):
+    cursor.execute("SELECT id FROM assignments WHERE class_id = ? AND title = ?", (class_id, title))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+
+def get_grade(cursor, rocket_id, assignment_id):
+    # (score, version), or None when the student has no grade yet
+    cursor.execute("SELECT score, version FROM grades WHERE rocket_id = ? AND assignment_id = ?",
+                   (rocket_id, assignment_id))
+    return cursor.fetchone()
+
+
+def save_grade(cursor, rocket_id, assignment_id, score, class_id, expected_version=None):
+    # expected_version is the version the caller read (0 if there was no grade).
+    # Leave it as None to overwrite unconditionally.
+    if expected_version is None:
+        cursor.execute('''
+            INSERT INTO grades (rocket_id, assignment_id, score, class_id) VALUES (?, ?, ?, ?)
+            ON CONFLICT (rocket_id, assignment_id)
+            DO UPDATE SET score = excluded.score, class_id = excluded.class_id, version = version + 1
+        ''', (rocket_id, assignment_id, score, class_id))
+        return
+    if expected_version == 0:
+        try:
+            cursor.execute("INSERT INTO grades (rocket_id, assignment_id, score, class_id) VALUES (?, ?, ?, ?)",
+                           (rocket_id, assignment_id, score, class_id))
+            return
+        except sqlite3.IntegrityError:
+            pass
+    else:
+        cursor.execute('''
+            UPDATE grades SET score = ?, class_id = ?, version = version + 1
+            WHERE rocket_id = ? AND assignment_id = ? AND version = ?
+        ''', (score, class_id, rocket_id, assignment_id, expected_version))
+        if cursor.rowcount == 1:
+            return
+    raise ConflictError(f"Grade for {rocket_id} was changed by someone else.",
+                        get_grade(cursor, rocket_id, assignment_id))
+
+# === Assignments ===
+def get_assignment(cursor, assignment_id):
+    cursor.execute("SELECT id, title, due_date, max_score, type, class_id, version FROM assignments WHERE id = ?",
+                   (assignment_id,))
+    return cursor.fetchone()
+
+
+def update_assignment(cursor, assignment_id, title, due_date, max_score, type_, expected_version=None):
+    query = "UPDATE assignments SET title = ?, due_date = ?, max_score = ?, type = ?, version = version + 1 WHERE id = ?"
+    params = [title, due_date, max_score, type_, assignment_id]
+    if expected_version is not None:
+        query += " AND version = ?"
+        params.append(expected_version)
+    cursor.execute(query, params)
+    if cursor.rowcount != 1:
+        raise ConflictError(f"Assignment {assignment_id} was changed or deleted by someone else.",
+                            get_assignment(cursor, assignment_id))
+
+
+def class_average(cursor, class_id):
+    # Average percentage across every graded assignment, for students on the roster
+    cursor.execute('''
+        SELECT AVG(g.score * 100.0 / a.max_score)
+        FROM enrollments e
+        JOIN grades g ON g.rocket_id = e.rocket_id AND g.class_id = e.class_id
+        JOIN assignments a ON a.id = g.assignment_id
+        WHERE e.class_id = ? AND a.max_score > 0
+    ''', (class_id,))
+    return cursor.fetchone()[0]
+
+# === Enrollments ===
+def roster(cursor, class_id):
+    cursor.execute('''
+        SELECT s.rocket_id, s.name FROM enrollments e
+        JOIN students s ON s.rocket_id = e.rocket_id
+        WHERE e.class_id = ?
+        ORDER BY s.name, s.rocket_id
+    ''', (class_id,))
+    return cursor.fetchall()
+
+
+def enroll(cursor, class_id, rocket_ids):
+    # Returns how many were newly enrolled; unknown Rocket IDs are skipped
+    cursor.executemany('''
+        INSERT OR IGNORE INTO enrollments (class_id, rocket_id)
+        SELECT ?, rocket_id FROM students WHERE rocket_id = ?
+    ''', [(class_id, rocket_id) for rocket_id in rocket_ids])
+    return cursor.rowcount
+
+
+def drop(cursor, class_id, rocket_ids):
+    # Grades are kept, so re-enrolling a student brings their work back
+    cursor.executemany("DELETE FROM enrollments WHERE class_id = ? AND rocket_id = ?",
+                       [(class_id, rocket_id) for rocket_id in rocket_ids])
+    return cursor.rowcount
@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import datagen
+import gradedb
+import server
+
+# Each worker plays a TA: read a grade, think briefly, then save a new score
+# with the version it read. Workers draw from a small pool of "hot" grades so
+# they collide on purpose.
+HOT_GRADES = 50
+THINK_TIME = 0.001
+# Service mode: share of requests that only read (reports, rosters, grades)
+READ_SHARE = 0.8
+
+
+def worker(path, seed, operations, results):
+    conn = gradedb.connect(path)
+    cur = conn.cursor()
+    rng = random.Random(seed)
+    hot = cur.execute("SELECT rocket_id, assignment_id, class_id FROM grades ORDER BY rowid LIMIT ?",
+                      (HOT_GRADES,)).fetchall()
+    saved = conflicts = failures = 0
+    for _ in range(operations):
+        rocket_id, assignment_id, class_id = rng.choice(hot)
+        current = gradedb.get_grade(cur, rocket_id, assignment_id)
+        time.sleep(rng.uniform(0, THINK_TIME))
+        try:
+            gradedb.write_with_retry(conn, gradedb.save_grade, cur, rocket_id, assignment_id,
+                                     rng.randint(0, 100), class_id, current[1] if current else 0)
+            saved += 1
+        except gradedb.ConflictError:
+            conflicts += 1
+        except sqlite3.OperationalError:
+            failures += 1
+    conn.close()
+    results.put((saved, conflicts, failures))
+
+
+def run(path, processes, operations, seed):
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=worker, args=(path, seed + n, operations, results))
+             for n in range(processes)]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    totals = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    saved, conflicts, failures = (sum(t[i] for t in totals) for i in range(3))
+    # Every saved write bumped a version exactly once, so nothing was lost
+    conn = gradedb.connect(path)
+    bumps = conn.execute("SELECT SUM(version - 1) FROM grades").fetchone()[0]
+    conn.close()
+    return {
+        'processes': processes,
+        'operations': processes * operations,
+        'saved': saved,
+        'conflicts': conflicts,
+        'lock_failures': failures,
+        'lost_updates': saved - bumps,
+        'seconds': round(elapsed, 3),
+        'writes_per_sec': round(saved / elapsed, 1),
+    }
+
+
+# === Service mode ===
+# The same TA workload as HTTP clients of server.py on localhost, each on its
+# own keep-alive connection, mixed with reads of reports, rosters and grades
+async def client(port, seed, operations, hot, students, classes, latencies, counts):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(server.HOST, port)
+    for _ in range(operations):
+        start = time.perf_counter()
+        if rng.random() < READ_SHARE:
+            path = rng.choice([f"/reports/{rng.choice(students)}", f"/classes/{rng.choice(classes)}/roster",
+                               "/grades/{}/{}".format(*rng.choice(hot)[:2])])
+            status, _ = await server.request(reader, writer, 'GET', path)
+            counts['reads' if status == 200 else 'errors'] += 1
+        else:
+            rocket_id, assignment_id = rng.choice(hot)[:2]
+            status, current = await server.request(reader, writer, 'GET', f"/grades/{rocket_id}/{assignment_id}")
+            version = current['version'] if status == 200 else 0
+            status, _ = await server.request(reader, writer, 'PUT', f"/grades/{rocket_id}/{assignment_id}",
+                                             {'score': rng.randint(0, 100), 'version': version})
+            counts['saved' if status == 200 else 'conflicts' if status == 409 else 'errors'] += 1
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def run_service_async(path, clients, operations, seed, readers):
+    conn = gradedb.connect(path)
+    hot = conn.execute("SELECT rocket_id, assignment_id FROM grades ORDER BY rowid LIMIT ?", (HOT_GRADES,)).fetchall()
+    students = [r[0] for r in conn.execute("SELECT rocket_id FROM students")]
+    classes = [r[0] for r in conn.execute("SELECT class_id FROM classes")]
+    conn.close()
+
+    service = server.GradeService(path, readers)
+    listener = await service.start(server.HOST, 0)
+    port = listener.sockets[0].getsockname()[1]
+    latencies = []
+    counts = {'reads': 0, 'saved': 0, 'conflicts': 0, 'errors': 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, seed + n, operations, hot, students, classes, latencies, counts)
+                           for n in range(clients)))
+    elapsed = time.perf_counter() - start
+    listener.close()
+    await listener.wait_closed()
+    batches = service.batches
+    await service.close()
+
+    conn = gradedb.connect(path)
+    bumps = conn.execute("SELECT SUM(version - 1) FROM grades").fetchone()[0]
+    conn.close()
+    latencies.sort()
+    return {
+        'clients': clients,
+        'requests': len(latencies),
+        **counts,
+        'write_batches': batches,
+        'lost_updates': counts['saved'] - bumps,
+        'seconds': round(elapsed, 3),
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+    }
+
+
+def run_service(path, clients, operations, seed, readers=server.READ_POOL_SIZE):
+    return asyncio.run(run_service_async(path, clients, operations, seed, readers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process contention test for grade saves")
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="worker processes, or concurrent HTTP clients with --service")
+    parser.add_argument('--operations', type=int, default=500, help="grade saves (or requests) per worker")
+    parser.add_argument('--service', action='store_true',
+                        help="run the workload against server.py on localhost instead of the file")
+    parser.add_argument('--readers', type=int, default=server.READ_POOL_SIZE,
+                        help="read connections for the service")
+    parser.add_argument('--grades', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for processes in args.processes:
+            path = os.path.join(tmp, f"load-{processes}.db")
+            conn = gradedb.connect(path)
+            datagen.generate(conn, args.grades, args.seed)
+            conn.close()
+            if args.service:
+                result = run_service(path, processes, args.operations, args.seed, args.readers)
+            else:
+                result = run(path, processes, args.operations, args.seed)
+            print(result)
+            if result['lost_updates'] or result.get('lock_failures') or result.get('errors'):
+                raise SystemExit(1)
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+import changesets
+import gradedb
+
+# --- Orphan Sweeper ---
+# Foreign keys stop new orphans on connections that enable them, but a copy of
+# the app without foreign_keys (or an older version) can still leave rows behind.
+# The sweeper walks each table by rowid in small windows so every step takes the
+# write lock only briefly.
+SWEEP_BATCH = 500
+ORPHAN_CONDITIONS = [
+    ('assignments', '''class_id IS NOT NULL
+        AND NOT EXISTS (SELECT 1 FROM classes c WHERE c.class_id = assignments.class_id)'''),
+    ('grades', '''NOT EXISTS (SELECT 1 FROM students s WHERE s.rocket_id = grades.rocket_id)
+        OR NOT EXISTS (SELECT 1 FROM assignments a WHERE a.id = grades.assignment_id)'''),
+]
+
+
+class OrphanSweeper:
+    def __init__(self, conn, batch_size=SWEEP_BATCH):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.positions = {table: 0 for table, _ in ORPHAN_CONDITIONS}
+        self.done = set()
+        self.removed = 0
+
+    def step(self):
+        # Sweeps the next window of each table. Returns the number of rows
+        # deleted and whether this step finished a full pass over every table.
+        cur = self.conn.cursor()
+        deleted = 0
+        for table, condition in ORPHAN_CONDITIONS:
+            if table in self.done:
+                continue
+            start = self.positions[table]
+            cur.execute(f"SELECT MAX(rowid) FROM (SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?)",
+                        (start, self.batch_size))
+            end = cur.fetchone()[0]
+            if end is None:
+                self.done.add(table)
+                continue
+            # Most windows are clean; only take the write lock when one isn't
+            cur.execute(f"SELECT 1 FROM {table} WHERE rowid > ? AND rowid <= ? AND ({condition}) LIMIT 1",
+                        (start, end))
+            if cur.fetchone():
+                changesets.set_tracking(cur, False)
+                cur.execute(f"DELETE FROM {table} WHERE rowid > ? AND rowid <= ? AND ({condition})", (start, end))
+                deleted += cur.rowcount
+                changesets.set_tracking(cur, True)
+                self.conn.commit()
+            self.positions[table] = end
+        self.removed += deleted
+        finished = len(self.done) == len(ORPHAN_CONDITIONS)
+        if finished:
+            self.positions = dict.fromkeys(self.positions, 0)
+            self.done = set()
+        return deleted, finished
+
+
+def sweep_all(conn, batch_size=SWEEP_BATCH):
+    sweeper = OrphanSweeper(conn, batch_size)
+    while not sweeper.step()[1]:
+        pass
+    return sweeper.removed
+
+# --- Storage Maintenance ---
+# Idle-time work is bounded so a step never holds the write lock for long:
+# at most VACUUM_STEP_PAGES freed pages are returned to the OS per step, and
+# PRAGMA optimize runs at most once per OPTIMIZE_INTERVAL.
+VACUUM_STEP_PAGES = 256
+OPTIMIZE_INTERVAL = 60 * 60
+ANALYSIS_LIMIT = 1000
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+
+def pragma(cursor, name):
+    cursor.execute(f"PRAGMA {name}")
+    return cursor.fetchone()[0]
+
+
+def table_stats(cursor):
+    # Per table and index: pages, unused bytes, and how many pages are not
+    # physically next to the page before them (a rough fragmentation measure).
+    # Needs the dbstat virtual table; returns [] where SQLite was built without it.
+    try:
+        cursor.execute('''
+            SELECT name, COUNT(*) AS pages, SUM(unused) AS unused, SUM(pgsize) AS bytes,
+                   SUM(CASE WHEN pageno != prev + 1 THEN 1 ELSE 0 END) AS out_of_order
+            FROM (SELECT name, pageno, unused, pgsize,
+                         LAG(pageno, 1, pageno - 1) OVER (PARTITION BY name ORDER BY path) AS prev
+                  FROM dbstat)
+            GROUP BY name ORDER BY bytes DESC
+        ''')
+    except sqlite3.OperationalError:
+        return []
+    return [{'name': name, 'pages': pages, 'unused_bytes': unused, 'bytes': size,
+             'fragmentation': round(out_of_order / pages, 3) if pages else 0.0}
+            for name, pages, unused, size, out_of_order in cursor.fetchall()]
+
+
+def storage_stats(conn, per_table=False):
+    cur = conn.cursor()
+    page_size = pragma(cur, 'page_size')
+    page_count = pragma(cur, 'page_count')
+    freelist = pragma(cur, 'freelist_count')
+    stats = {
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist,
+        'free_ratio': round(freelist / page_count, 3) if page_count else 0.0,
+        'reclaimable_bytes': freelist * page_size,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(pragma(cur, 'auto_vacuum'), 'unknown'),
+    }
+    if per_table:
+        stats['tables'] = table_stats(cur)
+    return stats
+
+
+def enable_incremental_vacuum(conn):
+    # Existing files only switch auto_vacuum mode during a full VACUUM, which
+    # rewrites the whole file. Run it from the scheduled job, not the UI.
+    cur = conn.cursor()
+    if pragma(cur, 'auto_vacuum') == 2:
+        return False
+    conn.commit()
+    cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    cur.execute("VACUUM")
+    return True
+
+
+def incremental_vacuum(conn, pages=VACUUM_STEP_PAGES):
+    cur = conn.cursor()
+    before = pragma(cur, 'freelist_count')
+    if before == 0:
+        return 0
+    conn.commit()
+    cur.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+    cur.fetchall()
+    return before - pragma(cur, 'freelist_count')
+
+
+def optimize(conn):
+    cur = conn.cursor()
+    conn.commit()
+    cur.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+    if not cur.fetchone():
+        # PRAGMA optimize only refreshes statistics that already exist
+        cur.execute("ANALYZE")
+    cur.execute("PRAGMA optimize")
+    conn.commit()
+
+
+class IdleMaintenance:
+    # Driven from the Tk loop: each step does one bounded piece of work
+    def __init__(self, conn):
+        self.conn = conn
+        self.last_optimize = 0.0
+
+    def step(self):
+        if time.time() - self.last_optimize >= OPTIMIZE_INTERVAL:
+            optimize(self.conn)
+            self.last_optimize = time.time()
+            return 'optimize'
+        if incremental_vacuum(self.conn):
+            return 'vacuum'
+        return None
+
+
+def run_all(conn, convert=False):
+    result = {'before': storage_stats(conn)}
+    if convert:
+        result['converted'] = enable_incremental_vacuum(conn)
+    result['orphans_removed'] = sweep_all(conn)
+    optimize(conn)
+    freed = 0
+    while True:
+        step = incremental_vacuum(conn)
+        if not step:
+            break
+        freed += step
+    result['pages_freed'] = freed
+    result['after'] = storage_stats(conn, per_table=True)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run gradebook storage maintenance (for cron or Task Scheduler)")
+    parser.add_argument('db', nargs='?', default='student_grading.db')
+    parser.add_argument('--convert', action='store_true',
+                        help="switch an existing file to auto_vacuum=INCREMENTAL (runs a full VACUUM once)")
+    parser.add_argument('--stats', action='store_true', help="only print storage statistics")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        raise SystemExit(f"No database at {args.db}")
+    conn = gradedb.connect(args.db)
+    if args.stats:
+        print(json.dumps(storage_stats(conn, per_table=True), indent=2))
+    else:
+        print(json.dumps(run_all(conn, args.convert), indent=2))
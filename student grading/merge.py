@@ -0,0 +1,128 @@
+import argparse
+import os
+import sqlite3
+import time
+from urllib.parse import quote
+
+import gradedb
+
+# Merge rules (sections are merged in the order given):
+#   students     - a Rocket ID keeps the first name seen; differing names are reported
+#   classes      - a class ID keeps the first name seen; differing names are reported
+#   assignments  - matched on (class_id, title); unmatched ones get fresh IDs
+#   grades       - remapped to the merged assignment IDs; on a clash the higher score wins
+#   enrollments  - combined; merged grades also enroll their students
+
+
+def merge_section(conn, path):
+    uri = f"file:{quote(os.path.abspath(path))}?mode=ro"
+    conn.commit()
+    conn.execute("ATTACH DATABASE ? AS src", (uri,))
+    cur = conn.cursor()
+    stats = {'source': path}
+    try:
+        cur.execute("BEGIN IMMEDIATE")
+
+        cur.execute('''
+            SELECT s.rocket_id, m.name, s.name FROM src.students s
+            JOIN main.students m ON m.rocket_id = s.rocket_id
+            WHERE m.name IS NOT s.name
+        ''')
+        stats['student_conflicts'] = cur.fetchall()
+        cur.execute('''
+            SELECT s.class_id, m.class_name, s.class_name FROM src.classes s
+            JOIN main.classes m ON m.class_id = s.class_id
+            WHERE m.class_name IS NOT s.class_name
+        ''')
+        stats['class_conflicts'] = cur.fetchall()
+
+        cur.execute("INSERT OR IGNORE INTO main.students (rocket_id, name) SELECT rocket_id, name FROM src.students")
+        stats['students'] = cur.rowcount
+        cur.execute("INSERT OR IGNORE INTO main.classes (class_id, class_name) SELECT class_id, class_name FROM src.classes")
+        stats['classes'] = cur.rowcount
+
+        # Sections saved by older versions have no enrollments table
+        cur.execute("SELECT 1 FROM src.sqlite_master WHERE type = 'table' AND name = 'enrollments'")
+        if cur.fetchone():
+            cur.execute('''
+                INSERT OR IGNORE INTO main.enrollments (class_id, rocket_id)
+                SELECT e.class_id, e.rocket_id FROM src.enrollments e
+                WHERE e.class_id IN (SELECT class_id FROM main.classes)
+                  AND e.rocket_id IN (SELECT rocket_id FROM main.students)
+            ''')
+
+        # Source assignment ID -> merged assignment ID
+        cur.execute("CREATE TEMP TABLE assignment_map (src_id INTEGER PRIMARY KEY, new_id INTEGER)")
+        cur.execute('''
+            INSERT INTO assignment_map (src_id, new_id)
+            SELECT s.id, MIN(m.id) FROM src.assignments s
+            JOIN main.assignments m ON m.class_id = s.class_id AND m.title = s.title
+            GROUP BY s.id
+        ''')
+        cur.execute("SELECT COALESCE(MAX(id), 0) FROM main.assignments")
+        offset = cur.fetchone()[0]
+        cur.execute('''
+            INSERT INTO assignment_map (src_id, new_id)
+            SELECT s.id, ? + ROW_NUMBER() OVER (ORDER BY s.id) FROM src.assignments s
+            WHERE s.id NOT IN (SELECT src_id FROM assignment_map)
+              AND s.class_id IN (SELECT class_id FROM main.classes)
+        ''', (offset,))
+        cur.execute('''
+            INSERT INTO main.assignments (id, title, due_date, max_score, type, class_id)
+            SELECT m.new_id, s.title, s.due_date, s.max_score, s.type, s.class_id
+            FROM src.assignments s JOIN assignment_map m ON m.src_id = s.id
+            WHERE m.new_id > ?
+        ''', (offset,))
+        stats['assignments'] = cur.rowcount
+
+        # Orphans in the source (grades without a student or assignment, assignments
+        # without a class) are left behind rather than violating foreign keys
+        cur.execute('''
+            INSERT INTO main.grades (rocket_id, assignment_id, score, class_id)
+            SELECT g.rocket_id, m.new_id, g.score, g.class_id
+            FROM src.grades g JOIN assignment_map m ON m.src_id = g.assignment_id
+            WHERE g.rocket_id IN (SELECT rocket_id FROM main.students)
+            ON CONFLICT (rocket_id, assignment_id)
+            DO UPDATE SET score = MAX(score, excluded.score), version = version + 1
+            WHERE excluded.score > score
+        ''')
+        stats['grades'] = cur.rowcount
+
+        cur.execute("DROP TABLE temp.assignment_map")
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("DETACH DATABASE src")
+    return stats
+
+
+def merge_sections(conn, paths, progress=None):
+    results = []
+    for path in paths:
+        stats = merge_section(conn, path)
+        results.append(stats)
+        if progress:
+            progress(stats)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge section gradebooks into one department database")
+    parser.add_argument('target', help="department database (created if missing)")
+    parser.add_argument('sections', nargs='+', help="section student_grading.db files")
+    args = parser.parse_args()
+
+    def report(stats):
+        print(f"{stats['source']}: +{stats['students']} students, +{stats['classes']} classes, "
+              f"+{stats['assignments']} assignments, {stats['grades']} grades")
+        for rocket_id, kept, other in stats['student_conflicts']:
+            print(f"  Rocket ID {rocket_id}: kept name {kept!r}, section has {other!r}")
+        for class_id, kept, other in stats['class_conflicts']:
+            print(f"  Class {class_id}: kept name {kept!r}, section has {other!r}")
+
+    conn = gradedb.connect(args.target)
+    start = time.perf_counter()
+    merge_sections(conn, args.sections, report)
+    print(f"Merged {len(args.sections)} sections in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,177 @@
+import argparse
+import csv
+import hashlib
+import os
+import sqlite3
+import time
+
+import changesets
+import gradedb
+
+# Weekly registrar roster sync. The registrar file is a CSV with a header and
+# one row per student and class (Rocket ID, Name, Class ID); a student with no
+# class can have an empty Class ID. Each row's content hash is compared with
+# the row_hash kept on students and enrollments, so only real adds, drops and
+# name changes are written.
+#
+# Rows entered by hand (row_hash NULL) are adopted when the file has them and
+# never deleted. Students and enrollments the registrar created are deleted
+# once they drop out of the file: a deleted student loses their grades, a
+# dropped enrollment keeps them.
+COLUMN_NAMES = {
+    'rocket_id': ('rocket id', 'rocket_id', 'rocketid', 'student id', 'id'),
+    'name': ('name', 'student name', 'student_name'),
+    'class_id': ('class id', 'class_id', 'classid', 'class', 'section'),
+}
+
+
+def row_hash(*values):
+    return hashlib.sha1('\x1f'.join(values).encode('utf-8')).hexdigest()[:16]
+
+
+def read_registrar(path):
+    # Streams (rocket_id, name, class_id or None) from the file
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [h.strip().lower() for h in next(reader, [])]
+        columns = {}
+        for field, names in COLUMN_NAMES.items():
+            for i, h in enumerate(header):
+                if h in names:
+                    columns[field] = i
+                    break
+        if 'rocket_id' not in columns or 'name' not in columns:
+            raise ValueError(f"{path} needs Rocket ID and Name columns (found: {', '.join(header)})")
+        rid_col, name_col, class_col = columns['rocket_id'], columns['name'], columns.get('class_id')
+        for row in reader:
+            if len(row) <= max(rid_col, name_col) or not row[rid_col].strip():
+                continue
+            class_id = row[class_col].strip() if class_col is not None and class_col < len(row) else ''
+            yield row[rid_col].strip(), ' '.join(row[name_col].split()), class_id or None
+
+
+def plan_sync(cursor, rows):
+    # Compares the stream with stored hashes; returns lists of the writes needed
+    cursor.execute("SELECT rocket_id, row_hash FROM students")
+    students = dict(cursor.fetchall())
+    cursor.execute("SELECT class_id, rocket_id, row_hash FROM enrollments")
+    enrollments = {(class_id, rocket_id): h for class_id, rocket_id, h in cursor.fetchall()}
+    cursor.execute("SELECT class_id FROM classes")
+    classes = {r[0] for r in cursor.fetchall()}
+
+    plan = {'add_students': [], 'rename_students': [], 'adopt_students': [], 'delete_students': [],
+            'enroll': [], 'adopt_enrollments': [], 'drop': [], 'unknown_classes': set(), 'rows': 0}
+    seen_students = set()
+    seen_enrollments = set()
+    for rocket_id, name, class_id in rows:
+        plan['rows'] += 1
+        if rocket_id not in seen_students:
+            seen_students.add(rocket_id)
+            h = row_hash(rocket_id, name)
+            if rocket_id not in students:
+                plan['add_students'].append((rocket_id, name, h))
+            elif students[rocket_id] is None:
+                # Entered by hand; the registrar's name wins and the row becomes managed
+                plan['adopt_students'].append((name, h, rocket_id))
+            elif students[rocket_id] != h:
+                plan['rename_students'].append((name, h, rocket_id))
+        if class_id is None:
+            continue
+        if class_id not in classes:
+            plan['unknown_classes'].add(class_id)
+            continue
+        key = (class_id, rocket_id)
+        if key in seen_enrollments:
+            continue
+        seen_enrollments.add(key)
+        if key not in enrollments:
+            plan['enroll'].append((class_id, rocket_id, row_hash(class_id, rocket_id)))
+        elif enrollments[key] is None:
+            plan['adopt_enrollments'].append((row_hash(class_id, rocket_id), class_id, rocket_id))
+
+    plan['delete_students'] = [(rid,) for rid, h in students.items() if h is not None and rid not in seen_students]
+    plan['drop'] = [key for key, h in enrollments.items() if h is not None and key not in seen_enrollments]
+    return plan
+
+
+def apply_plan(conn, plan, delete_missing=True):
+    # All of it in one transaction. Adopting a hand-entered row only records
+    # its hash, which is local bookkeeping and not logged for sync.
+    counts = summary(plan, delete_missing)
+    if not any(n for key, n in counts.items() if key not in ('rows', 'unknown_classes')):
+        return counts
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        cur.executemany("INSERT INTO students (rocket_id, name, row_hash) VALUES (?, ?, ?)", plan['add_students'])
+        cur.executemany("UPDATE students SET name = ?, row_hash = ? WHERE rocket_id = ?", plan['rename_students'])
+        cur.executemany("INSERT OR IGNORE INTO enrollments (class_id, rocket_id, row_hash) VALUES (?, ?, ?)",
+                        plan['enroll'])
+        changesets.set_tracking(cur, False)
+        cur.executemany("UPDATE students SET row_hash = ? WHERE rocket_id = ? AND name = ?",
+                        [(h, rid, name) for name, h, rid in plan['adopt_students']])
+        cur.executemany("UPDATE enrollments SET row_hash = ? WHERE class_id = ? AND rocket_id = ?",
+                        plan['adopt_enrollments'])
+        changesets.set_tracking(cur, True)
+        # A hand-entered student whose name differs is a real rename
+        cur.executemany("UPDATE students SET name = ?, row_hash = ? WHERE rocket_id = ? AND row_hash IS NULL",
+                        plan['adopt_students'])
+        if delete_missing:
+            cur.executemany("DELETE FROM enrollments WHERE class_id = ? AND rocket_id = ?", plan['drop'])
+            cur.executemany("DELETE FROM students WHERE rocket_id = ?", plan['delete_students'])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return counts
+
+
+def summary(plan, delete_missing=True):
+    result = {key: len(value) for key, value in plan.items() if key not in ('rows', 'unknown_classes')}
+    if not delete_missing:
+        result['delete_students'] = result['drop'] = 0
+    result['rows'] = plan['rows']
+    result['unknown_classes'] = sorted(plan['unknown_classes'])
+    return result
+
+
+def sync_registrar(conn, path, delete_missing=True, dry_run=False):
+    plan = plan_sync(conn.cursor(), read_registrar(path))
+    if dry_run:
+        return summary(plan, delete_missing)
+    counts = apply_plan(conn, plan, delete_missing)
+    if delete_missing and plan['delete_students']:
+        # The delete's cascade doesn't reach grades in shard files
+        import shards
+        if shards.has_shards(conn):
+            router = shards.ShardRouter(conn, shards.directory_file(conn))
+            for (rocket_id,) in plan['delete_students']:
+                router.drop_student(rocket_id)
+            router.close()
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync students and enrollments with a registrar roster file")
+    parser.add_argument('roster', help="registrar CSV: Rocket ID, Name, Class ID")
+    parser.add_argument('--db', default='student_grading.db')
+    parser.add_argument('--dry-run', action='store_true', help="only report what would change")
+    parser.add_argument('--keep-missing', action='store_true',
+                        help="don't delete students or drop enrollments missing from the file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        raise SystemExit(f"No database at {args.db}")
+    conn = gradedb.connect(args.db)
+    start = time.perf_counter()
+    try:
+        result = sync_registrar(conn, args.roster, not args.keep_missing, args.dry_run)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    elapsed = time.perf_counter() - start
+    print(f"{result['rows']} rows{' (dry run)' if args.dry_run else ''} in {elapsed:.2f}s: "
+          f"+{result['add_students']} students, {result['rename_students']} renamed, "
+          f"{result['adopt_students']} matched, -{result['delete_students']} students, "
+          f"+{result['enroll']} enrollments, -{result['drop']} enrollments")
+    if result['unknown_classes']:
+        print(f"Skipped rows for unknown classes: {', '.join(result['unknown_classes'])}")
@@ -0,0 +1,199 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import string
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import gradedb
+import transcripts
+
+# Static HTML report cards, one page per student plus an index. Pages are
+# rendered on a process pool; each worker compiles the templates once when it
+# starts. A manifest keeps a hash of every page's inputs, so a rerun only
+# renders students whose grades, classes or class averages changed.
+SITE_DIR = 'report_cards'
+MANIFEST = 'manifest.json'
+RENDER_BATCH = 200
+# Kept as they are in page file names; everything else is escaped (see page_name)
+PAGE_NAME_SAFE = frozenset(string.ascii_letters + string.digits + '-_.')
+
+PAGE_TEMPLATE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Report Card - $name</title>
+<style>
+body { font-family: Helvetica, Arial, sans-serif; margin: 2em; }
+table { border-collapse: collapse; width: 100%; margin-bottom: 1.5em; }
+th, td { border: 1px solid #999; padding: 4px 8px; text-align: left; }
+th { background: #eee; }
+@media print { a { display: none; } }
+</style></head>
+<body>
+<a href="index.html">All students</a>
+<h1>Report Card: $name</h1>
+<p>Rocket ID $rocket_id &middot; $period</p>
+$classes
+<h2>Overall: $overall</h2>
+</body></html>
+'''
+CLASS_TEMPLATE = '''<h2>$class_name: $grade</h2>
+<p>Class average: $average</p>
+<table><tr><th>Assignment</th><th>Score</th><th>Max Score</th><th>Percentage</th><th>Letter</th></tr>
+$rows
+</table>'''
+ROW_TEMPLATE = '<tr><td>$title</td><td>$score</td><td>$max_score</td><td>$percentage%</td><td>$letter</td></tr>'
+INDEX_TEMPLATE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Report Cards - $period</title></head>
+<body><h1>Report Cards - $period</h1>
+<ul>
+$links
+</ul></body></html>
+'''
+TEMPLATES = {'page': PAGE_TEMPLATE, 'class': CLASS_TEMPLATE, 'row': ROW_TEMPLATE, 'index': INDEX_TEMPLATE}
+# Changing a template changes every page's hash, so the next run re-renders all
+TEMPLATE_HASH = hashlib.sha256(json.dumps(TEMPLATES, sort_keys=True).encode()).hexdigest()
+
+
+def class_averages(cursor):
+    # Same definition as gradedb.class_average (students on the roster only),
+    # for every class in one pass
+    cursor.execute('''
+        SELECT e.class_id, AVG(g.score * 100.0 / a.max_score)
+        FROM enrollments e
+        JOIN grades g ON g.rocket_id = e.rocket_id AND g.class_id = e.class_id
+        JOIN assignments a ON a.id = g.assignment_id
+        WHERE a.max_score > 0
+        GROUP BY e.class_id
+    ''')
+    return {class_id: round(avg, 1) for class_id, avg in cursor.fetchall()}
+
+
+def page_name(rocket_id):
+    # Characters that are unsafe in a file name or URL become ~XX (their UTF-8
+    # bytes), so the name can be linked as it is, with no further escaping
+    return ''.join(c if c in PAGE_NAME_SAFE else ''.join(f'~{b:02X}' for b in c.encode('utf-8'))
+                   for c in rocket_id) + '.html'
+
+
+def content_hash(card):
+    data = json.dumps(card, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256((TEMPLATE_HASH + data).encode()).hexdigest()
+
+# === Workers ===
+_compiled = None
+
+
+def _init_worker():
+    global _compiled
+    _compiled = {name: string.Template(text) for name, text in TEMPLATES.items()}
+
+
+def render_page(card, templates):
+    e = lambda value: html.escape(str(value))
+    classes = []
+    for c in card['classes']:
+        rows = '\n'.join(templates['row'].substitute(
+            title=e(a['title']), score=e('-' if a['score'] is None else a['score']), max_score=e(a['max_score']),
+            percentage=f"{a['percentage']:.1f}", letter=e(a['letter'])) for a in c['assignments'])
+        average = f"{c['average']:.1f}%" if c['average'] is not None else "n/a"
+        classes.append(templates['class'].substitute(
+            class_name=e(c['class_name']), grade=e(transcripts.grade_text(c)), average=average, rows=rows))
+    overall = e(transcripts.grade_text(card)) if card['classes'] else "No grades recorded"
+    return templates['page'].substitute(
+        name=e(card['name']), rocket_id=e(card['rocket_id']), period=e(card['period']),
+        classes='\n'.join(classes) or '<p>No grades recorded.</p>', overall=overall)
+
+
+def write_page(out_dir, name, text):
+    # Written beside the final name and renamed, so a page is never half written
+    path = os.path.join(out_dir, name)
+    with open(path + '.part', 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(path + '.part', path)
+
+
+def render_batch(out_dir, cards):
+    for card in cards:
+        write_page(out_dir, page_name(card['rocket_id']), render_page(card, _compiled))
+    return len(cards)
+
+# === Site Generation ===
+def generate_site(db_path, out_dir=SITE_DIR, period='', workers=None, force=False, progress=None):
+    # Opens its own connection so it can run off the Tk thread
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    old = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, encoding='utf-8') as f:
+            old = json.load(f)
+
+    conn = gradedb.connect(db_path)
+    cur = conn.cursor()
+    averages = class_averages(cur)
+    hashes = {}
+    names = []
+    stats = {'students': 0, 'rendered': 0, 'skipped': 0, 'removed': 0}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = set()
+        batch = []
+        limit = (workers or os.cpu_count() or 1) * 2
+        for t in transcripts.transcripts(cur):
+            for c in t['classes']:
+                c['average'] = averages.get(c['class_id'])
+            t['period'] = period
+            digest = content_hash(t)
+            hashes[t['rocket_id']] = digest
+            names.append((t['rocket_id'], t['name']))
+            stats['students'] += 1
+            if old.get(t['rocket_id']) == digest and os.path.exists(os.path.join(out_dir, page_name(t['rocket_id']))):
+                stats['skipped'] += 1
+                continue
+            batch.append(t)
+            if len(batch) >= RENDER_BATCH:
+                pending.add(pool.submit(render_batch, out_dir, batch))
+                batch = []
+                # Bounded so only a few batches are held in memory at once
+                if len(pending) >= limit:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stats['rendered'] += future.result()
+                        if progress:
+                            progress(stats)
+        if batch:
+            pending.add(pool.submit(render_batch, out_dir, batch))
+        for future in pending:
+            stats['rendered'] += future.result()
+    conn.close()
+
+    for rocket_id in old.keys() - hashes.keys():
+        path = os.path.join(out_dir, page_name(rocket_id))
+        if os.path.exists(path):
+            os.remove(path)
+        stats['removed'] += 1
+
+    links = '\n'.join(f'<li><a href="{page_name(rid)}">{html.escape(name or "")} ({html.escape(rid)})</a></li>'
+                      for rid, name in names)
+    write_page(out_dir, 'index.html',
+               string.Template(INDEX_TEMPLATE).substitute(period=html.escape(period), links=links))
+    with open(manifest_path + '.part', 'w', encoding='utf-8') as f:
+        json.dump(hashes, f)
+    os.replace(manifest_path + '.part', manifest_path)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate static HTML report cards for every student")
+    parser.add_argument('--db', default='student_grading.db')
+    parser.add_argument('--out', default=SITE_DIR)
+    parser.add_argument('--period', default='', help="grading period shown on every card, e.g. 'Q1 2024'")
+    parser.add_argument('--workers', type=int, help="render processes (default: one per CPU)")
+    parser.add_argument('--force', action='store_true', help="re-render every page")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        raise SystemExit(f"No database at {args.db}")
+    start = time.perf_counter()
+    stats = generate_site(args.db, args.out, args.period, args.workers, args.force)
+    print(f"{stats['students']} students: {stats['rendered']} rendered, {stats['skipped']} unchanged, "
+          f"{stats['removed']} removed in {time.perf_counter() - start:.2f}s")
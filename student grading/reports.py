@@ -0,0 +1,122 @@
+from collections import OrderedDict
+
+from gradedb import calculate_letter_grade
+
+
+def _in(schema):
+    # Unqualified names by default, so a shard connection (shards.py) finds
+    # its own grades and assignments and the attached directory's classes
+    return f"{schema}." if schema else ""
+
+
+def student_report(cursor, rocket_id, schema=None):
+    # Rows of (class_name, title, score, max_score, percentage, letter).
+    # schema picks an attached closed term instead of the current one.
+    cursor.execute(f'''
+        SELECT c.class_name, a.title, a.max_score, g.score
+        FROM {_in(schema)}grades g
+        JOIN {_in(schema)}assignments a ON g.assignment_id = a.id
+        JOIN {_in(schema)}classes c ON g.class_id = c.class_id
+        WHERE g.rocket_id = ?
+        ORDER BY c.class_name
+    ''', (rocket_id,))
+    report = []
+    for class_name, title, max_score, score in cursor.fetchall():
+        percentage = (score / max_score) * 100 if max_score else 0
+        letter, _ = calculate_letter_grade(percentage)
+        report.append((class_name, title, score, max_score, percentage, letter))
+    return report
+
+
+def class_summary(cursor, rocket_id, schema=None):
+    # One line per class, aggregated in a single grouped query:
+    # (class_id, class_name, graded, earned, possible, percentage, letter)
+    cursor.execute(f'''
+        SELECT c.class_id, c.class_name, COUNT(g.score), COALESCE(SUM(g.score), 0),
+               COALESCE(SUM(CASE WHEN g.score IS NOT NULL THEN a.max_score END), 0)
+        FROM {_in(schema)}grades g
+        JOIN {_in(schema)}assignments a ON g.assignment_id = a.id
+        JOIN {_in(schema)}classes c ON g.class_id = c.class_id
+        WHERE g.rocket_id = ?
+        GROUP BY c.class_id
+        ORDER BY c.class_name
+    ''', (rocket_id,))
+    summary = []
+    for class_id, class_name, graded, earned, possible in cursor.fetchall():
+        percentage = earned / possible * 100 if possible else None
+        letter = calculate_letter_grade(percentage)[0] if percentage is not None else None
+        summary.append((class_id, class_name, graded, earned, possible, percentage, letter))
+    return summary
+
+
+def class_section(cursor, rocket_id, class_id, schema=None):
+    # One class's assignments for the student: (title, score, max_score, percentage, letter)
+    cursor.execute(f'''
+        SELECT a.title, g.score, a.max_score
+        FROM {_in(schema)}grades g
+        JOIN {_in(schema)}assignments a ON g.assignment_id = a.id
+        WHERE g.rocket_id = ? AND g.class_id = ?
+        ORDER BY a.due_date, a.title
+    ''', (rocket_id, class_id))
+    section = []
+    for title, score, max_score in cursor.fetchall():
+        percentage = score / max_score * 100 if score is not None and max_score else 0
+        section.append((title, score, max_score, percentage, calculate_letter_grade(percentage)[0]))
+    return section
+
+# --- Report Cache ---
+# Reports are cached per Rocket ID, tagged with the student's row in
+# student_versions (bumped by triggers on every write that can change the
+# report). A hit costs one primary-key lookup instead of the three-way join.
+# The summary and each expanded class section are cached separately under the
+# same version, so a section is only queried the first time it is opened.
+REPORT_CACHE_SIZE = 200
+
+
+def student_version(cursor, rocket_id):
+    cursor.execute("SELECT version FROM student_versions WHERE rocket_id = ?", (rocket_id,))
+    result = cursor.fetchone()
+    return result[0] if result else 0
+
+
+class ReportCache:
+    def __init__(self, max_entries=REPORT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, cursor, rocket_id):
+        # {key: value} for the student, emptied when their version has moved on
+        version = student_version(cursor, rocket_id)
+        cached = self.entries.get(rocket_id)
+        if cached is None or cached[0] != version:
+            cached = (version, {})
+            self.entries[rocket_id] = cached
+        self.entries.move_to_end(rocket_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return cached[1]
+
+    def _lookup(self, cursor, rocket_id, key, load):
+        parts = self._entry(cursor, rocket_id)
+        if key in parts:
+            self.hits += 1
+            return parts[key]
+        self.misses += 1
+        parts[key] = load()
+        return parts[key]
+
+    def get(self, cursor, rocket_id):
+        return self._lookup(cursor, rocket_id, 'report', lambda: student_report(cursor, rocket_id))
+
+    def summary(self, cursor, rocket_id):
+        return self._lookup(cursor, rocket_id, 'summary', lambda: class_summary(cursor, rocket_id))
+
+    def section(self, cursor, rocket_id, class_id):
+        return self._lookup(cursor, rocket_id, ('section', class_id),
+                            lambda: class_section(cursor, rocket_id, class_id))
+
+    def clear(self):
+        # Needed after swapping the database file (restore, term switch)
+        self.entries.clear()
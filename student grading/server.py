@@ -0,0 +1,512 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import queue
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import exports
+import gradedb
+import reports
+
+# Headless JSON service for scripts and other programs on this machine: a
+# small HTTP/1.1 server on asyncio, standard library only, bound to localhost.
+# Reads run on a pool of read-only connections in worker threads, so several
+# are served at once. Writes go through one queue to a single writer, which
+# applies everything waiting (up to WRITE_BATCH) in one transaction, each
+# request in its own savepoint, and then answers them all.
+#
+#   GET    /students                        ?sort=name|rocket_id
+#   POST   /students                        {"rocket_id", "name"}
+#   GET    /students/<rocket_id>            with the classes they are enrolled in
+#   PUT    /students/<rocket_id>            {"name"}
+#   DELETE /students/<rocket_id>
+#   GET    /classes
+#   POST   /classes                         {"class_id", "class_name"}
+#   PUT    /classes/<class_id>              {"class_name"}
+#   DELETE /classes/<class_id>
+#   GET    /classes/<class_id>/roster
+#   POST   /classes/<class_id>/roster       {"rocket_ids": [...]}, enrolls
+#   DELETE /classes/<class_id>/roster       {"rocket_ids": [...]}, drops
+#   GET    /classes/<class_id>/assignments
+#   POST   /classes/<class_id>/assignments  {"title", "due_date", "max_score", "type"}
+#   PUT    /assignments/<id>                any of those fields, plus "version" to detect conflicts
+#   DELETE /assignments/<id>
+#   GET    /classes/<class_id>/grades
+#   GET    /grades/<rocket_id>/<assignment_id>
+#   PUT    /grades/<rocket_id>/<assignment_id>  {"score"}, plus "version" (0 if none) to detect conflicts
+#   GET    /reports/<rocket_id>             per-class summary and assignments
+#   GET    /exports/classes/<class_id>.csv
+#   GET    /exports/all.csv
+#
+# Errors come back as {"error": ...} with 400 (bad input), 404, or 409 (the
+# row changed since it was read, with the current values, or a duplicate);
+# anything unexpected is a 500 for that request alone.
+HOST = '127.0.0.1'
+PORT = 8765
+READ_POOL_SIZE = 4
+WRITE_BATCH = 200
+MAX_BODY = 1024 * 1024
+ASSIGNMENT_TYPES = ('Homework', 'Test')
+# SQLite integers are 64-bit; anything larger fails deep inside the driver
+INT_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+
+class NotFound(Exception):
+    pass
+
+
+def _field(body, name, kind=str):
+    value = body.get(name)
+    if value is None:
+        raise ValueError(f"Missing field {name!r}")
+    if kind is str:
+        if not isinstance(value, str):
+            raise ValueError(f"Field {name!r} must be a string")
+        return value
+    try:
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Field {name!r} must be an integer")
+    if not INT_RANGE[0] <= value <= INT_RANGE[1]:
+        raise ValueError(f"Field {name!r} is out of range")
+    return value
+
+
+def _version(body):
+    return None if body.get('version') is None else _field(body, 'version', int)
+
+
+def _changed(cursor, what):
+    if cursor.rowcount == 0:
+        raise NotFound(f"No {what}")
+    return {'changed': cursor.rowcount}
+
+
+# === Reads ===
+def list_students(cursor, sort_by=None):
+    return [{'rocket_id': rid, 'name': name} for rid, name in gradedb.list_students(cursor, sort_by)]
+
+
+def get_student(cursor, rocket_id):
+    cursor.execute("SELECT rocket_id, name FROM students WHERE rocket_id = ?", (rocket_id,))
+    result = cursor.fetchone()
+    if not result:
+        raise NotFound(f"No student {rocket_id}")
+    cursor.execute("SELECT class_id FROM enrollments WHERE rocket_id = ? ORDER BY class_id", (rocket_id,))
+    return {'rocket_id': result[0], 'name': result[1], 'classes': [r[0] for r in cursor.fetchall()]}
+
+
+def list_classes(cursor):
+    cursor.execute("SELECT class_id, class_name FROM classes ORDER BY class_id")
+    return [{'class_id': cid, 'class_name': name} for cid, name in cursor.fetchall()]
+
+
+def class_roster(cursor, class_id):
+    return [{'rocket_id': rid, 'name': name} for rid, name in gradedb.roster(cursor, class_id)]
+
+
+def list_assignments(cursor, class_id):
+    cursor.execute("SELECT id, title, due_date, max_score, type, class_id, version FROM assignments "
+                   "WHERE class_id = ? ORDER BY due_date, id", (class_id,))
+    return [assignment_json(row) for row in cursor.fetchall()]
+
+
+def assignment_json(row):
+    keys = ('id', 'title', 'due_date', 'max_score', 'type', 'class_id', 'version')
+    return dict(zip(keys, row))
+
+
+def class_grades(cursor, class_id):
+    cursor.execute('''
+        SELECT g.rocket_id, g.assignment_id, a.title, g.score, g.version
+        FROM grades g JOIN assignments a ON a.id = g.assignment_id
+        WHERE a.class_id = ?
+        ORDER BY g.rocket_id, a.due_date, a.id
+    ''', (class_id,))
+    keys = ('rocket_id', 'assignment_id', 'title', 'score', 'version')
+    return [dict(zip(keys, row)) for row in cursor.fetchall()]
+
+
+def get_grade(cursor, rocket_id, assignment_id):
+    result = gradedb.get_grade(cursor, rocket_id, assignment_id)
+    if not result:
+        raise NotFound(f"No grade for {rocket_id} on assignment {assignment_id}")
+    return {'rocket_id': rocket_id, 'assignment_id': assignment_id, 'score': result[0], 'version': result[1]}
+
+
+def student_report(cursor, rocket_id):
+    classes = []
+    for class_id, class_name, graded, earned, possible, percentage, letter in reports.class_summary(cursor, rocket_id):
+        section = reports.class_section(cursor, rocket_id, class_id)
+        classes.append({
+            'class_id': class_id, 'class_name': class_name, 'graded': graded, 'earned': earned,
+            'possible': possible, 'percentage': percentage, 'letter': letter,
+            'assignments': [{'title': t, 'score': s, 'max_score': m, 'percentage': p, 'letter': l}
+                            for t, s, m, p, l in section],
+        })
+    return {'rocket_id': rocket_id, 'classes': classes}
+
+
+def class_csv(cursor, class_id):
+    buffer = io.StringIO(newline='')
+    exports.write_class_csv(cursor, class_id, buffer)
+    return buffer.getvalue()
+
+
+def all_csv(cursor):
+    buffer = io.StringIO(newline='')
+    exports.write_all_csv(cursor, buffer)
+    return buffer.getvalue()
+
+
+# === Writes ===
+# Each runs inside the writer's transaction and raises to undo just itself
+def add_student(cursor, body):
+    rocket_id, name = _field(body, 'rocket_id'), _field(body, 'name')
+    if not re.match(r'^R\d{8}$', rocket_id):
+        raise ValueError("Rocket ID must start with 'R' and 8 digits.")
+    cursor.execute("INSERT INTO students (rocket_id, name) VALUES (?, ?)", (rocket_id, name))
+    return {'rocket_id': rocket_id, 'name': name}
+
+
+def update_student(cursor, rocket_id, body):
+    cursor.execute("UPDATE students SET name = ? WHERE rocket_id = ?", (_field(body, 'name'), rocket_id))
+    return _changed(cursor, f"student {rocket_id}")
+
+
+def delete_student(cursor, rocket_id):
+    cursor.execute("DELETE FROM students WHERE rocket_id = ?", (rocket_id,))
+    return _changed(cursor, f"student {rocket_id}")
+
+
+def add_class(cursor, body):
+    class_id, class_name = _field(body, 'class_id'), _field(body, 'class_name')
+    cursor.execute("INSERT INTO classes (class_id, class_name) VALUES (?, ?)", (class_id, class_name))
+    return {'class_id': class_id, 'class_name': class_name}
+
+
+def update_class(cursor, class_id, body):
+    cursor.execute("UPDATE classes SET class_name = ? WHERE class_id = ?", (_field(body, 'class_name'), class_id))
+    return _changed(cursor, f"class {class_id}")
+
+
+def delete_class(cursor, class_id):
+    cursor.execute("DELETE FROM classes WHERE class_id = ?", (class_id,))
+    return _changed(cursor, f"class {class_id}")
+
+
+def change_roster(cursor, class_id, body, enrolling):
+    rocket_ids = body.get('rocket_ids')
+    if not isinstance(rocket_ids, list):
+        raise ValueError("Field 'rocket_ids' must be a list")
+    cursor.execute("SELECT 1 FROM classes WHERE class_id = ?", (class_id,))
+    if not cursor.fetchone():
+        raise NotFound(f"No class {class_id}")
+    changed = (gradedb.enroll if enrolling else gradedb.drop)(cursor, class_id, [str(r) for r in rocket_ids])
+    return {'changed': changed}
+
+
+def _assignment_fields(body, current=None):
+    # New values, falling back to the current row for fields left out
+    _, title, due_date, max_score, type_, _, _ = current or (None,) * 7
+    fields = {'title': title, 'due_date': due_date, 'max_score': max_score, **body}
+    title = _field(fields, 'title')
+    if not title:
+        raise ValueError("Missing field 'title'")
+    due_date = gradedb.parse_due_date(_field(fields, 'due_date'))
+    max_score = _field(fields, 'max_score', int)
+    type_ = body.get('type', type_)
+    if type_ not in ASSIGNMENT_TYPES:
+        raise ValueError(f"Type must be one of {', '.join(ASSIGNMENT_TYPES)}")
+    return title, due_date, max_score, type_
+
+
+def add_assignment(cursor, class_id, body):
+    cursor.execute("SELECT 1 FROM classes WHERE class_id = ?", (class_id,))
+    if not cursor.fetchone():
+        raise NotFound(f"No class {class_id}")
+    title, due_date, max_score, type_ = _assignment_fields(body)
+    cursor.execute("INSERT INTO assignments (title, due_date, max_score, type, class_id) VALUES (?, ?, ?, ?, ?)",
+                   (title, due_date, max_score, type_, class_id))
+    return assignment_json(gradedb.get_assignment(cursor, cursor.lastrowid))
+
+
+def update_assignment(cursor, assignment_id, body):
+    current = gradedb.get_assignment(cursor, assignment_id)
+    if not current:
+        raise NotFound(f"No assignment {assignment_id}")
+    gradedb.update_assignment(cursor, assignment_id, *_assignment_fields(body, current), _version(body))
+    return assignment_json(gradedb.get_assignment(cursor, assignment_id))
+
+
+def delete_assignment(cursor, assignment_id):
+    cursor.execute("DELETE FROM assignments WHERE id = ?", (assignment_id,))
+    return _changed(cursor, f"assignment {assignment_id}")
+
+
+def save_grade(cursor, rocket_id, assignment_id, body):
+    assignment = gradedb.get_assignment(cursor, assignment_id)
+    if not assignment:
+        raise NotFound(f"No assignment {assignment_id}")
+    cursor.execute("SELECT 1 FROM students WHERE rocket_id = ?", (rocket_id,))
+    if not cursor.fetchone():
+        raise NotFound(f"No student {rocket_id}")
+    score = _field(body, 'score', int)
+    gradedb.save_grade(cursor, rocket_id, assignment_id, score, assignment[5], _version(body))
+    return get_grade(cursor, rocket_id, assignment_id)
+
+
+# (method, path pattern, 'read' or 'write', handler, arguments from the match/query/body)
+ROUTES = [
+    ('GET', r'/students', 'read', list_students, lambda m, q, b: [q.get('sort')]),
+    ('POST', r'/students', 'write', add_student, lambda m, q, b: [b]),
+    ('GET', r'/students/([^/]+)', 'read', get_student, lambda m, q, b: [m[1]]),
+    ('PUT', r'/students/([^/]+)', 'write', update_student, lambda m, q, b: [m[1], b]),
+    ('DELETE', r'/students/([^/]+)', 'write', delete_student, lambda m, q, b: [m[1]]),
+    ('GET', r'/classes', 'read', list_classes, lambda m, q, b: []),
+    ('POST', r'/classes', 'write', add_class, lambda m, q, b: [b]),
+    ('PUT', r'/classes/([^/]+)', 'write', update_class, lambda m, q, b: [m[1], b]),
+    ('DELETE', r'/classes/([^/]+)', 'write', delete_class, lambda m, q, b: [m[1]]),
+    ('GET', r'/classes/([^/]+)/roster', 'read', class_roster, lambda m, q, b: [m[1]]),
+    ('POST', r'/classes/([^/]+)/roster', 'write', change_roster, lambda m, q, b: [m[1], b, True]),
+    ('DELETE', r'/classes/([^/]+)/roster', 'write', change_roster, lambda m, q, b: [m[1], b, False]),
+    ('GET', r'/classes/([^/]+)/assignments', 'read', list_assignments, lambda m, q, b: [m[1]]),
+    ('POST', r'/classes/([^/]+)/assignments', 'write', add_assignment, lambda m, q, b: [m[1], b]),
+    ('PUT', r'/assignments/(\d+)', 'write', update_assignment, lambda m, q, b: [int(m[1]), b]),
+    ('DELETE', r'/assignments/(\d+)', 'write', delete_assignment, lambda m, q, b: [int(m[1])]),
+    ('GET', r'/classes/([^/]+)/grades', 'read', class_grades, lambda m, q, b: [m[1]]),
+    ('GET', r'/grades/([^/]+)/(\d+)', 'read', get_grade, lambda m, q, b: [m[1], int(m[2])]),
+    ('PUT', r'/grades/([^/]+)/(\d+)', 'write', save_grade, lambda m, q, b: [m[1], int(m[2]), b]),
+    ('GET', r'/reports/([^/]+)', 'read', student_report, lambda m, q, b: [m[1]]),
+    ('GET', r'/exports/classes/([^/]+)\.csv', 'read', class_csv, lambda m, q, b: [m[1]]),
+    ('GET', r'/exports/all\.csv', 'read', all_csv, lambda m, q, b: []),
+]
+ROUTES = [(method, re.compile(pattern + '$'), kind, handler, args) for method, pattern, kind, handler, args in ROUTES]
+
+
+class GradeService:
+    def __init__(self, path, readers=READ_POOL_SIZE, batch=WRITE_BATCH):
+        # Migrate up front; the read-only connections can't
+        conn = gradedb.connect(path)
+        sharded = conn.execute("SELECT 1 FROM shard_map LIMIT 1").fetchone()
+        conn.close()
+        if sharded:
+            raise ValueError("Service mode reads the directory file only; this database has sharded classes")
+        self.path = path
+        self.batch = batch
+        uri = f"file:{quote(os.path.abspath(path))}?mode=ro"
+        self.readers = queue.Queue()
+        for _ in range(readers):
+            self.readers.put(sqlite3.connect(uri, uri=True, timeout=gradedb.BUSY_TIMEOUT, check_same_thread=False))
+        self.read_pool = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='read')
+        # One thread owns the write connection for its whole life
+        self.write_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='write')
+        self.write_conn = None
+        self.writes = None
+        self.writer_task = None
+        self.batches = 0
+
+    async def start(self, host=HOST, port=PORT):
+        loop = asyncio.get_running_loop()
+        self.write_conn = await loop.run_in_executor(self.write_pool, gradedb.connect, self.path)
+        self.writes = asyncio.Queue()
+        self.writer_task = asyncio.create_task(self.writer())
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def close(self):
+        if self.writer_task:
+            self.writer_task.cancel()
+        while not self.readers.empty():
+            self.readers.get().close()
+        self.read_pool.shutdown()
+        if self.write_conn:
+            await asyncio.get_running_loop().run_in_executor(self.write_pool, self.write_conn.close)
+        self.write_pool.shutdown()
+
+    # --- Reads and Writes ---
+    def _read(self, handler, args):
+        conn = self.readers.get()
+        try:
+            return handler(conn.cursor(), *args)
+        finally:
+            self.readers.put(conn)
+
+    async def read(self, handler, args):
+        return await asyncio.get_running_loop().run_in_executor(self.read_pool, self._read, handler, args)
+
+    async def write(self, handler, args):
+        future = asyncio.get_running_loop().create_future()
+        await self.writes.put((handler, args, future))
+        return await future
+
+    def _apply(self, batch):
+        def run_batch():
+            outcomes = []
+            cur = self.write_conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            # Checked again under the write lock: a class moved into a shard
+            # since startup would have its grades (and a deleted student's
+            # grades) out of this connection's reach
+            if cur.execute("SELECT 1 FROM shard_map LIMIT 1").fetchone():
+                raise RuntimeError("This database now has sharded classes; writes are refused")
+            for handler, args, _ in batch:
+                cur.execute("SAVEPOINT request")
+                try:
+                    outcomes.append((True, handler(cur, *args)))
+                except Exception as e:
+                    # A busy database fails the whole batch, which is retried
+                    if isinstance(e, sqlite3.OperationalError) and gradedb.is_busy(e):
+                        raise
+                    cur.execute("ROLLBACK TO request")
+                    outcomes.append((False, e))
+                cur.execute("RELEASE request")
+            return outcomes
+        return gradedb.write_with_retry(self.write_conn, run_batch)
+
+    async def writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.writes.get()]
+            while len(batch) < self.batch and not self.writes.empty():
+                batch.append(self.writes.get_nowait())
+            # Nothing may end this loop, or every later write would wait forever
+            try:
+                outcomes = await loop.run_in_executor(self.write_pool, self._apply, batch)
+            except Exception as e:
+                outcomes = [(False, e)] * len(batch)
+            self.batches += 1
+            for (_, _, future), (ok, value) in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    # --- HTTP ---
+    async def dispatch(self, method, target, body):
+        parts = urlsplit(target)
+        path = unquote(parts.path).rstrip('/') or '/'
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        allowed = False
+        for route_method, pattern, kind, handler, args in ROUTES:
+            match = pattern.match(path)
+            if not match:
+                continue
+            allowed = True
+            if route_method != method:
+                continue
+            try:
+                payload = json.loads(body) if body else {}
+                if not isinstance(payload, dict):
+                    raise ValueError("Request body must be a JSON object")
+                call_args = args(match, query, payload)
+                result = await (self.read if kind == 'read' else self.write)(handler, call_args)
+            except NotFound as e:
+                return 404, {'error': str(e)}
+            except gradedb.ConflictError as e:
+                return 409, {'error': str(e), 'current': e.current}
+            except sqlite3.IntegrityError as e:
+                return 409, {'error': str(e)}
+            except ValueError as e:
+                return 400, {'error': str(e)}
+            except Exception as e:
+                return 500, {'error': str(e)}
+            return (201 if method == 'POST' else 200), result
+        if allowed:
+            return 405, {'error': f"{method} not allowed on {path}"}
+        return 404, {'error': f"No route for {path}"}
+
+    async def handle(self, reader, writer):
+        # Keep-alive HTTP/1.1: one request at a time per connection
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, _ = line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': "Request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, result = await self.dispatch(method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, result, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, result, keep_alive):
+        if isinstance(result, str):
+            content_type, data = 'text/csv; charset=utf-8', result.encode('utf-8')
+        else:
+            content_type, data = 'application/json', json.dumps(result).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: {content_type}\r\nContent-Length: {len(data)}\r\n"
+                + ("" if keep_alive else "Connection: close\r\n") + "\r\n")
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+
+async def request(reader, writer, method, path, body=None):
+    # Minimal keep-alive client for scripts and the load test: returns (status, parsed body)
+    data = json.dumps(body).encode('utf-8') if body is not None else b''
+    writer.write(f"{method} {quote(path, safe='/?=&')} HTTP/1.1\r\nHost: {HOST}\r\nContent-Length: {len(data)}\r\n"
+                 f"Content-Type: application/json\r\n\r\n".encode('latin-1') + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(headers.get('content-length', 0)))
+    if headers.get('content-type', '').startswith('application/json'):
+        return status, json.loads(payload)
+    return status, payload.decode('utf-8')
+
+
+async def serve(path, host, port, readers):
+    service = GradeService(path, readers)
+    server = await service.start(host, port)
+    print(f"Serving {path} on http://{host}:{port} ({readers} readers)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON service for the gradebook")
+    parser.add_argument('--db', default='student_grading.db')
+    parser.add_argument('--host', default=HOST, help="keep this on localhost; there is no authentication")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--readers', type=int, default=READ_POOL_SIZE)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, args.readers))
+    except ValueError as e:
+        raise SystemExit(str(e))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,376 @@
+import argparse
+import csv
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import changesets
+import exports
+import gradedb
+import reports
+
+# --- Shard Settings ---
+# Optional sharded layout. The directory database (student_grading.db) keeps
+# students, classes and enrollments; a shard file under SHARD_DIR holds the
+# assignments, grades, class totals and curves of one class, or of several
+# classes sent to the same shard (a department). shard_map in the directory
+# says where each class lives, and a class with no entry stays in the
+# directory file, so an unsharded install is one with an empty map.
+#
+# A shard connection opens the shard as main and attaches the directory, so
+# unqualified names find the shard's assignments and grades and the
+# directory's students, classes and enrollments: class-scoped queries run
+# unchanged on the connection the router hands out. Cross-class reads fan out
+# over the directory and every shard on worker threads, each with its own
+# connection, and merge the results.
+#
+# Shard writes are not in the sync change log or the report cache versions,
+# which live in the directory; sync and sharding are alternatives.
+SHARD_DIR = 'shards'
+SHARD_ID_SPAN = 10 ** 9
+FAN_OUT_WORKERS = 8
+SHARD_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS assignments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT,
+    due_date TEXT,
+    max_score INTEGER,
+    type TEXT,
+    class_id TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+)''',
+    '''CREATE TABLE IF NOT EXISTS grades (
+    rocket_id TEXT,
+    assignment_id INTEGER REFERENCES assignments (id) ON DELETE CASCADE,
+    score INTEGER,
+    class_id TEXT,
+    version INTEGER NOT NULL DEFAULT 1
+)''',
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_grades_student_assignment ON grades (rocket_id, assignment_id)",
+    "CREATE INDEX IF NOT EXISTS idx_grades_assignment ON grades (assignment_id)",
+    "CREATE INDEX IF NOT EXISTS idx_grades_class ON grades (class_id)",
+    "CREATE INDEX IF NOT EXISTS idx_assignments_class_title ON assignments (class_id, title)",
+    "CREATE INDEX IF NOT EXISTS idx_assignments_class_due ON assignments (class_id, due_date)",
+    "CREATE INDEX IF NOT EXISTS idx_assignments_due ON assignments (due_date)",
+    '''CREATE TABLE IF NOT EXISTS class_totals (
+    rocket_id TEXT,
+    class_id TEXT,
+    earned REAL NOT NULL,
+    possible REAL NOT NULL,
+    graded INTEGER NOT NULL,
+    PRIMARY KEY (rocket_id, class_id)
+)''',
+    "CREATE INDEX IF NOT EXISTS idx_class_totals_class ON class_totals (class_id)",
+    '''CREATE TABLE IF NOT EXISTS curves (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    assignment_id INTEGER REFERENCES assignments (id) ON DELETE CASCADE,
+    method TEXT,
+    params TEXT,
+    applied_at TEXT,
+    reverted_at TEXT
+)''',
+    '''CREATE TABLE IF NOT EXISTS curve_scores (
+    curve_id INTEGER REFERENCES curves (id) ON DELETE CASCADE,
+    rocket_id TEXT,
+    old_score INTEGER,
+    new_score INTEGER,
+    PRIMARY KEY (curve_id, rocket_id)
+)''',
+    "CREATE INDEX IF NOT EXISTS idx_curves_assignment ON curves (assignment_id)",
+] + gradedb.TOTAL_TRIGGERS
+# Copied in this order when a class moves. Class totals are not copied: the
+# shard's own triggers rebuild them as the grades arrive.
+MOVED_TABLES = [
+    ('assignments', "class_id = :class_id"),
+    ('grades', "assignment_id IN (SELECT id FROM directory.assignments WHERE class_id = :class_id)"),
+    ('curves', "assignment_id IN (SELECT id FROM directory.assignments WHERE class_id = :class_id)"),
+    ('curve_scores', '''curve_id IN (SELECT c.id FROM directory.curves c
+                                     JOIN directory.assignments a ON a.id = c.assignment_id
+                                     WHERE a.class_id = :class_id)'''),
+]
+# A shard's classes that the map doesn't send there
+UNMAPPED = '''
+    SELECT class_id FROM main.assignments
+    WHERE class_id NOT IN (SELECT class_id FROM directory.shard_map WHERE shard = :shard)
+    UNION
+    SELECT class_id FROM main.class_totals
+    WHERE class_id NOT IN (SELECT class_id FROM directory.shard_map WHERE shard = :shard)
+'''
+ALL_GRADES = '''
+    SELECT s.rocket_id, s.name, c.class_id, c.class_name,
+           a.id, a.title, a.type, a.due_date, a.max_score, g.score
+    FROM grades g
+    JOIN students s ON s.rocket_id = g.rocket_id
+    LEFT JOIN assignments a ON g.assignment_id = a.id
+    LEFT JOIN classes c ON g.class_id = c.class_id
+'''
+
+
+def shard_path(shard, shard_dir=SHARD_DIR):
+    return os.path.join(shard_dir, re.sub(r'[^\w.-]', '_', shard) + '.db')
+
+
+def open_shard(path, directory_path):
+    conn = sqlite3.connect(path, uri=True, timeout=gradedb.BUSY_TIMEOUT)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("ATTACH DATABASE ? AS directory", (directory_path,))
+    return conn
+
+
+def has_shards(conn):
+    return conn.execute("SELECT 1 FROM shard_map LIMIT 1").fetchone() is not None
+
+
+def directory_file(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def clear_unmapped(conn, shard, shard_dir=SHARD_DIR):
+    # Deletes a shard's rows for classes the map doesn't send there, which is
+    # what a move interrupted between its two commits leaves behind. Returns
+    # how many classes were cleared. A read decides whether there is anything
+    # to do; the delete holds the directory's write lock, so no move can be
+    # halfway through meanwhile.
+    path = shard_path(shard, shard_dir)
+    if not os.path.exists(path):
+        return 0
+    shard_conn = open_shard(path, directory_file(conn))
+    try:
+        if not shard_conn.execute(UNMAPPED, {'shard': shard}).fetchone():
+            return 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Deferred: IMMEDIATE would also try to lock the attached directory
+            shard_conn.execute("BEGIN")
+            classes = [r[0] for r in shard_conn.execute(UNMAPPED, {'shard': shard}).fetchall()]
+            for class_id in classes:
+                # Deleting the assignments cascades to their grades and curves
+                shard_conn.execute("DELETE FROM main.class_totals WHERE class_id = ?", (class_id,))
+                shard_conn.execute("DELETE FROM main.assignments WHERE class_id = ?", (class_id,))
+            shard_conn.commit()
+        finally:
+            conn.rollback()
+        return len(classes)
+    finally:
+        shard_conn.close()
+
+
+def move_class(conn, class_id, shard, shard_dir=SHARD_DIR):
+    # Moves a class's assignments, grades, totals and curves from the
+    # directory into a shard (created on first use). SQLite can't commit
+    # across two WAL files atomically, so this is two commits under the
+    # directory's write lock: the rows are copied into the shard, then removed
+    # from the directory in the transaction that maps the class to the shard.
+    # A crash in between leaves the class unmapped, so it is still read from
+    # the directory, and clear_unmapped (run when a router opens and before
+    # every move) deletes the shard's stray copy. Ids are kept; new rows in
+    # the shard number from its id_base.
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM classes WHERE class_id = ?", (class_id,))
+    if not cur.fetchone():
+        raise ValueError(f"No class with ID {class_id}")
+    cur.execute("SELECT shard FROM shard_map WHERE class_id = ?", (class_id,))
+    current = cur.fetchone()
+    if current:
+        raise ValueError(f"Class {class_id} is already in shard {current[0]}")
+    path = shard_path(shard, shard_dir)
+    os.makedirs(shard_dir, exist_ok=True)
+    cur.execute("SELECT id_base FROM shards WHERE shard = ?", (shard,))
+    result = cur.fetchone()
+    id_base = result[0] if result else SHARD_ID_SPAN * (1 + cur.execute("SELECT COUNT(*) FROM shards").fetchone()[0])
+    # Registered before any copy, so an interrupted first move is still cleared
+    cur.execute("INSERT OR IGNORE INTO shards (shard, id_base) VALUES (?, ?)", (shard, id_base))
+    conn.commit()
+    created = sqlite3.connect(path)
+    created.execute("PRAGMA journal_mode = WAL")
+    for statement in SHARD_SCHEMA:
+        created.execute(statement)
+    for table in ('assignments', 'curves'):
+        if not created.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?",
+                               (id_base, table)).rowcount:
+            created.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table, id_base))
+    created.commit()
+    created.close()
+    clear_unmapped(conn, shard, shard_dir)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        shard_conn = open_shard(path, directory_file(conn))
+        try:
+            shard_conn.execute("BEGIN")
+            for table, condition in MOVED_TABLES:
+                shard_conn.execute(f"INSERT INTO main.{table} SELECT * FROM directory.{table} WHERE {condition}",
+                                   {'class_id': class_id})
+            shard_conn.commit()
+        finally:
+            shard_conn.close()
+        # Moving data between files is housekeeping, not edits to sync
+        changesets.set_tracking(conn, False)
+        # Deleting the assignments cascades to their grades and curves
+        conn.execute("DELETE FROM class_totals WHERE class_id = ?", (class_id,))
+        conn.execute("DELETE FROM assignments WHERE class_id = ?", (class_id,))
+        conn.execute("INSERT INTO shard_map (class_id, shard) VALUES (?, ?)", (class_id, shard))
+        changesets.set_tracking(conn, True)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        clear_unmapped(conn, shard, shard_dir)
+        raise
+    return path
+
+
+class ShardRouter:
+    def __init__(self, conn, directory_path, shard_dir=None):
+        self.directory = conn
+        self.directory_path = os.path.abspath(directory_path)
+        self.shard_dir = shard_dir or os.path.join(os.path.dirname(self.directory_path), SHARD_DIR)
+        self.connections = {}
+        self.cursors = {}
+        self.refresh()
+        for (shard,) in conn.execute("SELECT shard FROM shards").fetchall():
+            clear_unmapped(conn, shard, self.shard_dir)
+
+    def refresh(self):
+        # Re-read the map after classes are moved
+        self.shard_map = dict(self.directory.execute("SELECT class_id, shard FROM shard_map"))
+
+    def shards(self):
+        return sorted(set(self.shard_map.values()))
+
+    def shard_connection(self, shard):
+        if shard not in self.connections:
+            self.connections[shard] = open_shard(shard_path(shard, self.shard_dir), self.directory_path)
+        return self.connections[shard]
+
+    def connection(self, class_id):
+        # The connection holding the class's assignments and grades
+        shard = self.shard_map.get(class_id)
+        return self.directory if shard is None else self.shard_connection(shard)
+
+    def cursor(self, class_id):
+        conn = self.connection(class_id)
+        if id(conn) not in self.cursors:
+            self.cursors[id(conn)] = conn.cursor()
+        return self.cursors[id(conn)]
+
+    def drop_class(self, class_id):
+        # Classes are deleted in the directory; their rows in a shard go first
+        shard = self.shard_map.get(class_id)
+        if shard is None:
+            return
+        conn = self.connection(class_id)
+        conn.execute("DELETE FROM main.class_totals WHERE class_id = ?", (class_id,))
+        conn.execute("DELETE FROM main.assignments WHERE class_id = ?", (class_id,))
+        conn.commit()
+        self.directory.execute("DELETE FROM shard_map WHERE class_id = ?", (class_id,))
+        self.directory.commit()
+        del self.shard_map[class_id]
+
+    def drop_student(self, rocket_id):
+        # Called once a student is deleted in the directory, whose cascade
+        # can't reach the shards, to delete their grades and totals there
+        for shard in self.shards():
+            conn = self.shard_connection(shard)
+            conn.execute("DELETE FROM main.grades WHERE rocket_id = ?", (rocket_id,))
+            conn.execute("DELETE FROM main.class_totals WHERE rocket_id = ?", (rocket_id,))
+            conn.commit()
+
+    def close(self):
+        for conn in self.connections.values():
+            conn.close()
+        self.connections.clear()
+        self.cursors.clear()
+
+    # --- Fan-out ---
+    def _run(self, shard, func):
+        # Worker threads can't share connections, so each opens its own
+        if shard is None:
+            conn = sqlite3.connect(self.directory_path, uri=True, timeout=gradedb.BUSY_TIMEOUT)
+        else:
+            conn = open_shard(shard_path(shard, self.shard_dir), self.directory_path)
+        try:
+            return func(conn.cursor())
+        finally:
+            conn.close()
+
+    def fan_out(self, func):
+        # func(cursor) on the directory and every shard in parallel; results in that order
+        sources = [None] + self.shards()
+        with ThreadPoolExecutor(max_workers=min(FAN_OUT_WORKERS, len(sources))) as pool:
+            return list(pool.map(lambda shard: self._run(shard, func), sources))
+
+    def class_summary(self, rocket_id):
+        results = self.fan_out(lambda cur: reports.class_summary(cur, rocket_id))
+        return sorted((line for lines in results for line in lines), key=lambda line: line[1])
+
+    def class_section(self, rocket_id, class_id):
+        return reports.class_section(self.cursor(class_id), rocket_id, class_id)
+
+    def student_report(self, rocket_id):
+        results = self.fan_out(lambda cur: reports.student_report(cur, rocket_id))
+        return sorted((row for rows in results for row in rows), key=lambda row: row[0])
+
+    def write_all_csv(self, f):
+        # Each source streams its grade rows to a temporary file in parallel;
+        # the files are joined in order, then students with no grades anywhere
+        # get one row each, as in exports.write_all_csv
+        def export(cur):
+            part = tempfile.TemporaryFile('w+', newline='')
+            cur.execute(ALL_GRADES)
+            writer = csv.writer(part)
+            count = 0
+            graded = set()
+            while True:
+                rows = cur.fetchmany(1000)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                graded.update(row[0] for row in rows)
+                count += len(rows)
+            return part, count, graded
+
+        parts = self.fan_out(export)
+        csv.writer(f).writerow(exports.ALL_DATA_HEADER)
+        count = 0
+        graded = set()
+        for part, part_count, part_graded in parts:
+            part.seek(0)
+            shutil.copyfileobj(part, f)
+            part.close()
+            count += part_count
+            graded |= part_graded
+        writer = csv.writer(f)
+        for rocket_id, name in self.directory.execute("SELECT rocket_id, name FROM students"):
+            if rocket_id not in graded:
+                writer.writerow([rocket_id, name] + [None] * 8)
+                count += 1
+        return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move classes into shard files and list the layout")
+    parser.add_argument('--db', default='student_grading.db')
+    parser.add_argument('--shard-dir', default=None, help=f"default: {SHARD_DIR}/ next to the database")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('move', help="move classes into a shard")
+    p.add_argument('class_ids', nargs='+')
+    p.add_argument('--shard', help="shard name (default: one shard per class)")
+    sub.add_parser('list', help="show which classes live in which shard")
+    args = parser.parse_args()
+
+    conn = gradedb.connect(args.db)
+    shard_dir = args.shard_dir or os.path.join(os.path.dirname(os.path.abspath(args.db)), SHARD_DIR)
+    if args.command == 'move':
+        for class_id in args.class_ids:
+            try:
+                path = move_class(conn, class_id, args.shard or class_id, shard_dir)
+            except ValueError as e:
+                raise SystemExit(str(e))
+            print(f"{class_id} -> {path}")
+    else:
+        for class_id, shard in conn.execute("SELECT class_id, shard FROM shard_map ORDER BY shard, class_id"):
+            print(f"{shard}: {class_id}")
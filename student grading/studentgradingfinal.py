@@ -1,69 +1,92 @@
 import tkinter as tk
-from tkinter import messagebox, simpledialog, filedialog, ttk
+from tkinter import messagebox, simpledialog, ttk
 import sqlite3
-import csv
+import os
 import re
+import threading
+import time
+import backups
+import gradedb
 
 # --- Database Setup ---
-conn = sqlite3.connect('student_grading.db')
-cursor = conn.cursor()
-
-cursor.execute('''CREATE TABLE IF NOT EXISTS students (
-    rocket_id TEXT PRIMARY KEY,
-    name TEXT
-)''')
-
-cursor.execute('''CREATE TABLE IF NOT EXISTS classes (
-    class_id TEXT PRIMARY KEY,
-    class_name TEXT
-)''')
-
-cursor.execute('''CREATE TABLE IF NOT EXISTS assignments (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    title TEXT,
-    due_date TEXT,
-    max_score INTEGER,
-    type TEXT,
-    class_id TEXT
-)''')
-
-cursor.execute('''CREATE TABLE IF NOT EXISTS grades (
-    rocket_id TEXT,
-    assignment_id INTEGER,
-    score INTEGER,
-    class_id TEXT
-)''')
-
-conn.commit()
-
-GRADE_SCALE = [
-    (93, 'A', 4.0), (90, 'A-', 3.7), (87, 'B+', 3.3), (83, 'B', 3.0), (80, 'B-', 2.7),
-    (77, 'C+', 2.3), (73, 'C', 2.0), (70, 'C-', 1.7), (67, 'D+', 1.3), (63, 'D', 1.0),
-    (60, 'D-', 0.7), (0, 'F', 0.0)
+# The connection is opened once the window is on screen (see open_database), so
+# importing this module or starting the app never waits on the database file.
+# Rarely used modules (exports, reports, filedialog, tracing) are imported where
+# they are first needed.
+DB_PATH = 'student_grading.db'
+conn = None
+cursor = None
+# Set when some classes live in shard files (see shards.py)
+router = None
+
+
+# Orphan sweeper pacing: delay between batches, and between full passes
+SWEEP_STEP_MS = 250
+SWEEP_PAUSE_MS = 10 * 60 * 1000
+# Storage maintenance runs only after the user has been idle this long
+IDLE_AFTER_SECONDS = 30
+IDLE_CHECK_MS = 5000
+# How often open screens check the change log for writes made elsewhere
+CHANGE_POLL_MS = 1000
+
+
+def open_database(path=DB_PATH, tracer=None):
+    global conn, cursor, router
+    conn = gradedb.connect(path)
+    cursor = conn.cursor()
+    if tracer:
+        tracer.install(conn)
+        cursor = tracer.wrap_cursor(cursor)
+    if conn.execute("SELECT 1 FROM shard_map LIMIT 1").fetchone():
+        import shards
+        router = shards.ShardRouter(conn, path)
+    return conn
+
+# Screens timed by the tracer when the app is started with --trace or --trace-log
+TRACED_SCREENS = [
+    'homepage', 'student_menu', 'list_students', 'class_menu', 'list_classes', 'roster_menu',
+    'assignment_menu', 'show_assignment_options', 'list_assignments', 'due_dates', 'missing_work',
+    'gradebook_grid', 'grade_menu', 'curve_menu', 'what_if_menu',
+    'grade_class_interface', 'submit_or_update_grade', 'view_student_report',
+    'show_student_report', 'export_csv', 'export_transcripts', 'publish_report_cards',
+    'export_all_data', 'term_menu', 'sync_menu', 'maintenance_menu', 'backup_menu',
 ]
 
-def calculate_letter_grade(score):
-    for min_score, letter, gpa in GRADE_SCALE:
-        if score >= min_score:
-            return letter, gpa
-    return 'F', 0.0
-
 class StudentGradingApp:
-    def __init__(self, root):
+    def __init__(self, root, tracer=None, show_trace_panel=False):
         self.root = root
         self.root.title("Student Grading App")
         self.root.geometry("1200x700")
         self.nav_stack = []
         self.current_class_id = None
+        self.report_cache = None
+        self.changes = None
+        self.screen_rebuild = None
+        self.rebuild_pending = False
 
         self.main_frame = tk.Frame(root)
         self.main_frame.pack(side='left', fill='both', expand=True)
 
+        self.backup_scheduler = backups.BackupScheduler(DB_PATH)
+        self.orphan_sweeper = None
+        self.idle_maintenance = None
+        self.last_activity = time.time()
+        self.root.bind_all('<Any-KeyPress>', self.note_activity, add='+')
+        self.root.bind_all('<Any-ButtonPress>', self.note_activity, add='+')
+
+        if tracer:
+            tracer.instrument(self, TRACED_SCREENS)
+            if show_trace_panel:
+                tracer.show_panel(root)
+
         self.homepage()
 
     def clear_frame(self):
         for widget in self.main_frame.winfo_children():
             widget.destroy()
+        if self.changes:
+            self.changes.clear()
+        self.screen_rebuild = None
         self.render_nav_buttons()
 
     def render_nav_buttons(self):
@@ -89,6 +112,68 @@ class StudentGradingApp:
         else:
             self.homepage()
 
+    # === Change Notifications ===
+    # Open screens subscribe to the change bus (events.py) and patch just the
+    # rows a write touched. Changes that alter a screen's shape (a new column,
+    # a class appearing in a report) rebuild it once, after the current batch.
+    def start_change_polling(self):
+        import events
+        self.changes = events.ChangeBus(conn)
+        self.root.after(CHANGE_POLL_MS, self.poll_changes_tick)
+
+    def watch(self, kinds, callback, rebuild):
+        # Lasts until the next screen clears the frame; rebuild redraws this screen
+        if self.changes:
+            self.changes.subscribe(kinds, callback)
+            self.screen_rebuild = rebuild
+
+    def commit(self, class_id=None):
+        self.class_conn(class_id).commit()
+        self.poll_changes()
+
+    def poll_changes(self):
+        if self.changes and self.changes.poll() is None:
+            self.request_rebuild()
+
+    def poll_changes_tick(self):
+        try:
+            self.poll_changes()
+        except sqlite3.OperationalError:
+            pass
+        self.root.after(CHANGE_POLL_MS, self.poll_changes_tick)
+
+    def request_rebuild(self):
+        rebuild = self.screen_rebuild
+        if rebuild and not self.rebuild_pending:
+            self.rebuild_pending = True
+            self.root.after_idle(lambda: self.run_rebuild(rebuild))
+
+    def run_rebuild(self, rebuild):
+        self.rebuild_pending = False
+        if self.screen_rebuild is rebuild:
+            rebuild()
+
+    # A sharded class's assignments and grades are reached through the router;
+    # anything else uses the directory connection
+    def class_conn(self, class_id):
+        return router.connection(class_id) if router and class_id else conn
+
+    def class_cursor(self, class_id):
+        return router.cursor(class_id) if router and class_id else cursor
+
+    def patch_label(self, labels, old_key, new_key, text):
+        # One label per row: text None removes it, an unknown key adds one at the end
+        label = labels.pop(old_key, None)
+        if text is None:
+            if label:
+                label.destroy()
+            return
+        if label is None:
+            label = tk.Label(self.main_frame)
+            label.pack()
+        label.config(text=text)
+        labels[new_key] = label
+
     def homepage(self):
         self.clear_frame()
         self.nav_stack = [self.homepage]
@@ -97,6 +182,10 @@ class StudentGradingApp:
         tk.Button(self.main_frame, text="Class Management", width=30, command=lambda: self.go_to(self.class_menu)).pack(pady=5)
         tk.Button(self.main_frame, text="Assignment Management", width=30, command=lambda: self.go_to(self.assignment_menu)).pack(pady=5)
         tk.Button(self.main_frame, text="Grades", width=30, command=lambda: self.go_to(self.grade_menu)).pack(pady=5)
+        tk.Button(self.main_frame, text="Terms", width=30, command=lambda: self.go_to(self.term_menu)).pack(pady=5)
+        tk.Button(self.main_frame, text="Sync", width=30, command=lambda: self.go_to(self.sync_menu)).pack(pady=5)
+        tk.Button(self.main_frame, text="Maintenance", width=30, command=lambda: self.go_to(self.maintenance_menu)).pack(pady=5)
+        tk.Button(self.main_frame, text="Backups", width=30, command=lambda: self.go_to(self.backup_menu)).pack(pady=5)
     # === Student Management ===
     def student_menu(self):
         self.clear_frame()
@@ -105,6 +194,7 @@ class StudentGradingApp:
         tk.Button(self.main_frame, text="Add Student", width=30, command=self.add_student).pack(pady=5)
         tk.Button(self.main_frame, text="Edit Student", width=30, command=self.edit_student).pack(pady=5)
         tk.Button(self.main_frame, text="Delete Student", width=30, command=self.delete_student).pack(pady=5)
+        tk.Button(self.main_frame, text="Sync Registrar Roster", width=30, command=self.sync_registrar).pack(pady=5)
         tk.Button(self.main_frame, text="Sort by Name", width=30, command=lambda: self.list_students(sort_by='name')).pack(pady=5)
         tk.Button(self.main_frame, text="Sort by Rocket ID", width=30, command=lambda: self.list_students(sort_by='rocket_id')).pack(pady=5)
         tk.Button(self.main_frame, text="List All Students", width=30, command=self.list_students).pack(pady=5)
@@ -117,12 +207,45 @@ class StudentGradingApp:
         name = simpledialog.askstring("Name", "Enter Student Name:")
         if name:
             try:
-                cursor.execute("INSERT INTO students VALUES (?, ?)", (rocket_id, name))
-                conn.commit()
+                cursor.execute("INSERT INTO students (rocket_id, name) VALUES (?, ?)", (rocket_id, name))
+                self.commit()
                 messagebox.showinfo("Success", "Student added.")
             except sqlite3.IntegrityError:
                 messagebox.showwarning("Exists", "Student already exists.")
 
+    def sync_registrar(self):
+        from tkinter import filedialog
+        import registrar
+        path = filedialog.askopenfilename(title="Registrar Roster", filetypes=[("CSV", "*.csv"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            plan = registrar.plan_sync(cursor, registrar.read_registrar(path))
+        except (ValueError, OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("Sync Failed", str(e))
+            return
+        counts = registrar.summary(plan)
+        if not any(counts[k] for k in ('add_students', 'rename_students', 'adopt_students', 'delete_students',
+                                       'enroll', 'adopt_enrollments', 'drop')):
+            messagebox.showinfo("Up to Date", f"{counts['rows']} rows checked; nothing changed.")
+            return
+        message = (f"{counts['add_students']} new students, {counts['rename_students']} name changes,\n"
+                   f"{counts['delete_students']} students removed (their grades are deleted too),\n"
+                   f"{counts['enroll']} enrollments added, {counts['drop']} dropped.")
+        if counts['unknown_classes']:
+            message += f"\nRows for unknown classes are skipped: {', '.join(counts['unknown_classes'])}"
+        if not messagebox.askyesno("Confirm Sync", message + "\n\nApply these changes?"):
+            return
+        try:
+            registrar.apply_plan(conn, plan)
+            if router:
+                for (rocket_id,) in plan['delete_students']:
+                    router.drop_student(rocket_id)
+        except sqlite3.Error as e:
+            messagebox.showerror("Sync Failed", str(e))
+            return
+        messagebox.showinfo("Synced", "Roster updated from the registrar file.")
+
     def edit_student(self):
         students = self.get_all_students()
         if not students:
@@ -134,7 +257,7 @@ class StudentGradingApp:
             new_name = simpledialog.askstring("Edit Name", "Enter New Name:")
             if new_name:
                 cursor.execute("UPDATE students SET name = ? WHERE rocket_id = ?", (new_name, selected_id))
-                conn.commit()
+                self.commit()
                 messagebox.showinfo("Updated", "Student updated.")
 
     def delete_student(self):
@@ -145,26 +268,28 @@ class StudentGradingApp:
         ids = [s[0] for s in students]
         selected_id = simpledialog.askstring("Delete Student", "Choose Rocket ID:\n" + "\n".join(ids))
         if selected_id:
-            confirm = messagebox.askyesno("Confirm", "Are you sure?")
+            confirm = messagebox.askyesno("Confirm", "Are you sure?\nThis also deletes the student's grades.")
             if confirm:
                 cursor.execute("DELETE FROM students WHERE rocket_id = ?", (selected_id,))
-                conn.commit()
+                self.commit()
+                if router:
+                    router.drop_student(selected_id)
                 messagebox.showinfo("Deleted", "Student deleted.")
 
     def list_students(self, sort_by=None):
         self.clear_frame()
         tk.Label(self.main_frame, text="📋 All Students", font=("Helvetica", 16)).pack(pady=10)
 
-        query = "SELECT rocket_id, name FROM students"
-        if sort_by == 'name':
-            query += " ORDER BY name ASC"
-        elif sort_by == 'rocket_id':
-            query += " ORDER BY rocket_id ASC"
+        labels = {}
+        for rocket_id, name in gradedb.list_students(cursor, sort_by):
+            labels[rocket_id] = tk.Label(self.main_frame, text=f"{rocket_id} - {name}")
+            labels[rocket_id].pack()
 
-        cursor.execute(query)
-        students = cursor.fetchall()
-        for rocket_id, name in students:
-            tk.Label(self.main_frame, text=f"{rocket_id} - {name}").pack()
+        def on_student(change):
+            row = change.row
+            self.patch_label(labels, change.key['rocket_id'], row and row['rocket_id'],
+                             row and f"{row['rocket_id']} - {row['name']}")
+        self.watch(['student'], on_student, lambda: self.list_students(sort_by))
 
     def get_all_students(self):
         cursor.execute("SELECT rocket_id, name FROM students")
@@ -177,6 +302,7 @@ class StudentGradingApp:
         tk.Button(self.main_frame, text="Add Class", width=30, command=self.add_class).pack(pady=5)
         tk.Button(self.main_frame, text="Edit Class", width=30, command=self.edit_class).pack(pady=5)
         tk.Button(self.main_frame, text="Delete Class", width=30, command=self.delete_class).pack(pady=5)
+        tk.Button(self.main_frame, text="Manage Roster", width=30, command=self.choose_roster_class).pack(pady=5)
         tk.Button(self.main_frame, text="Sort by Class ID", width=30, command=lambda: self.list_classes(sort_by='class_id')).pack(pady=5)
         tk.Button(self.main_frame, text="Sort by Class Name", width=30, command=lambda: self.list_classes(sort_by='class_name')).pack(pady=5)
         tk.Button(self.main_frame, text="List All Classes", width=30, command=self.list_classes).pack(pady=5)
@@ -187,7 +313,7 @@ class StudentGradingApp:
         if class_id and class_name:
             try:
                 cursor.execute("INSERT INTO classes VALUES (?, ?)", (class_id, class_name))
-                conn.commit()
+                self.commit()
                 messagebox.showinfo("Success", "Class added.")
             except sqlite3.IntegrityError:
                 messagebox.showwarning("Exists", "Class already exists.")
@@ -203,7 +329,7 @@ class StudentGradingApp:
             new_name = simpledialog.askstring("Edit Name", "Enter New Class Name:")
             if new_name:
                 cursor.execute("UPDATE classes SET class_name = ? WHERE class_id = ?", (new_name, selected_id))
-                conn.commit()
+                self.commit()
                 messagebox.showinfo("Updated", "Class updated.")
 
     def delete_class(self):
@@ -214,10 +340,12 @@ class StudentGradingApp:
         ids = [c[0] for c in classes]
         selected_id = simpledialog.askstring("Delete Class", "Choose Class ID:\n" + "\n".join(ids))
         if selected_id:
-            confirm = messagebox.askyesno("Confirm", "Are you sure?")
+            confirm = messagebox.askyesno("Confirm", "Are you sure?\nThis also deletes the class's assignments and grades.")
             if confirm:
+                if router:
+                    router.drop_class(selected_id)
                 cursor.execute("DELETE FROM classes WHERE class_id = ?", (selected_id,))
-                conn.commit()
+                self.commit()
                 messagebox.showinfo("Deleted", "Class deleted.")
 
     def list_classes(self, sort_by=None):
@@ -231,9 +359,72 @@ class StudentGradingApp:
             query += " ORDER BY class_name ASC"
 
         cursor.execute(query)
-        classes = cursor.fetchall()
-        for class_id, name in classes:
-            tk.Label(self.main_frame, text=f"{class_id} - {name}").pack()
+        labels = {}
+        for class_id, name in cursor.fetchall():
+            labels[class_id] = tk.Label(self.main_frame, text=f"{class_id} - {name}")
+            labels[class_id].pack()
+
+        def on_class(change):
+            row = change.row
+            self.patch_label(labels, change.key['class_id'], row and row['class_id'],
+                             row and f"{row['class_id']} - {row['class_name']}")
+        self.watch(['class'], on_class, lambda: self.list_classes(sort_by))
+
+    def choose_roster_class(self):
+        classes = self.get_all_classes()
+        if not classes:
+            messagebox.showinfo("None", "No classes found.")
+            return
+        ids = [c[0] for c in classes]
+        selected_id = simpledialog.askstring("Manage Roster", "Choose Class ID:\n" + "\n".join(ids))
+        if selected_id in ids:
+            self.go_to(lambda: self.roster_menu(selected_id))
+        elif selected_id:
+            messagebox.showerror("Invalid", "Invalid class selected.")
+
+    def roster_menu(self, class_id):
+        self.clear_frame()
+        students = gradedb.roster(cursor, class_id)
+        title = tk.Label(self.main_frame, text=f"👥 Roster for {class_id} ({len(students)})", font=("Helvetica", 16))
+        title.pack(pady=10)
+        tk.Button(self.main_frame, text="Enroll Students", width=30, command=lambda: self.change_roster(class_id, True)).pack(pady=5)
+        tk.Button(self.main_frame, text="Drop Students", width=30, command=lambda: self.change_roster(class_id, False)).pack(pady=5)
+        labels = {}
+        for rocket_id, name in students:
+            labels[rocket_id] = tk.Label(self.main_frame, text=f"{rocket_id} - {name}")
+            labels[rocket_id].pack()
+
+        def on_change(change):
+            rocket_id = change.key['rocket_id']
+            if change.kind == 'student':
+                if rocket_id in labels and change.row:
+                    labels[rocket_id].config(text=f"{rocket_id} - {change.row['name']}")
+                return
+            if change.key['class_id'] != class_id:
+                return
+            text = None
+            if change.op != 'delete':
+                cursor.execute("SELECT name FROM students WHERE rocket_id = ?", (rocket_id,))
+                text = f"{rocket_id} - {cursor.fetchone()[0]}"
+            self.patch_label(labels, rocket_id, rocket_id, text)
+            title.config(text=f"👥 Roster for {class_id} ({len(labels)})")
+        self.watch(['enrollment', 'student'], on_change, lambda: self.roster_menu(class_id))
+
+    def change_roster(self, class_id, enrolling):
+        # Several Rocket IDs at once, separated by spaces, commas or new lines
+        action = "Enroll" if enrolling else "Drop"
+        text = simpledialog.askstring(f"{action} Students", "Enter Rocket IDs (separated by spaces or commas):")
+        if not text:
+            return
+        rocket_ids = [rid for rid in re.split(r'[\s,;]+', text) if rid]
+        if enrolling:
+            changed = gradedb.enroll(cursor, class_id, rocket_ids)
+        else:
+            changed = gradedb.drop(cursor, class_id, rocket_ids)
+        self.commit()
+        skipped = len(rocket_ids) - changed
+        note = f"\n{skipped} skipped (unknown or already {'enrolled' if enrolling else 'dropped'})." if skipped else ""
+        messagebox.showinfo(action, f"{changed} students {'enrolled' if enrolling else 'dropped'}.{note}")
 
     def get_all_classes(self):
         cursor.execute("SELECT class_id, class_name FROM classes")
@@ -264,12 +455,21 @@ class StudentGradingApp:
         tk.Button(self.main_frame, text="Add Assignment", width=30, command=lambda: self.add_assignment(class_id)).pack(pady=5)
         tk.Button(self.main_frame, text="Edit Assignment", width=30, command=lambda: self.edit_assignment(class_id)).pack(pady=5)
         tk.Button(self.main_frame, text="Delete Assignment", width=30, command=lambda: self.delete_assignment(class_id)).pack(pady=5)
+        tk.Button(self.main_frame, text="Curve Scores", width=30, command=lambda: self.choose_curve_assignment(class_id)).pack(pady=5)
+        tk.Button(self.main_frame, text="Upcoming & Overdue", width=30, command=lambda: self.go_to(lambda: self.due_dates(class_id))).pack(pady=5)
+        tk.Button(self.main_frame, text="Missing Work", width=30, command=lambda: self.go_to(lambda: self.missing_work(class_id))).pack(pady=5)
+        tk.Button(self.main_frame, text="Gradebook Grid", width=30, command=lambda: self.go_to(lambda: self.gradebook_grid(class_id))).pack(pady=5)
         tk.Button(self.main_frame, text="Sort by Title", width=30, command=lambda: self.list_assignments(class_id, sort_by='title')).pack(pady=5)
         tk.Button(self.main_frame, text="List All Assignments", width=30, command=lambda: self.list_assignments(class_id)).pack(pady=5)
 
     def add_assignment(self, class_id):
         title = simpledialog.askstring("Title", "Enter Assignment Title:")
         due_date = simpledialog.askstring("Due Date", "Enter Due Date (YYYY-MM-DD):")
+        try:
+            due_date = gradedb.parse_due_date(due_date)
+        except ValueError as e:
+            messagebox.showerror("Invalid", str(e))
+            return
         try:
             max_score = int(simpledialog.askstring("Max Score", "Enter Maximum Score:"))
         except:
@@ -279,14 +479,16 @@ class StudentGradingApp:
         if type_ not in ["Homework", "Test"]:
             messagebox.showerror("Invalid", "Type must be Homework or Test.")
             return
-        cursor.execute("INSERT INTO assignments (title, due_date, max_score, type, class_id) VALUES (?, ?, ?, ?, ?)",
-                       (title, due_date, max_score, type_, class_id))
-        conn.commit()
+        self.class_cursor(class_id).execute(
+            "INSERT INTO assignments (title, due_date, max_score, type, class_id) VALUES (?, ?, ?, ?, ?)",
+            (title, due_date, max_score, type_, class_id))
+        self.commit(class_id)
         messagebox.showinfo("Success", "Assignment added.")
 
     def edit_assignment(self, class_id):
-        cursor.execute("SELECT id, title FROM assignments WHERE class_id = ?", (class_id,))
-        assignments = cursor.fetchall()
+        cur = self.class_cursor(class_id)
+        cur.execute("SELECT id, title FROM assignments WHERE class_id = ?", (class_id,))
+        assignments = cur.fetchall()
         if not assignments:
             messagebox.showinfo("None", "No assignments found.")
             return
@@ -298,8 +500,18 @@ class StudentGradingApp:
             except:
                 messagebox.showerror("Invalid", "Invalid assignment selected.")
                 return
+            current = gradedb.get_assignment(cur, assignment_id)
+            if not current:
+                messagebox.showerror("Invalid", "Invalid assignment selected.")
+                return
             new_title = simpledialog.askstring("New Title", "Enter New Title:")
-            new_due_date = simpledialog.askstring("New Due Date", "Enter New Due Date (YYYY-MM-DD):")
+            new_due_date = simpledialog.askstring("New Due Date", "Enter New Due Date (YYYY-MM-DD):",
+                                                  initialvalue=current[2])
+            try:
+                new_due_date = gradedb.parse_due_date(new_due_date)
+            except ValueError as e:
+                messagebox.showerror("Invalid", str(e))
+                return
             try:
                 new_max_score = int(simpledialog.askstring("New Max Score", "Enter New Max Score:"))
             except:
@@ -307,17 +519,19 @@ class StudentGradingApp:
                 return
             new_type = simpledialog.askstring("New Type", "Enter Type (Homework/Test):")
             if new_title and new_due_date and new_type:
-                cursor.execute('''
-                    UPDATE assignments
-                    SET title = ?, due_date = ?, max_score = ?, type = ?
-                    WHERE id = ?
-                ''', (new_title, new_due_date, new_max_score, new_type, assignment_id))
-                conn.commit()
+                try:
+                    gradedb.write_with_retry(self.class_conn(class_id), gradedb.update_assignment, cur, assignment_id, new_title,
+                                             new_due_date, new_max_score, new_type, current[-1])
+                except gradedb.ConflictError as e:
+                    messagebox.showerror("Conflict", f"{e}\nYour changes were not saved. Please try again.")
+                    return
+                self.poll_changes()
                 messagebox.showinfo("Updated", "Assignment updated.")
 
     def delete_assignment(self, class_id):
-        cursor.execute("SELECT id, title FROM assignments WHERE class_id = ?", (class_id,))
-        assignments = cursor.fetchall()
+        cur = self.class_cursor(class_id)
+        cur.execute("SELECT id, title FROM assignments WHERE class_id = ?", (class_id,))
+        assignments = cur.fetchall()
         if not assignments:
             messagebox.showinfo("None", "No assignments to delete.")
             return
@@ -329,12 +543,197 @@ class StudentGradingApp:
             except:
                 messagebox.showerror("Invalid", "Invalid assignment selected.")
                 return
-            confirm = messagebox.askyesno("Confirm", "Are you sure?")
+            confirm = messagebox.askyesno("Confirm", "Are you sure?\nThis also deletes the assignment's grades.")
             if confirm:
-                cursor.execute("DELETE FROM assignments WHERE id = ?", (assignment_id,))
-                conn.commit()
+                cur.execute("DELETE FROM assignments WHERE id = ?", (assignment_id,))
+                self.commit(class_id)
                 messagebox.showinfo("Deleted", "Assignment deleted.")
 
+    def due_dates(self, class_id):
+        import duedates
+        self.clear_frame()
+        tk.Label(self.main_frame, text=f"📅 Due Dates for {class_id}", font=("Helvetica", 16)).pack(pady=10)
+        tk.Label(self.main_frame, text=f"Due in the next {duedates.UPCOMING_DAYS} days", font=("Helvetica", 12)).pack(pady=5)
+        upcoming = duedates.upcoming(self.class_cursor(class_id), class_id=class_id)
+        for _, _, _, title, type_, due_date in upcoming:
+            tk.Label(self.main_frame, text=f"{due_date}  {title} ({type_})").pack()
+        if not upcoming:
+            tk.Label(self.main_frame, text="Nothing due.").pack()
+        tk.Label(self.main_frame, text="Overdue", font=("Helvetica", 12)).pack(pady=5)
+        overdue = duedates.overdue(self.class_cursor(class_id), class_id=class_id)
+        for _, _, _, title, type_, due_date, missing in overdue:
+            tk.Label(self.main_frame, text=f"{due_date}  {title} ({type_}) - {missing} missing").pack()
+        if not overdue:
+            tk.Label(self.main_frame, text="Nothing overdue.").pack()
+
+    def missing_work(self, class_id):
+        import duedates
+        self.clear_frame()
+        tk.Label(self.main_frame, text=f"⏰ Missing Work for {class_id}", font=("Helvetica", 16)).pack(pady=10)
+        rows = duedates.missing_work(self.class_cursor(class_id), class_id=class_id)
+        if not rows:
+            tk.Label(self.main_frame, text="No missing work.").pack()
+            return
+        tree = ttk.Treeview(self.main_frame, columns=("rid", "name", "title", "due"), show="headings", height=20)
+        for column, heading in zip(("rid", "name", "title", "due"), ("Rocket ID", "Name", "Assignment", "Due")):
+            tree.heading(column, text=heading)
+        for rocket_id, name, _, _, title, due_date in rows:
+            tree.insert('', 'end', iid=f"{rocket_id}\t{title}", values=(rocket_id, name, title, due_date))
+        tree.pack(fill='both', expand=True, padx=10)
+
+        def on_change(change):
+            if change.key.get('class_id') != class_id:
+                return
+            if change.kind == 'grade' and change.row and change.row['score'] is not None:
+                # Handed in: drop just that line
+                item = f"{change.key['rocket_id']}\t{change.key['title']}"
+                if tree.exists(item):
+                    tree.delete(item)
+            else:
+                self.request_rebuild()
+        self.watch(['grade', 'assignment', 'enrollment'], on_change, lambda: self.missing_work(class_id))
+
+    def gradebook_grid(self, class_id):
+        # Whole class in one table from the compact gradebook, ranked, with each column's mean
+        from gradebook import Gradebook
+        self.clear_frame()
+        tk.Label(self.main_frame, text=f"📊 Gradebook for {class_id}", font=("Helvetica", 16)).pack(pady=10)
+        book = Gradebook.load(self.class_cursor(class_id), class_id)
+        if not book.students:
+            tk.Label(self.main_frame, text="No students on the roster.").pack()
+            return
+        columns = ["rank", "rid", "name"] + [f"a{j}" for j in range(len(book.assignments))] + ["pct", "letter"]
+        tree = ttk.Treeview(self.main_frame, columns=columns, show="headings", height=20)
+        for column, heading in zip(columns, ["#", "Rocket ID", "Name"] + book.titles + ["%", "Grade"]):
+            tree.heading(column, text=heading)
+            tree.column(column, width=90 if column in ("rid", "name") else 60, stretch=False)
+        ranks = {rocket_id: rank for rank, rocket_id, _ in book.rankings()}
+        for row in sorted(book.grid(), key=lambda r: ranks.get(r[0], len(ranks) + 1)):
+            tree.insert('', 'end', iid=row[0], values=[ranks.get(row[0], '')] + row)
+        means = [book.assignment_stats(j).get('mean', '') for j in range(len(book.assignments))]
+        tree.insert('', 'end', iid="mean", values=["", "", "Class mean"] + means + ["", ""])
+        tree.pack(fill='both', expand=True, padx=10)
+
+        def on_change(change):
+            # A saved grade patches its cell, the student's total and the column mean;
+            # ranks are recomputed from the in-memory grid without querying
+            if change.kind == 'student':
+                if change.row and change.key['rocket_id'] in book.student_index:
+                    tree.set(change.key['rocket_id'], "name", change.row['name'])
+                return
+            if change.key.get('class_id') != class_id:
+                return
+            if change.kind != 'grade':
+                self.request_rebuild()
+                return
+            i = book.student_index.get(change.key['rocket_id'])
+            if i is None or change.key['title'] not in book.titles:
+                return
+            j = book.titles.index(change.key['title'])
+            book.set_score(i, j, change.row['score'] if change.row else None)
+            for column, value in zip(columns[1:], book.grid_row(i)):
+                tree.set(book.students[i], column, value)
+            tree.set("mean", f"a{j}", book.assignment_stats(j).get('mean', ''))
+            ranks = {rocket_id: rank for rank, rocket_id, _ in book.rankings()}
+            for rocket_id in book.students:
+                tree.set(rocket_id, "rank", ranks.get(rocket_id, ''))
+        self.watch(['grade', 'assignment', 'enrollment', 'student'], on_change, lambda: self.gradebook_grid(class_id))
+
+    def choose_curve_assignment(self, class_id):
+        cur = self.class_cursor(class_id)
+        cur.execute("SELECT id, title FROM assignments WHERE class_id = ?", (class_id,))
+        assignments = cur.fetchall()
+        if not assignments:
+            messagebox.showinfo("None", "No assignments found.")
+            return
+        choices = [f"{aid}: {title}" for aid, title in assignments]
+        selected_id = simpledialog.askstring("Curve Scores", "Choose ID:\n" + "\n".join(choices))
+        if selected_id:
+            try:
+                assignment_id = int(selected_id.split(":")[0])
+            except ValueError:
+                messagebox.showerror("Invalid", "Invalid assignment selected.")
+                return
+            self.go_to(lambda: self.curve_menu(assignment_id, class_id))
+
+    def curve_menu(self, assignment_id, class_id):
+        import curves
+        cur = self.class_cursor(class_id)
+        self.clear_frame()
+        tk.Label(self.main_frame, text=f"📈 Curve Assignment {assignment_id}", font=("Helvetica", 16)).pack(pady=10)
+        tk.Label(self.main_frame, text="flat: points=5   mean: target=80   sqrt   range: low=55 high=98").pack()
+
+        form = tk.Frame(self.main_frame)
+        form.pack(pady=5)
+        method = ttk.Combobox(form, values=curves.METHODS, state="readonly", width=10)
+        method.current(0)
+        method.pack(side='left', padx=5)
+        params = tk.Entry(form, width=30)
+        params.pack(side='left', padx=5)
+        output = tk.Text(self.main_frame, height=16, width=80)
+
+        def read_form():
+            try:
+                return method.get(), curves.parse_params(params.get().split())
+            except ValueError as e:
+                messagebox.showerror("Invalid", str(e))
+                return None
+
+        def show_preview():
+            form_values = read_form()
+            if not form_values:
+                return
+            try:
+                result = curves.preview(cur, assignment_id, form_values[0], **form_values[1])
+            except ValueError as e:
+                messagebox.showerror("Invalid", str(e))
+                return
+            before, after = result['before'], result['after']
+            lines = [f"{len(result['changes'])} of {before['count']} scores change"]
+            if before['count']:
+                for name in ('mean', 'median', 'stdev', 'min', 'max'):
+                    lines.append(f"{name:>7}: {before[name]:g} -> {after[name]:g}")
+            lines.append("Letter changes:")
+            lines += [f"  {shift}: {n}" for shift, n in result['letter_shifts'].items()] or ["  none"]
+            output.delete('1.0', 'end')
+            output.insert('end', "\n".join(lines))
+
+        def apply():
+            form_values = read_form()
+            if not form_values or not messagebox.askyesno("Confirm", "Apply this curve to every score?"):
+                return
+            try:
+                curve_id, updated = curves.apply_curve(self.class_conn(class_id), assignment_id, form_values[0], **form_values[1])
+            except (ValueError, sqlite3.Error) as e:
+                messagebox.showerror("Curve Failed", str(e))
+                return
+            messagebox.showinfo("Curved", f"Curve {curve_id} changed {updated} scores.")
+            self.curve_menu(assignment_id, class_id)
+
+        tk.Button(form, text="Preview", command=show_preview).pack(side='left', padx=5)
+        tk.Button(form, text="Apply", command=apply).pack(side='left', padx=5)
+        output.pack(pady=5)
+
+        for curve_id, name, _, applied_at, reverted_at, count in curves.list_curves(cur, assignment_id):
+            row = tk.Frame(self.main_frame)
+            row.pack(pady=2)
+            status = f"reverted {reverted_at}" if reverted_at else f"{count} scores"
+            tk.Label(row, text=f"#{curve_id} {name} applied {applied_at} ({status})", width=60, anchor='w').pack(side='left')
+            if not reverted_at:
+                tk.Button(row, text="Revert", command=lambda c=curve_id: self.revert_curve(assignment_id, class_id, c)).pack(side='left', padx=5)
+
+    def revert_curve(self, assignment_id, class_id, curve_id):
+        import curves
+        if not messagebox.askyesno("Confirm", f"Revert curve #{curve_id}?\nScores edited since then are kept."):
+            return
+        try:
+            restored, skipped = curves.revert_curve(self.class_conn(class_id), curve_id)
+        except (ValueError, sqlite3.Error) as e:
+            messagebox.showerror("Revert Failed", str(e))
+            return
+        messagebox.showinfo("Reverted", f"{restored} scores restored, {skipped} left as edited.")
+        self.curve_menu(assignment_id, class_id)
+
     def list_assignments(self, class_id, sort_by=None):
         self.clear_frame()
         tk.Label(self.main_frame, text=f"📋 Assignments for {class_id}", font=("Helvetica", 16)).pack(pady=10)
@@ -343,9 +742,27 @@ class StudentGradingApp:
         if sort_by == 'title':
             query += " ORDER BY title ASC"
 
-        cursor.execute(query, (class_id,))
-        for aid, title in cursor.fetchall():
-            tk.Label(self.main_frame, text=f"{aid} - {title}").pack()
+        cur = self.class_cursor(class_id)
+        cur.execute(query, (class_id,))
+        labels = {}
+        ids = {}
+        for aid, title in cur.fetchall():
+            ids[title] = aid
+            labels[title] = tk.Label(self.main_frame, text=f"{aid} - {title}")
+            labels[title].pack()
+
+        def on_assignment(change):
+            # Keyed by (class_id, title) as logged; an edit may rename it or move it to another class
+            old_title = change.key['title'] if change.key['class_id'] == class_id else None
+            row = change.row if change.row and change.row['class_id'] == class_id else None
+            if old_title is None and row is None:
+                return
+            aid = ids.pop(old_title, None)
+            if row:
+                aid = aid or gradedb.find_assignment_id(cur, row['title'], class_id)
+                ids[row['title']] = aid
+            self.patch_label(labels, old_title, row and row['title'], row and f"{aid} - {row['title']}")
+        self.watch(['assignment'], on_assignment, lambda: self.list_assignments(class_id, sort_by))
     # === Grade Management ===
     def grade_menu(self):
         self.clear_frame()
@@ -361,6 +778,9 @@ class StudentGradingApp:
         self.grade_class_dropdown.pack(pady=5)
         tk.Button(self.main_frame, text="Select Class", command=self.grade_class_interface).pack(pady=5)
         tk.Button(self.main_frame, text="View Student Report", width=30, command=self.view_student_report).pack(pady=5)
+        tk.Button(self.main_frame, text="Export All Transcripts", width=30, command=self.export_transcripts).pack(pady=5)
+        tk.Button(self.main_frame, text="Publish Report Cards", width=30, command=self.publish_report_cards).pack(pady=5)
+        tk.Button(self.main_frame, text="What-If Calculator", width=30, command=lambda: self.go_to(self.what_if_menu)).pack(pady=5)
 
     def grade_class_interface(self):
         class_id = self.grade_class_dropdown.get()
@@ -372,27 +792,45 @@ class StudentGradingApp:
         self.current_class_id = class_id
         tk.Label(self.main_frame, text=f"Grading for {class_id}", font=("Helvetica", 16)).pack(pady=10)
 
-        cursor.execute("SELECT rocket_id FROM students")
-        students = [row[0] for row in cursor.fetchall()]
+        students = [rocket_id for rocket_id, _ in gradedb.roster(cursor, class_id)]
         if not students:
-            messagebox.showinfo("No Students", "No students available.")
+            messagebox.showinfo("No Students", "No students are enrolled in this class.\n"
+                                               "Add them under Class Management > Manage Roster.")
             return
         self.student_dropdown = ttk.Combobox(self.main_frame, values=students, state="readonly")
         self.student_dropdown.pack(pady=5)
+        self.student_dropdown.bind("<<ComboboxSelected>>", self.load_current_grade)
 
-        cursor.execute("SELECT title FROM assignments WHERE class_id = ?", (class_id,))
-        assignments = [row[0] for row in cursor.fetchall()]
+        cur = self.class_cursor(class_id)
+        cur.execute("SELECT title FROM assignments WHERE class_id = ?", (class_id,))
+        assignments = [row[0] for row in cur.fetchall()]
         if not assignments:
             messagebox.showinfo("No Assignments", "No assignments for this class.")
             return
         self.assignment_dropdown = ttk.Combobox(self.main_frame, values=assignments, state="readonly")
         self.assignment_dropdown.pack(pady=5)
+        self.assignment_dropdown.bind("<<ComboboxSelected>>", self.load_current_grade)
 
+        self.loaded_grade = None
         self.score_entry = tk.Entry(self.main_frame)
         self.score_entry.pack(pady=5)
 
         tk.Button(self.main_frame, text="Submit/Update Grade", command=self.submit_or_update_grade).pack(pady=5)
 
+    def load_current_grade(self, event=None):
+        # Remember which version of the grade was on screen so a concurrent edit
+        # by another instance is detected on save instead of silently overwritten
+        rocket_id = self.student_dropdown.get()
+        cur = self.class_cursor(self.current_class_id)
+        assignment_id = gradedb.find_assignment_id(cur, self.assignment_dropdown.get(), self.current_class_id)
+        if not rocket_id or assignment_id is None:
+            return
+        current = gradedb.get_grade(cur, rocket_id, assignment_id)
+        self.loaded_grade = (rocket_id, assignment_id, current[1] if current else 0)
+        self.score_entry.delete(0, tk.END)
+        if current:
+            self.score_entry.insert(0, str(current[0]))
+
     def submit_or_update_grade(self):
         rocket_id = self.student_dropdown.get()
         assignment_title = self.assignment_dropdown.get()
@@ -402,25 +840,79 @@ class StudentGradingApp:
             messagebox.showerror("Invalid", "Score must be a number.")
             return
 
-        cursor.execute("SELECT id FROM assignments WHERE title = ?", (assignment_title,))
-        result = cursor.fetchone()
-        if not result:
+        cur = self.class_cursor(self.current_class_id)
+        assignment_id = gradedb.find_assignment_id(cur, assignment_title, self.current_class_id)
+        if assignment_id is None:
             messagebox.showerror("Error", "Assignment not found.")
             return
-        assignment_id = result[0]
 
-        cursor.execute("SELECT * FROM grades WHERE rocket_id = ? AND assignment_id = ?", (rocket_id, assignment_id))
-        existing = cursor.fetchone()
-
-        if existing:
-            cursor.execute("UPDATE grades SET score = ?, class_id = ? WHERE rocket_id = ? AND assignment_id = ?",
-                           (score, self.current_class_id, rocket_id, assignment_id))
-        else:
-            cursor.execute("INSERT INTO grades (rocket_id, assignment_id, score, class_id) VALUES (?, ?, ?, ?)",
-                           (rocket_id, assignment_id, score, self.current_class_id))
-        conn.commit()
+        expected_version = None
+        if self.loaded_grade and self.loaded_grade[:2] == (rocket_id, assignment_id):
+            expected_version = self.loaded_grade[2]
+        try:
+            gradedb.write_with_retry(self.class_conn(self.current_class_id), gradedb.save_grade, cur, rocket_id, assignment_id, score,
+                                     self.current_class_id, expected_version)
+        except gradedb.ConflictError as e:
+            theirs = f"Their score: {e.current[0]}" if e.current else "Their change removed the grade."
+            messagebox.showerror("Conflict", f"{e}\n{theirs}\nYour score ({score}) was not saved.")
+            self.load_current_grade()
+            return
+        self.poll_changes()
+        self.load_current_grade()
         messagebox.showinfo("Success", "Grade submitted or updated.")
 
+    def what_if_menu(self):
+        import whatif
+        self.clear_frame()
+        tk.Label(self.main_frame, text="🎯 What-If Calculator", font=("Helvetica", 16)).pack(pady=10)
+
+        cursor.execute("SELECT class_id FROM classes")
+        form = tk.Frame(self.main_frame)
+        form.pack(pady=5)
+        tk.Label(form, text="Class").pack(side='left')
+        class_dropdown = ttk.Combobox(form, values=[row[0] for row in cursor.fetchall()], state="readonly", width=12)
+        class_dropdown.pack(side='left', padx=5)
+        tk.Label(form, text="Rocket ID").pack(side='left')
+        student_entry = tk.Entry(form, width=12)
+        student_entry.pack(side='left', padx=5)
+        tk.Label(form, text="Target").pack(side='left')
+        letter_dropdown = ttk.Combobox(form, values=[l for _, l, _ in gradedb.GRADE_SCALE], state="readonly", width=4)
+        letter_dropdown.current(3)
+        letter_dropdown.pack(side='left', padx=5)
+        output = tk.Text(self.main_frame, height=20, width=90)
+
+        def show(lines):
+            output.delete('1.0', 'end')
+            output.insert('end', "\n".join(lines))
+
+        def student_needs():
+            class_id, rocket_id = class_dropdown.get(), student_entry.get().strip()
+            if not class_id or not rocket_id:
+                messagebox.showwarning("Missing", "Select a class and enter a Rocket ID.")
+                return
+            r = whatif.required_scores(self.class_cursor(class_id), rocket_id, class_id, letter_dropdown.get())
+            lines = [f"Now {r['current']}% ({r['current_letter']}); target {r['target']}: {r['status']}"]
+            if r['status'] == 'possible':
+                lines.append(f"Needs {r['points_needed']} of {r['remaining_points']} remaining points "
+                             f"({r['required_percentage']}% on each assignment)")
+                lines += [f"  {a['title']}: {a['min_score']}/{a['max_score']}" for a in r['assignments']]
+            show(lines)
+
+        def class_needs():
+            if not class_dropdown.get():
+                messagebox.showwarning("Missing", "Select a class first.")
+                return
+            lines = []
+            class_id = class_dropdown.get()
+            for r in whatif.required_for_class(self.class_cursor(class_id), class_id, letter_dropdown.get()):
+                pct = f"{r['required_percentage']}%" if r['required_percentage'] is not None else "-"
+                lines.append(f"{r['rocket_id']:<12} now {r['current']}% ({r['current_letter']})  {r['status']}  needs {pct}")
+            show(lines or ["No grades in this class yet."])
+
+        tk.Button(form, text="Student", command=student_needs).pack(side='left', padx=5)
+        tk.Button(form, text="Whole Class", command=class_needs).pack(side='left', padx=5)
+        output.pack(pady=5)
+
     def view_student_report(self):
         cursor.execute("SELECT rocket_id FROM students")
         students = [row[0] for row in cursor.fetchall()]
@@ -431,32 +923,93 @@ class StudentGradingApp:
         student_id = simpledialog.askstring("Select Student", f"Enter Rocket ID:\n{', '.join(students)}")
         if not student_id:
             return
+        self.show_student_report(student_id)
 
+    def show_student_report(self, student_id, term=None):
+        import reports
         self.clear_frame()
-        tk.Label(self.main_frame, text=f"📖 Report for {student_id}", font=("Helvetica", 16)).pack(pady=10)
-
-        cursor.execute('''
-            SELECT c.class_name, a.title, a.max_score, g.score
-            FROM grades g
-            JOIN assignments a ON g.assignment_id = a.id
-            JOIN classes c ON g.class_id = c.class_id
-            WHERE g.rocket_id = ?
-            ORDER BY c.class_name
-        ''', (student_id,))
-        results = cursor.fetchall()
-
-        if not results:
+        heading = f"📖 Report for {student_id}" + (f" ({term})" if term else "")
+        tk.Label(self.main_frame, text=heading, font=("Helvetica", 16)).pack(pady=10)
+
+        if term:
+            import terms
+            with terms.attached_term(conn, term) as schema:
+                summary = reports.class_summary(cursor, student_id, schema)
+
+            def load_section(class_id):
+                with terms.attached_term(conn, term) as schema:
+                    return reports.class_section(cursor, student_id, class_id, schema)
+        elif router:
+            # Shard writes don't bump the directory's report versions, so no cache
+            summary = router.class_summary(student_id)
+            load_section = lambda class_id: router.class_section(student_id, class_id)
+        else:
+            if self.report_cache is None:
+                self.report_cache = reports.ReportCache()
+            summary = self.report_cache.summary(cursor, student_id)
+            load_section = lambda class_id: self.report_cache.section(cursor, student_id, class_id)
+
+        if not summary:
             tk.Label(self.main_frame, text="No grades found for this student.").pack()
             return
 
-        last_class = None
-        for class_name, title, max_score, score in results:
-            if class_name != last_class:
-                tk.Label(self.main_frame, text=f"\n📚 Class: {class_name}", font=("Helvetica", 14, "bold")).pack()
-                last_class = class_name
-            percentage = (score / max_score) * 100 if max_score else 0
-            letter, _ = calculate_letter_grade(percentage)
-            tk.Label(self.main_frame, text=f" - {title}: {score}/{max_score} ({percentage:.2f}%) ➔ {letter}").pack()
+        sections = {}
+        for line in summary:
+            sections[line[0]] = self.report_section(line[0], self.report_heading(line), load_section)
+        if term or router:
+            return
+
+        def on_change(change):
+            # Only the affected class's heading and, if open, its detail are redone
+            if change.kind == 'grade' and change.key['rocket_id'] != student_id:
+                return
+            class_id = (change.row or {}).get('grade_class_id', change.key.get('class_id'))
+            lines = {line[0]: line for line in self.report_cache.summary(cursor, student_id)}
+            if class_id in sections and class_id in lines:
+                sections[class_id](self.report_heading(lines[class_id]))
+            elif change.kind == 'grade' or class_id in sections:
+                self.request_rebuild()
+        self.watch(['grade', 'assignment', 'class'], on_change, lambda: self.show_student_report(student_id))
+
+    def report_heading(self, line):
+        _, class_name, graded, _, _, percentage, letter = line
+        grade = f"{percentage:.2f}% ➔ {letter}" if percentage is not None else "no scores yet"
+        return f"📚 {class_name}: {grade} ({graded} graded)"
+
+    def report_section(self, class_id, heading, load_section):
+        # Collapsed until clicked; the detail is fetched and built on first expand
+        container = tk.Frame(self.main_frame)
+        container.pack(fill='x', pady=2)
+        detail = tk.Frame(container)
+        state = {'loaded': False, 'open': False, 'heading': heading}
+
+        def fill():
+            for title, score, max_score, percentage, letter in load_section(class_id):
+                tk.Label(detail, text=f" - {title}: {score}/{max_score} ({percentage:.2f}%) ➔ {letter}").pack()
+            state['loaded'] = True
+
+        def toggle():
+            if not state['loaded']:
+                fill()
+            state['open'] = not state['open']
+            if state['open']:
+                detail.pack()
+            else:
+                detail.pack_forget()
+            button.config(text=("▼ " if state['open'] else "▶ ") + state['heading'])
+
+        def update(new_heading):
+            # New totals for the heading; loaded detail is fetched again
+            state['heading'] = new_heading
+            if state['loaded']:
+                for widget in detail.winfo_children():
+                    widget.destroy()
+                fill()
+            button.config(text=("▼ " if state['open'] else "▶ ") + new_heading)
+
+        button = tk.Button(container, text="▶ " + heading, font=("Helvetica", 14, "bold"), relief="flat", command=toggle)
+        button.pack()
+        return update
 
     # === Export Management ===
     def export_csv_dropdown(self):
@@ -467,42 +1020,313 @@ class StudentGradingApp:
             self.export_csv(class_id)
 
     def export_csv(self, class_id):
+        from tkinter import filedialog
+        import exports
         file_path = filedialog.asksaveasfilename(defaultextension=".csv")
         if file_path:
-            cursor.execute('''
-                SELECT s.rocket_id, s.name, a.title, g.score
-                FROM grades g
-                JOIN students s ON s.rocket_id = g.rocket_id
-                JOIN assignments a ON a.id = g.assignment_id
-                WHERE g.class_id = ?
-            ''', (class_id,))
             with open(file_path, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Rocket ID", "Name", "Assignment", "Score"])
-                for row in cursor.fetchall():
-                    writer.writerow(row)
+                exports.write_class_csv(self.class_cursor(class_id), class_id, f)
             messagebox.showinfo("Exported", "Class grades exported.")
 
-    def export_all_data(self):
+    def export_transcripts(self):
+        from tkinter import filedialog
+        import transcripts
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".txt", title="Export All Transcripts",
+            filetypes=[("Text", "*.txt"), ("CSV", "*.csv"), ("JSON Lines", "*.jsonl")])
+        if file_path:
+            count = transcripts.write_transcripts(cursor, file_path)
+            messagebox.showinfo("Exported", f"{count} transcripts exported.")
+
+    def publish_report_cards(self):
+        # Rendering runs on a process pool from a worker thread; poll for it so the UI stays responsive
+        import reportcards
+        period = simpledialog.askstring("Publish Report Cards", "Grading period shown on the cards (e.g. Q1 2024):")
+        if period is None:
+            return
+        result = {}
+
+        def run():
+            try:
+                result['stats'] = reportcards.generate_site(DB_PATH, reportcards.SITE_DIR, period)
+            except Exception as e:
+                # Anything, e.g. a broken process pool: finish_report_cards must always get an outcome
+                result['error'] = e
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        self.root.after(200, lambda: self.finish_report_cards(worker, result))
+
+    def finish_report_cards(self, worker, result):
+        import reportcards
+        if worker.is_alive():
+            self.root.after(200, lambda: self.finish_report_cards(worker, result))
+            return
+        if 'error' in result:
+            messagebox.showerror("Publish Failed", str(result['error']))
+            return
+        stats = result['stats']
+        messagebox.showinfo("Published", f"{stats['rendered']} report cards updated, {stats['skipped']} unchanged.\n"
+                                         f"Saved in {os.path.abspath(reportcards.SITE_DIR)}")
+
+    def export_all_data(self, term=None):
+        from tkinter import filedialog
+        import exports
         file_path = filedialog.asksaveasfilename(defaultextension=".csv", title="Export All Data as CSV")
         if file_path:
             with open(file_path, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Rocket ID", "Student Name", "Class ID", "Class Name", "Assignment ID", "Assignment Title", "Type", "Due Date", "Max Score", "Score"])
-                cursor.execute('''
-                    SELECT s.rocket_id, s.name, c.class_id, c.class_name,
-                           a.id, a.title, a.type, a.due_date, a.max_score, g.score
-                    FROM students s
-                    LEFT JOIN grades g ON s.rocket_id = g.rocket_id
-                    LEFT JOIN assignments a ON g.assignment_id = a.id
-                    LEFT JOIN classes c ON g.class_id = c.class_id
-                ''')
-                for row in cursor.fetchall():
-                    writer.writerow(row)
+                if term:
+                    import terms
+                    with terms.attached_term(conn, term) as schema:
+                        exports.write_all_csv(cursor, f, schema)
+                elif router:
+                    router.write_all_csv(f)
+                else:
+                    exports.write_all_csv(cursor, f)
             messagebox.showinfo("Exported", "All data exported.")
 
+    # === Term Management ===
+    def term_menu(self):
+        import terms
+        self.clear_frame()
+        tk.Label(self.main_frame, text="🗓 Terms", font=("Helvetica", 16)).pack(pady=10)
+        tk.Button(self.main_frame, text="Close Current Term", width=30, command=self.close_term).pack(pady=5)
+
+        closed = terms.list_terms(cursor)
+        if not closed:
+            tk.Label(self.main_frame, text="No closed terms yet.").pack()
+            return
+        for term, path, closed_at in closed:
+            row = tk.Frame(self.main_frame)
+            row.pack(pady=2)
+            tk.Label(row, text=f"{term} (closed {closed_at})", width=40, anchor='w').pack(side='left')
+            tk.Button(row, text="Student Report", command=lambda t=term: self.view_term_report(t)).pack(side='left', padx=5)
+            tk.Button(row, text="Export", command=lambda t=term: self.export_all_data(term=t)).pack(side='left', padx=5)
+
+    def close_term(self):
+        import terms
+        term = simpledialog.askstring("Close Term", "Enter Term Name (e.g. Fall 2024):")
+        if not term:
+            return
+        confirm = messagebox.askyesno("Confirm", f"Archive all classes, assignments and grades as {term}?\n"
+                                                 "They will be read-only afterwards.")
+        if confirm:
+            try:
+                terms.close_term(conn, term)
+            except (ValueError, sqlite3.Error, OSError) as e:
+                messagebox.showerror("Close Term Failed", str(e))
+                return
+            messagebox.showinfo("Closed", f"{term} archived.")
+            self.term_menu()
+
+    def view_term_report(self, term):
+        student_id = simpledialog.askstring("Select Student", f"Enter Rocket ID for {term}:")
+        if student_id:
+            self.show_student_report(student_id, term)
+
+    # === Background Maintenance ===
+    def start_maintenance(self):
+        import maintenance
+        self.orphan_sweeper = maintenance.OrphanSweeper(conn)
+        self.idle_maintenance = maintenance.IdleMaintenance(conn)
+        self.root.after(SWEEP_STEP_MS, self.sweep_orphans)
+        self.root.after(IDLE_CHECK_MS, self.run_idle_maintenance)
+
+    def note_activity(self, event=None):
+        self.last_activity = time.time()
+
+    def sweep_orphans(self):
+        # One small batch per tick keeps the UI responsive; after a full pass, wait a while
+        try:
+            _, finished = self.orphan_sweeper.step()
+        except sqlite3.OperationalError:
+            conn.rollback()
+            finished = False
+        self.root.after(SWEEP_PAUSE_MS if finished else SWEEP_STEP_MS, self.sweep_orphans)
+
+    def run_idle_maintenance(self):
+        if time.time() - self.last_activity >= IDLE_AFTER_SECONDS:
+            try:
+                self.idle_maintenance.step()
+            except sqlite3.OperationalError:
+                conn.rollback()
+        self.root.after(IDLE_CHECK_MS, self.run_idle_maintenance)
+
+    def maintenance_menu(self):
+        import maintenance
+        self.clear_frame()
+        tk.Label(self.main_frame, text="🧹 Storage Maintenance", font=("Helvetica", 16)).pack(pady=10)
+        stats = maintenance.storage_stats(conn)
+        size_mb = stats['page_count'] * stats['page_size'] / 1e6
+        tk.Label(self.main_frame, text=f"Database size: {size_mb:.1f} MB ({stats['page_count']} pages)").pack()
+        tk.Label(self.main_frame, text=f"Free pages: {stats['freelist_count']} ({stats['free_ratio']:.1%})").pack()
+        tk.Label(self.main_frame, text=f"Auto-vacuum: {stats['auto_vacuum']}").pack()
+        if stats['auto_vacuum'] != 'incremental':
+            tk.Label(self.main_frame, text="Run 'python maintenance.py --convert' while the app is closed "
+                                           "to let the file shrink.").pack()
+        button = tk.Button(self.main_frame, text="Run Maintenance Now", width=30,
+                           command=lambda: self.run_maintenance_now(button))
+        button.pack(pady=5)
+
+    def run_maintenance_now(self, button=None):
+        # A full pass can take minutes on a big file, so it runs on a worker
+        # thread with its own connection and the UI polls for it
+        import maintenance
+        if button:
+            button.config(state='disabled', text="Running Maintenance…")
+        result = {}
+
+        def run():
+            try:
+                worker_conn = gradedb.connect(DB_PATH)
+                try:
+                    result['stats'] = maintenance.run_all(worker_conn)
+                finally:
+                    worker_conn.close()
+            except Exception as e:
+                result['error'] = e
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        self.root.after(200, lambda: self.finish_maintenance(worker, result, button))
+
+    def finish_maintenance(self, worker, result, button=None):
+        if worker.is_alive():
+            self.root.after(200, lambda: self.finish_maintenance(worker, result, button))
+            return
+        if 'error' in result:
+            messagebox.showerror("Maintenance Failed", str(result['error']))
+            if button and button.winfo_exists():
+                button.config(state='normal', text="Run Maintenance Now")
+            return
+        result = result['stats']
+        freed_mb = result['pages_freed'] * result['before']['page_size'] / 1e6
+        messagebox.showinfo("Maintenance", f"Removed {result['orphans_removed']} orphaned rows, "
+                                           f"freed {freed_mb:.1f} MB and refreshed statistics.")
+        self.maintenance_menu()
+
+    # === Sync ===
+    def sync_menu(self):
+        import changesets
+        self.clear_frame()
+        tk.Label(self.main_frame, text="🔄 Sync", font=("Helvetica", 16)).pack(pady=10)
+        origin = changesets.sync_value(cursor, 'origin')
+        clock = changesets.sync_value(cursor, 'clock')
+        tk.Label(self.main_frame, text=f"This copy: {origin}  ·  Clock: {clock}").pack(pady=5)
+        tk.Button(self.main_frame, text="Export Changes", width=30, command=self.export_changes).pack(pady=5)
+        tk.Button(self.main_frame, text="Import Changes", width=30, command=self.import_changes).pack(pady=5)
+
+    def export_changes(self):
+        from tkinter import filedialog
+        import changesets
+        since = simpledialog.askinteger("Export Changes", "Export changes after clock (0 for all):", initialvalue=0)
+        if since is None:
+            return
+        file_path = filedialog.asksaveasfilename(defaultextension=".jsonl.gz", title="Export Changes")
+        if file_path:
+            count, last_clock = changesets.export_changes(conn, file_path, since)
+            messagebox.showinfo("Exported", f"{count} changes exported (up to clock {last_clock}).")
+
+    def import_changes(self):
+        from tkinter import filedialog
+        import changesets
+        file_path = filedialog.askopenfilename(title="Import Changes")
+        if file_path:
+            try:
+                header, changes = changesets.read_changes(file_path)
+                applied, skipped = changesets.replay_changes(conn, changes)
+            except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+                messagebox.showerror("Import Failed", str(e))
+                return
+            messagebox.showinfo("Imported", f"{applied} changes applied, {skipped} already present or superseded.")
+            self.sync_menu()
+
+    # === Backup Management ===
+    def backup_menu(self):
+        self.clear_frame()
+        tk.Label(self.main_frame, text="💾 Backups", font=("Helvetica", 16)).pack(pady=10)
+        tk.Button(self.main_frame, text="Back Up Now", width=30, command=self.backup_now).pack(pady=5)
+
+        snapshots = self.backup_scheduler.snapshots()
+        if not snapshots:
+            tk.Label(self.main_frame, text="No backups yet.").pack()
+            return
+        for path in snapshots:
+            row = tk.Frame(self.main_frame)
+            row.pack(pady=2)
+            tk.Label(row, text=os.path.basename(path), width=45, anchor='w').pack(side='left')
+            tk.Button(row, text="Restore", command=lambda p=path: self.restore_backup(p)).pack(side='left', padx=5)
+
+    def backup_now(self):
+        # Run the snapshot off the Tk thread and poll for it so the UI stays responsive
+        result = {}
+
+        def run():
+            previous_error = self.backup_scheduler.last_error
+            result['path'] = self.backup_scheduler.backup_now()
+            # None with no new error means a snapshot was already being written
+            result['error'] = self.backup_scheduler.last_error
+            result['skipped'] = result['path'] is None and result['error'] is previous_error
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        self.root.after(200, lambda: self.finish_backup(worker, result))
+
+    def finish_backup(self, worker, result):
+        if worker.is_alive():
+            self.root.after(200, lambda: self.finish_backup(worker, result))
+            return
+        if result['skipped']:
+            messagebox.showinfo("Backup Running", "Backup already in progress.")
+            return
+        if result['path'] is None:
+            messagebox.showerror("Backup Failed", str(result['error']))
+            return
+        messagebox.showinfo("Backed Up", "Backup saved.")
+        self.backup_menu()
+
+    def restore_backup(self, path):
+        confirm = messagebox.askyesno("Confirm", f"Restore {os.path.basename(path)}?\nCurrent data will be replaced.")
+        if confirm:
+            try:
+                backups.restore_snapshot(path, conn)
+            except (ValueError, sqlite3.DatabaseError) as e:
+                messagebox.showerror("Restore Failed", str(e))
+                return
+            if self.report_cache:
+                self.report_cache.clear()
+            if self.changes:
+                self.changes.skip()
+            if router:
+                router.refresh()
+            messagebox.showinfo("Restored", "Backup restored.")
+
 # === Launch the App ===
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Student Grading App")
+    parser.add_argument('--trace', action='store_true', help="show the per-screen timing panel")
+    parser.add_argument('--trace-log', metavar='PATH', help="append per-screen timings to PATH as JSON lines")
+    parser.add_argument('--exit-after-start', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    tracer = None
+    if args.trace or args.trace_log:
+        import tracing
+        tracer = tracing.Tracer(log_path=args.trace_log)
+
     root = tk.Tk()
-    app = StudentGradingApp(root)
+    app = StudentGradingApp(root, tracer=tracer, show_trace_panel=args.trace)
+
+    def start():
+        open_database(DB_PATH, tracer)
+        app.backup_scheduler.start()
+        app.start_maintenance()
+        app.start_change_polling()
+        if args.exit_after_start:
+            # Used by the startup benchmark: quit once the window is up and the database is open
+            root.destroy()
+
+    # Let the first frame paint before touching the database
+    root.after_idle(start)
     root.mainloop()
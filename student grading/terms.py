@@ -0,0 +1,151 @@
+import contextlib
+import os
+import re
+import sqlite3
+import stat
+from datetime import datetime
+from urllib.parse import quote
+
+import changesets
+import gradedb
+
+# --- Term Archive Settings ---
+TERMS_DIR = 'terms'
+ARCHIVE_MMAP_SIZE = 256 * 1024 * 1024
+# Tables copied into a closed term's file. Students are copied too so each
+# archive is self-contained, but they stay in the primary file for next term.
+TERM_TABLES = ['classes', 'enrollments', 'assignments', 'grades']
+# A class moved into a shard keeps its rows there (see shards.py), where
+# closing a term would neither archive nor clear them
+SHARDED = "This database has sharded classes; terms can't be closed"
+
+
+def term_schema(term):
+    return 'term_' + re.sub(r'\W', '_', term)
+
+
+def archive_path(term, terms_dir=TERMS_DIR):
+    return os.path.join(terms_dir, re.sub(r'[^\w.-]', '_', term) + '.db')
+
+
+def list_terms(cursor):
+    cursor.execute("SELECT term, path, closed_at FROM terms ORDER BY closed_at DESC")
+    return cursor.fetchall()
+
+
+def _columns(conn, schema, table):
+    return ', '.join(row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})"))
+
+
+def _remove_archive(path):
+    # Closed archives are read-only on disk
+    os.chmod(path, stat.S_IRUSR | stat.S_IWUSR)
+    for name in (path, path + '-wal', path + '-shm', path + '-journal'):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def close_term(conn, term, terms_dir=TERMS_DIR):
+    # Moves every class, assignment and grade of the current term into a new
+    # archive file, leaving the primary file empty for the next term. SQLite
+    # can't commit across two WAL files atomically, so the copy is committed
+    # to the archive first; a second transaction on the primary file checks
+    # it, then deletes the term and records it in terms. An archive file with
+    # no terms row is left over from a close that didn't finish, and is
+    # replaced.
+    path = archive_path(term, terms_dir)
+    if conn.execute("SELECT 1 FROM terms WHERE term = ?", (term,)).fetchone():
+        raise ValueError(f"Term {term} is already archived at {path}")
+    if conn.execute("SELECT 1 FROM shard_map LIMIT 1").fetchone():
+        raise ValueError(SHARDED)
+    if os.path.exists(path):
+        _remove_archive(path)
+    os.makedirs(terms_dir, exist_ok=True)
+    gradedb.connect(path).close()
+
+    conn.commit()
+    conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    try:
+        conn.execute("BEGIN")
+        # Archiving is local housekeeping, not edits to sync to other copies
+        conn.execute("UPDATE archive.sync_state SET value = 0 WHERE key = 'tracking'")
+        # Columns by name: the two files may have been migrated in a different order
+        for table in ['students'] + TERM_TABLES:
+            columns = _columns(conn, 'archive', table)
+            conn.execute(f"INSERT INTO archive.{table} ({columns}) SELECT {columns} FROM main.{table}")
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        conn.execute("DETACH DATABASE archive")
+        _remove_archive(path)
+        raise
+    conn.execute("DETACH DATABASE archive")
+    # Immutable readers cannot replay a WAL, so fold the archive back into a single file
+    archive = sqlite3.connect(path)
+    archive.execute("PRAGMA journal_mode = DELETE")
+    archive.close()
+    # Closed terms never change again; make that explicit on disk
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+    conn.execute("ATTACH DATABASE ? AS archive", (f"file:{quote(os.path.abspath(path))}?mode=ro",))
+    try:
+        conn.execute("BEGIN")
+        # The first write takes the lock, so the checks below see what gets deleted
+        changesets.set_tracking(conn, False)
+        # Checked again under the lock, in case a class was moved meanwhile
+        if conn.execute("SELECT 1 FROM main.shard_map LIMIT 1").fetchone():
+            raise ValueError(SHARDED)
+        # Anything written since the copy would be lost with the delete
+        for table in TERM_TABLES:
+            columns = _columns(conn, 'archive', table)
+            counts = conn.execute(f"SELECT (SELECT COUNT(*) FROM main.{table}), "
+                                  f"(SELECT COUNT(*) FROM archive.{table})").fetchone()
+            if counts[0] != counts[1] or conn.execute(
+                    f"SELECT 1 FROM (SELECT {columns} FROM main.{table} "
+                    f"EXCEPT SELECT {columns} FROM archive.{table}) LIMIT 1").fetchone():
+                raise ValueError(f"{table} changed while {term} was being archived; try again")
+        for table in reversed(TERM_TABLES):
+            conn.execute(f"DELETE FROM main.{table}")
+        conn.execute("INSERT INTO main.terms (term, path, closed_at) VALUES (?, ?, ?)",
+                     (term, path, datetime.now().isoformat(timespec='seconds')))
+        changesets.set_tracking(conn, True)
+        conn.commit()
+    except (sqlite3.Error, ValueError):
+        conn.rollback()
+        conn.execute("DETACH DATABASE archive")
+        _remove_archive(path)
+        raise
+    conn.execute("DETACH DATABASE archive")
+    return path
+
+
+def attach_term(conn, term):
+    cur = conn.cursor()
+    cur.execute("SELECT path FROM terms WHERE term = ?", (term,))
+    result = cur.fetchone()
+    if not result:
+        raise ValueError(f"Unknown term: {term}")
+    schema = term_schema(term)
+    attached = [row[1] for row in conn.execute("PRAGMA database_list")]
+    if schema not in attached:
+        # immutable=1 lets SQLite skip locking and change detection on the archive
+        uri = f"file:{quote(os.path.abspath(result[0]))}?mode=ro&immutable=1"
+        conn.commit()
+        conn.execute("ATTACH DATABASE ? AS " + schema, (uri,))
+        conn.execute(f"PRAGMA {schema}.mmap_size = {ARCHIVE_MMAP_SIZE}")
+    return schema
+
+
+def detach_term(conn, term):
+    conn.commit()
+    conn.execute("DETACH DATABASE " + term_schema(term))
+
+
+@contextlib.contextmanager
+def attached_term(conn, term):
+    # Archives are attached only for the query that needs them
+    schema = attach_term(conn, term)
+    try:
+        yield schema
+    finally:
+        detach_term(conn, term)
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import changesets
+import gradedb
+
+
+class DeleteWhileEditedTest(unittest.TestCase):
+    # Copy A deletes a row while copy B edits a row under it. Exchanging
+    # changesets must not fail, and both copies must end up the same.
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        path_a = os.path.join(self.dir, 'a.db')
+        conn = gradedb.connect(path_a)
+        conn.execute("INSERT INTO students (rocket_id, name) VALUES ('R00000001', 'Ada Lovelace')")
+        conn.execute("INSERT INTO students (rocket_id, name) VALUES ('R00000002', 'Alan Turing')")
+        conn.execute("INSERT INTO classes (class_id, class_name) VALUES ('CS1', 'Intro')")
+        conn.execute("INSERT INTO classes (class_id, class_name) VALUES ('CS2', 'Data Structures')")
+        conn.execute("INSERT INTO assignments (title, due_date, max_score, type, class_id) "
+                     "VALUES ('HW1', '2024-09-01', 10, 'Homework', 'CS1')")
+        conn.commit()
+        conn.close()
+        path_b = os.path.join(self.dir, 'b.db')
+        shutil.copy(path_a, path_b)
+        self.a = gradedb.connect(path_a)
+        self.b = gradedb.connect(path_b)
+        changesets.new_origin(self.b)
+
+    def tearDown(self):
+        self.a.close()
+        self.b.close()
+        shutil.rmtree(self.dir)
+
+    def exchange(self):
+        path_a, path_b = os.path.join(self.dir, 'a.jsonl'), os.path.join(self.dir, 'b.jsonl')
+        changesets.export_changes(self.a, path_a)
+        changesets.export_changes(self.b, path_b)
+        from_b = changesets.replay_changes(self.a, changesets.read_changes(path_b)[1])
+        from_a = changesets.replay_changes(self.b, changesets.read_changes(path_a)[1])
+        return from_b, from_a
+
+    def snapshot(self, conn):
+        return {
+            'students': conn.execute("SELECT rocket_id, name FROM students ORDER BY rocket_id").fetchall(),
+            'assignments': conn.execute("SELECT class_id, title FROM assignments ORDER BY class_id, title").fetchall(),
+            'grades': conn.execute("SELECT rocket_id, class_id, score FROM grades ORDER BY rocket_id").fetchall(),
+            'enrollments': conn.execute("SELECT class_id, rocket_id FROM enrollments ORDER BY 1, 2").fetchall(),
+        }
+
+    def test_grade_for_deleted_student(self):
+        self.a.execute("DELETE FROM students WHERE rocket_id = 'R00000001'")
+        self.a.commit()
+        hw1 = gradedb.find_assignment_id(self.b.cursor(), 'HW1', 'CS1')
+        gradedb.save_grade(self.b.cursor(), 'R00000001', hw1, 9, 'CS1')
+        gradedb.save_grade(self.b.cursor(), 'R00000002', hw1, 7, 'CS1')
+        self.b.commit()
+
+        (applied, skipped), _ = self.exchange()
+        # B's grade and enrollment for the deleted student are skipped on A
+        self.assertGreaterEqual(skipped, 2)
+        self.assertEqual(self.snapshot(self.a), self.snapshot(self.b))
+        self.assertEqual(self.snapshot(self.a)['grades'], [('R00000002', 'CS1', 7)])
+
+    def test_assignment_in_deleted_class(self):
+        self.a.execute("DELETE FROM classes WHERE class_id = 'CS2'")
+        self.a.commit()
+        self.b.execute("INSERT INTO assignments (title, due_date, max_score, type, class_id) "
+                       "VALUES ('Lab 1', '2024-09-08', 20, 'Homework', 'CS2')")
+        self.b.commit()
+
+        self.exchange()
+        self.assertEqual(self.snapshot(self.a), self.snapshot(self.b))
+        self.assertEqual(self.snapshot(self.a)['assignments'], [('CS1', 'HW1')])
+
+    def test_replay_is_repeatable(self):
+        self.a.execute("DELETE FROM students WHERE rocket_id = 'R00000001'")
+        self.a.commit()
+        hw1 = gradedb.find_assignment_id(self.b.cursor(), 'HW1', 'CS1')
+        gradedb.save_grade(self.b.cursor(), 'R00000001', hw1, 9, 'CS1')
+        self.b.commit()
+
+        self.exchange()
+        # Everything is already present the second time around
+        (applied_b, _), (applied_a, _) = self.exchange()
+        self.assertEqual((applied_b, applied_a), (0, 0))
+        self.assertEqual(self.snapshot(self.a), self.snapshot(self.b))
+
+
+if __name__ == "__main__":
+    unittest.main()
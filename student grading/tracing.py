@@ -0,0 +1,162 @@
+import functools
+import json
+import time
+
+
+class ScreenRecord:
+    __slots__ = ('screen', 'started', 'statements', 'sql_time', 'rows', 'total_time')
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.started = time.time()
+        self.statements = 0
+        self.sql_time = 0.0
+        self.rows = 0
+        self.total_time = 0.0
+
+    @property
+    def widget_time(self):
+        return max(self.total_time - self.sql_time, 0.0)
+
+    def as_dict(self):
+        return {
+            'screen': self.screen,
+            'ts': round(self.started, 3),
+            'statements': self.statements,
+            'rows': self.rows,
+            'sql_ms': round(self.sql_time * 1000, 3),
+            'widget_ms': round(self.widget_time * 1000, 3),
+            'total_ms': round(self.total_time * 1000, 3),
+        }
+
+
+class TracedCursor:
+    # Thin proxy around sqlite3.Cursor that charges execute/fetch time and
+    # fetched rows to whichever screen is currently running.
+    def __init__(self, cursor, tracer):
+        self._cursor = cursor
+        self._tracer = tracer
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._tracer.add_sql_time(time.perf_counter() - start)
+
+    def execute(self, sql, params=()):
+        self._timed(self._cursor.execute, sql, params)
+        return self
+
+    def executemany(self, sql, seq):
+        self._timed(self._cursor.executemany, sql, seq)
+        return self
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None:
+            self._tracer.add_rows(1)
+        return row
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._tracer.add_rows(len(rows))
+        return rows
+
+    def fetchmany(self, size=None):
+        rows = self._timed(self._cursor.fetchmany, size or self._cursor.arraysize)
+        self._tracer.add_rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class Tracer:
+    def __init__(self, log_path=None, history=50):
+        self.log_path = log_path
+        self.history = history
+        self.records = []
+        self.listeners = []
+        self._stack = []
+
+    # --- Hooks ---
+    def install(self, conn):
+        conn.set_trace_callback(self._on_statement)
+
+    def wrap_cursor(self, cursor):
+        return TracedCursor(cursor, self)
+
+    def instrument(self, obj, method_names):
+        for name in method_names:
+            method = getattr(obj, name)
+            setattr(obj, name, self.traced(name)(method))
+
+    def traced(self, screen):
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                self.begin(screen)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.end()
+            return wrapper
+        return decorator
+
+    # --- Accounting ---
+    def _on_statement(self, sql):
+        if self._stack:
+            self._stack[-1].statements += 1
+
+    def add_sql_time(self, seconds):
+        if self._stack:
+            self._stack[-1].sql_time += seconds
+
+    def add_rows(self, count):
+        if self._stack:
+            self._stack[-1].rows += count
+
+    def begin(self, screen):
+        record = ScreenRecord(screen)
+        record.total_time = time.perf_counter()
+        self._stack.append(record)
+
+    def end(self):
+        record = self._stack.pop()
+        record.total_time = time.perf_counter() - record.total_time
+        self.records.append(record)
+        del self.records[:-self.history]
+        if self.log_path:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(record.as_dict()) + '\n')
+        for listener in self.listeners:
+            listener(record)
+
+    # --- Debug Panel ---
+    def show_panel(self, root):
+        import tkinter as tk
+
+        panel = tk.Toplevel(root)
+        panel.title("Screen Timings")
+        header = f"{'Screen':<26}{'Stmts':>7}{'Rows':>8}{'SQL ms':>10}{'Widgets ms':>12}{'Total ms':>10}"
+        tk.Label(panel, text=header, font=("Courier", 10, "bold"), anchor='w', justify='left').pack(fill='x')
+        body = tk.Label(panel, font=("Courier", 10), anchor='nw', justify='left')
+        body.pack(fill='both', expand=True)
+
+        def refresh(record):
+            lines = []
+            for r in reversed(self.records[-20:]):
+                lines.append(f"{r.screen:<26}{r.statements:>7}{r.rows:>8}"
+                             f"{r.sql_time * 1000:>10.2f}{r.widget_time * 1000:>12.2f}{r.total_time * 1000:>10.2f}")
+            body.config(text="\n".join(lines))
+
+        self.listeners.append(refresh)
+        return panel
@@ -0,0 +1,153 @@
+import argparse
+import csv
+import json
+import os
+import time
+from itertools import groupby
+from operator import itemgetter
+
+import gradedb
+
+# Whole-school transcripts in one cursor sweep: a single query ordered by
+# Rocket ID and class, grouped as it streams, so memory holds one student at
+# a time however many students there are.
+FORMATS = ('csv', 'jsonl', 'txt')
+CSV_HEADER = ["Rocket ID", "Name", "Class", "Assignment", "Score", "Max Score", "Percentage", "Letter"]
+FETCH_BATCH = 1000
+
+
+def transcript_rows(cursor, schema='main'):
+    # The students primary key yields Rocket IDs in order and each student's
+    # grades come from idx_grades_student_assignment, so SQLite only sorts one
+    # student's rows at a time. Students without grades get an empty transcript.
+    cursor.execute(f'''
+        SELECT s.rocket_id, s.name, g.class_id, c.class_name, a.title, a.max_score, g.score
+        FROM {schema}.students s
+        LEFT JOIN {schema}.grades g ON g.rocket_id = s.rocket_id
+        LEFT JOIN {schema}.assignments a ON a.id = g.assignment_id
+        LEFT JOIN {schema}.classes c ON c.class_id = g.class_id
+        ORDER BY s.rocket_id, c.class_name, g.class_id, a.due_date, a.title
+    ''')
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH)
+        if not rows:
+            return
+        yield from rows
+
+
+def percentage(score, max_score):
+    # Ungraded work counts as 0%, as in reports.class_section
+    return score / max_score * 100 if score is not None and max_score else 0
+
+
+def transcripts(cursor, schema='main'):
+    # Yields one dict per student: classes with their assignments and a
+    # percentage over the graded points in the class, plus an overall
+    # percentage. As in reports.class_summary, ungraded work is left out of
+    # both, and a percentage is None when nothing has been graded.
+    for (rocket_id, name), student_rows in groupby(transcript_rows(cursor, schema), key=itemgetter(0, 1)):
+        classes = []
+        earned = possible = 0
+        for (class_id, class_name), class_rows in groupby(student_rows, key=itemgetter(2, 3)):
+            assignments = []
+            class_earned = class_possible = 0
+            for _, _, _, _, title, max_score, score in class_rows:
+                if title is None:
+                    continue
+                pct = percentage(score, max_score)
+                assignments.append({'title': title, 'score': score, 'max_score': max_score,
+                                    'percentage': round(pct, 1), 'letter': gradedb.calculate_letter_grade(pct)[0]})
+                if score is not None:
+                    class_earned += score
+                    class_possible += max_score or 0
+            if not assignments:
+                continue
+            classes.append({'class_id': class_id, 'class_name': class_name, 'assignments': assignments,
+                            **graded_percentage(class_earned, class_possible)})
+            earned += class_earned
+            possible += class_possible
+        yield {'rocket_id': rocket_id, 'name': name, 'classes': classes, **graded_percentage(earned, possible)}
+
+
+def graded_percentage(earned, possible):
+    if not possible:
+        return {'percentage': None, 'letter': None}
+    pct = percentage(earned, possible)
+    return {'percentage': round(pct, 1), 'letter': gradedb.calculate_letter_grade(pct)[0]}
+
+# === Writers ===
+def grade_text(item):
+    if item['percentage'] is None:
+        return "no graded work"
+    return f"{item['percentage']:.1f}% ({item['letter']})"
+
+
+def write_csv(f, items):
+    writer = csv.writer(f)
+    writer.writerow(CSV_HEADER)
+    for t in items:
+        for c in t['classes']:
+            for a in c['assignments']:
+                writer.writerow([t['rocket_id'], t['name'], c['class_name'], a['title'], a['score'],
+                                 a['max_score'], a['percentage'], a['letter']])
+            writer.writerow([t['rocket_id'], t['name'], c['class_name'], "Class Total", "", "",
+                             c['percentage'], c['letter']])
+
+
+def write_jsonl(f, items):
+    for t in items:
+        f.write(json.dumps(t, ensure_ascii=False) + '\n')
+
+
+def write_txt(f, items):
+    for t in items:
+        f.write(f"Transcript: {t['name']} ({t['rocket_id']})\n")
+        if not t['classes']:
+            f.write("  No grades recorded.\n")
+        for c in t['classes']:
+            f.write(f"  {c['class_name']}: {grade_text(c)}\n")
+            for a in c['assignments']:
+                score = '-' if a['score'] is None else a['score']
+                f.write(f"    {a['title']}: {score}/{a['max_score']} ({a['percentage']:.1f}%) - {a['letter']}\n")
+        if t['classes']:
+            f.write(f"  Overall: {grade_text(t)}\n")
+        f.write("\f\n")
+
+
+WRITERS = {'csv': write_csv, 'jsonl': write_jsonl, 'txt': write_txt}
+
+
+def format_for(path):
+    ext = os.path.splitext(path)[1].lstrip('.').lower()
+    return ext if ext in FORMATS else 'txt'
+
+
+def write_transcripts(cursor, path, fmt=None, schema='main'):
+    # Returns the number of students written
+    fmt = fmt or format_for(path)
+    count = 0
+
+    def counted():
+        nonlocal count
+        for t in transcripts(cursor, schema):
+            count += 1
+            yield t
+
+    with open(path, 'w', newline='' if fmt == 'csv' else None, encoding='utf-8') as f:
+        WRITERS[fmt](f, counted())
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a transcript for every student in one pass")
+    parser.add_argument('out', help="output file; the format follows the extension unless --format is given")
+    parser.add_argument('--db', default='student_grading.db')
+    parser.add_argument('--format', choices=FORMATS)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        raise SystemExit(f"No database at {args.db}")
+    conn = gradedb.connect(args.db)
+    start = time.perf_counter()
+    count = write_transcripts(conn.cursor(), args.out, args.format)
+    print(f"Wrote {count} transcripts to {args.out} in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,156 @@
+import argparse
+import math
+
+import gradedb
+
+# What-if answers from the class_totals aggregates: a student's class grade is
+# points earned over points possible, so the score needed on the remaining
+# work only depends on those two sums and the class's total possible points.
+# Required scores assume the same percentage on every remaining assignment.
+EPSILON = 1e-9
+
+
+def letter_threshold(letter):
+    for min_score, scale_letter, _ in gradedb.GRADE_SCALE:
+        if scale_letter == letter:
+            return min_score
+    raise ValueError(f"Unknown letter grade {letter!r}; expected one of "
+                     f"{', '.join(l for _, l, _ in gradedb.GRADE_SCALE)}")
+
+
+def class_size(cursor, class_id):
+    # (number of assignments, total possible points) for the class
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(max_score), 0) FROM assignments WHERE class_id = ?", (class_id,))
+    return cursor.fetchone()
+
+
+def student_totals(cursor, rocket_id, class_id):
+    cursor.execute("SELECT earned, possible, graded FROM class_totals WHERE rocket_id = ? AND class_id = ?",
+                   (rocket_id, class_id))
+    return cursor.fetchone() or (0, 0, 0)
+
+
+def needed(earned, possible, graded, count, total, threshold):
+    remaining = max(0, total - possible)
+    current = earned / possible * 100 if possible else None
+    points = threshold / 100 * total - earned
+    result = {
+        'current': round(current, 1) if current is not None else None,
+        'current_letter': gradedb.calculate_letter_grade(current)[0] if current is not None else None,
+        'remaining_assignments': max(0, count - graded),
+        'remaining_points': remaining,
+        'points_needed': max(0.0, round(points, 2)),
+    }
+    if points <= EPSILON:
+        result.update(status='secured', required_percentage=0.0)
+    elif remaining <= 0 or points > remaining + EPSILON:
+        result.update(status='out of reach', required_percentage=None)
+    else:
+        result.update(status='possible', required_percentage=round(points / remaining * 100, 1))
+    return result
+
+
+def required_scores(cursor, rocket_id, class_id, letter):
+    threshold = letter_threshold(letter)
+    count, total = class_size(cursor, class_id)
+    result = needed(*student_totals(cursor, rocket_id, class_id), count, total, threshold)
+    result.update(rocket_id=rocket_id, class_id=class_id, target=letter)
+    # Each remaining assignment at the required percentage, rounded up to whole points
+    cursor.execute('''
+        SELECT a.id, a.title, a.max_score FROM assignments a
+        WHERE a.class_id = ?
+          AND NOT EXISTS (SELECT 1 FROM grades g WHERE g.rocket_id = ? AND g.assignment_id = a.id
+                          AND g.score IS NOT NULL)
+        ORDER BY a.due_date, a.id
+    ''', (class_id, rocket_id))
+    pct = result['required_percentage']
+    result['assignments'] = [
+        {'id': aid, 'title': title, 'max_score': max_score,
+         'min_score': math.ceil(pct / 100 * max_score - EPSILON) if pct is not None and max_score else None}
+        for aid, title, max_score in cursor.fetchall()]
+    return result
+
+
+def required_for_class(cursor, class_id, letter):
+    # Two queries however large the class: its size and every rostered
+    # student's totals (zero for students with nothing graded yet)
+    threshold = letter_threshold(letter)
+    count, total = class_size(cursor, class_id)
+    cursor.execute('''
+        SELECT e.rocket_id, COALESCE(t.earned, 0), COALESCE(t.possible, 0), COALESCE(t.graded, 0)
+        FROM enrollments e
+        LEFT JOIN class_totals t ON t.rocket_id = e.rocket_id AND t.class_id = e.class_id
+        WHERE e.class_id = ?
+        ORDER BY e.rocket_id
+    ''', (class_id,))
+    results = []
+    for rocket_id, earned, possible, graded in cursor.fetchall():
+        result = needed(earned, possible, graded, count, total, threshold)
+        result['rocket_id'] = rocket_id
+        results.append(result)
+    return results
+
+
+def project(cursor, rocket_id, class_id, hypothetical):
+    # Grade if the assignments in hypothetical ({assignment_id: score}) had
+    # those scores. Graded assignments are replaced, ungraded ones added;
+    # anything else still ungraded stays out of the total, as in the reports.
+    earned, possible, _ = student_totals(cursor, rocket_id, class_id)
+    for assignment_id, score in hypothetical.items():
+        current = gradedb.get_assignment(cursor, assignment_id)
+        if not current or current[5] != class_id:
+            raise ValueError(f"Assignment {assignment_id} is not in class {class_id}")
+        max_score = current[3] or 0
+        graded = gradedb.get_grade(cursor, rocket_id, assignment_id)
+        if graded and graded[0] is not None:
+            earned -= graded[0]
+            possible -= max_score
+        earned += score
+        possible += max_score
+    if not possible:
+        return None, None
+    percentage = earned / possible * 100
+    return round(percentage, 1), gradedb.calculate_letter_grade(percentage)[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="What-if and required-score calculator")
+    parser.add_argument('--db', default='student_grading.db')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('need', help="scores a student needs on the remaining work")
+    p.add_argument('rocket_id')
+    p.add_argument('class_id')
+    p.add_argument('letter')
+    p = sub.add_parser('class', help="required percentage for every student in a class")
+    p.add_argument('class_id')
+    p.add_argument('letter')
+    p = sub.add_parser('project', help="grade under hypothetical scores")
+    p.add_argument('rocket_id')
+    p.add_argument('class_id')
+    p.add_argument('scores', nargs='+', metavar='ASSIGNMENT_ID=SCORE')
+    args = parser.parse_args()
+
+    cur = gradedb.connect(args.db).cursor()
+    try:
+        if args.command == 'need':
+            r = required_scores(cur, args.rocket_id, args.class_id, args.letter)
+            print(f"{args.rocket_id} in {args.class_id}: now {r['current']}% ({r['current_letter']}), "
+                  f"target {args.letter}: {r['status']}")
+            if r['status'] == 'possible':
+                print(f"Needs {r['points_needed']} of {r['remaining_points']} remaining points "
+                      f"({r['required_percentage']}% on each assignment):")
+                for a in r['assignments']:
+                    print(f"  {a['title']}: {a['min_score']}/{a['max_score']}")
+        elif args.command == 'class':
+            for r in required_for_class(cur, args.class_id, args.letter):
+                pct = f"{r['required_percentage']}%" if r['required_percentage'] is not None else '-'
+                print(f"{r['rocket_id']}  now {r['current']}% ({r['current_letter']})  {r['status']}  needs {pct}")
+        else:
+            hypothetical = {}
+            for pair in args.scores:
+                aid, _, score = pair.partition('=')
+                hypothetical[int(aid)] = float(score)
+            percentage, letter = project(cur, args.rocket_id, args.class_id, hypothetical)
+            print(f"Projected: {percentage}% ({letter})")
+    except ValueError as e:
+        raise SystemExit(str(e))